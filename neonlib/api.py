@@ -0,0 +1,392 @@
+"""
+api.py
+Layer : Presentation Layer (headless JSON, for kiosks / campus portal)
+Rule  : Calls services.py only — same business rules as the Streamlit UI.
+        Standard library only (http.server), no Streamlit.
+Usage : python3 api.py [--host 0.0.0.0] [--port 8600]
+
+Endpoints
+  GET  /books?q=&cursor=&limit=          catalogue list / typo-tolerant search
+  GET  /books/<book_id>                  one book
+  GET  /books/<book_id>/availability     copies on the shelf
+  GET  /users/<user_id>/loans            active loans with due / fine info
+  GET  /events?kind=&cursor=&limit=      activity journal, newest first
+  GET  /exports/<kind>?format=csv|jsonl  loans | fines | history | users,
+                                         streamed (chunked), constant memory
+  GET  /users/<user_id>/notifications?cursor=&limit=&archived=1
+  GET  /users/<user_id>/ledger?cursor=&limit=   balance + fine ledger, newest first
+  POST /users/<user_id>/notifications/read
+  POST /loans    {"book_id", "user_id"}  issue
+  POST /returns  {"book_id", "user_id"}  return
+  POST /loans/batch    {"items": [{"book_id", "user_id"}, …]}  desk mode,
+  POST /returns/batch  {"items": [...]}   one transaction, per-item results
+  POST /payments/batch {"items": [{"user_id", "amount"}, …], "received_by"}
+                                         fine payments, same batching
+
+Every GET carries an ETag derived from PRAGMA data_version.  A request
+with a matching If-None-Match gets 304 before any service call runs.
+Set NEONLIB_API_TOKEN to require "Authorization: Bearer <token>".
+"""
+
+import os
+import re
+import sys
+import hmac
+import json
+import base64
+import secrets
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database as db
+import services
+
+MAX_LIMIT = 100
+MAX_BATCH = 1000
+MAX_BODY  = 4 * 1024 * 1024        # bytes
+_BOOT = secrets.token_hex(4)       # new ETags after a restart
+
+
+# ══════════════════════════════════════════════════════════════
+# HELPERS
+# ══════════════════════════════════════════════════════════════
+
+class ApiError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def current_etag() -> str:
+    """Moves whenever any connection commits; costs no table read."""
+    return f'W/"{_BOOT}-{db.data_version()}"'
+
+
+def encode_cursor(key) -> str | None:
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        raise ApiError(400, "Malformed cursor.")
+
+
+def _cursor(query, size=None):
+    """The ?cursor= key, checked: an int offset / seq, or a `size`-element key."""
+    key = decode_cursor(query.get("cursor", [None])[0])
+    if key is None:
+        return None
+    if size is None:
+        if isinstance(key, int) and not isinstance(key, bool) and key >= 0:
+            return key
+    elif isinstance(key, list) and len(key) == size:
+        return tuple(key)
+    raise ApiError(400, "Malformed cursor.")
+
+
+def _limit(query, default=20) -> int:
+    try:
+        return max(1, min(MAX_LIMIT, int(query.get("limit", [default])[0])))
+    except ValueError:
+        raise ApiError(400, "limit must be an integer.")
+
+
+def _required(body, *keys):
+    missing = [k for k in keys if not str(body.get(k, "")).strip()]
+    if missing:
+        raise ApiError(400, f"Missing field(s): {', '.join(missing)}.")
+    return [str(body[k]).strip() for k in keys]
+
+
+# ══════════════════════════════════════════════════════════════
+# ROUTE HANDLERS   (params, query, body) → (status, payload)
+# ══════════════════════════════════════════════════════════════
+
+def list_books(_, query, __):
+    limit = _limit(query)
+    q = query.get("q", [""])[0].strip()
+    if q:
+        # ranked results: cursor is an offset into the top matches
+        offset = _cursor(query) or 0
+        hits = services.search_books(q, offset + limit + 1)
+        items = hits[offset:offset + limit]
+        nxt = offset + limit if len(hits) > offset + limit else None
+    else:
+        items, nxt = services.books_page(_cursor(query, 2), limit)
+    return 200, {"items": [b.to_dict() for b in items],
+                 "next_cursor": encode_cursor(nxt)}
+
+
+def list_events(_, query, __):
+    kind = query.get("kind", [None])[0]
+    if kind is not None and kind not in services.EVENT_KINDS:
+        raise ApiError(400, f"kind must be one of: {', '.join(services.EVENT_KINDS)}.")
+    items, nxt = services.activity_feed(kind, _cursor(query), _limit(query))
+    return 200, {"items": [dict(r) for r in items], "next_cursor": encode_cursor(nxt)}
+
+
+class Stream:
+    """Response body produced chunk by chunk: sent with chunked transfer encoding."""
+    def __init__(self, chunks, content_type, filename=None):
+        self.chunks, self.content_type, self.filename = chunks, content_type, filename
+
+
+def export(params, query, _):
+    kind, fmt = params["kind"], query.get("format", ["csv"])[0]
+    if kind not in services.EXPORT_KINDS or fmt not in services.EXPORT_FORMATS:
+        raise ApiError(400, f"kind must be one of: {', '.join(services.EXPORT_KINDS)}; "
+                            f"format one of: {', '.join(services.EXPORT_FORMATS)}.")
+    chunks = (text for text, _ in services.export_stream(kind, fmt))
+    ctype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return 200, Stream(chunks, f"{ctype}; charset=utf-8", f"{kind}.{fmt}")
+
+
+def get_book(params, _, __):
+    b = services.get_book(params["book_id"])
+    if b is None:
+        raise ApiError(404, "Book not found.")
+    return 200, b.to_dict()
+
+
+def get_availability(params, _, __):
+    a = services.book_availability(params["book_id"])
+    if a is None:
+        raise ApiError(404, "Book not found.")
+    return 200, a
+
+
+def list_loans(params, _, __):
+    return 200, {"items": [b.to_dict() for b in services.student_issued_books(params["user_id"])]}
+
+
+def list_notifications(params, query, _):
+    items, nxt = services.user_notifications(
+        params["user_id"], _cursor(query, 2), _limit(query, 30),
+        archived=query.get("archived", ["0"])[0] == "1")
+    return 200, {"items": items, "next_cursor": encode_cursor(nxt)}
+
+
+def list_ledger(params, query, _):
+    items, nxt = services.fine_ledger(params["user_id"], _cursor(query), _limit(query))
+    return 200, {"balance": services.fine_balance(params["user_id"]),
+                 "items": [dict(r) for r in items], "next_cursor": encode_cursor(nxt)}
+
+
+def read_notifications(params, _, __):
+    ok, msg = services.mark_notifications_read(params["user_id"])
+    return 200, {"ok": ok, "message": msg}
+
+
+def issue(_, __, body):
+    book_id, user_id = _required(body, "book_id", "user_id")
+    ok, msg = services.issue_book(book_id.upper(), user_id)
+    return (201 if ok else 409), {"ok": ok, "message": msg}
+
+
+def return_(_, __, body):
+    book_id, user_id = _required(body, "book_id", "user_id")
+    ok, msg, fine = services.return_book(book_id.upper(), user_id)
+    return (200 if ok else 409), {"ok": ok, "message": msg, "fine": fine}
+
+
+def _batch(body):
+    items = body.get("items")
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, "items must be a non-empty list.")
+    if len(items) > MAX_BATCH:
+        raise ApiError(413, f"At most {MAX_BATCH} items per batch.")
+    return [tuple(_required(i if isinstance(i, dict) else {}, "book_id", "user_id"))
+            for i in items]
+
+
+def issue_batch(_, __, body):
+    return 200, {"items": services.issue_books(_batch(body))}
+
+
+def return_batch(_, __, body):
+    return 200, {"items": services.return_books(_batch(body))}
+
+
+def payment_batch(_, __, body):
+    items = body.get("items")
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, "items must be a non-empty list.")
+    if len(items) > MAX_BATCH:
+        raise ApiError(413, f"At most {MAX_BATCH} items per batch.")
+    pays = [tuple(_required(i if isinstance(i, dict) else {}, "user_id", "amount"))
+            for i in items]
+    pays = [(u, services.payment_amount(a)) for u, a in pays]
+    if any(a is None for _, a in pays):
+        raise ApiError(400, "amount must be a finite number.")
+    return 200, {"items": services.settle_payments(pays, str(body.get("received_by") or "api"))}
+
+
+_ID = r"(?P<{}>[A-Za-z0-9_-]+)"
+ROUTES = [
+    ("GET",  r"/books",                                        list_books),
+    ("GET",  r"/books/" + _ID.format("book_id"),               get_book),
+    ("GET",  r"/books/" + _ID.format("book_id") + "/availability", get_availability),
+    ("GET",  r"/users/" + _ID.format("user_id") + "/loans",    list_loans),
+    ("GET",  r"/events",                                       list_events),
+    ("GET",  r"/exports/(?P<kind>[a-z]+)",                     export),
+    ("GET",  r"/users/" + _ID.format("user_id") + "/notifications", list_notifications),
+    ("GET",  r"/users/" + _ID.format("user_id") + "/ledger",   list_ledger),
+    ("POST", r"/users/" + _ID.format("user_id") + "/notifications/read", read_notifications),
+    ("POST", r"/loans",                                        issue),
+    ("POST", r"/returns",                                      return_),
+    ("POST", r"/loans/batch",                                  issue_batch),
+    ("POST", r"/returns/batch",                                return_batch),
+    ("POST", r"/payments/batch",                               payment_batch),
+]
+ROUTES = [(m, re.compile(p + "/?$"), fn) for m, p, fn in ROUTES]
+
+
+# ══════════════════════════════════════════════════════════════
+# HTTP ADAPTER
+# ══════════════════════════════════════════════════════════════
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "NeonLibAPI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, fmt, *args):
+        if os.environ.get("NEONLIB_API_LOG"):
+            super().log_message(fmt, *args)
+
+    def _send(self, status, payload=None, etag=None, headers=None):
+        if isinstance(payload, Stream):
+            return self._stream(status, payload)
+        data = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if payload is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _stream(self, status, body):
+        self._streaming = True
+        self.send_response(status)
+        self.send_header("Content-Type", body.content_type)
+        if body.filename:
+            self.send_header("Content-Disposition", f'attachment; filename="{body.filename}"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for text in body.chunks:
+            data = text.encode()
+            if data:
+                self.wfile.write(b"%x\r\n%b\r\n" % (len(data), data))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _read_body(self) -> bytes:
+        """
+        The whole request body, read before anything is answered: a 401 /
+        404 / 304 sent with the body still unread would leave it to be
+        parsed as the next request on a keep-alive connection.  When the
+        body's end cannot be known the connection is closed instead.
+        """
+        if self.headers.get("Transfer-Encoding"):
+            self.close_connection = True
+            raise ApiError(411, "Send the body with a Content-Length.")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            raise ApiError(400, "Content-Length must be a non-negative integer.")
+        if length > MAX_BODY:
+            self.close_connection = True
+            raise ApiError(413, f"Body over {MAX_BODY} bytes.")
+        return self.rfile.read(length) if length else b""
+
+    def _dispatch(self, method):
+        self._streaming = False
+        try:
+            raw = self._read_body()
+            token = os.environ.get("NEONLIB_API_TOKEN")
+            if token and not hmac.compare_digest(
+                    self.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()):
+                raise ApiError(401, "Missing or invalid bearer token.")
+
+            url = urlsplit(self.path)
+            allowed = []
+            for m, pattern, fn in ROUTES:
+                match = pattern.match(url.path)
+                if match and m == method:
+                    break
+                if match:
+                    allowed.append(m)
+            else:
+                if allowed:
+                    raise ApiError(405, f"Use {' or '.join(allowed)} here.",
+                                   {"Allow": ", ".join(allowed)})
+                raise ApiError(404, "No such endpoint.")
+
+            etag = None
+            if method == "GET":
+                etag = current_etag()
+                if etag in (t.strip() for t in
+                            self.headers.get("If-None-Match", "").split(",")):
+                    return self._send(304, etag=etag)
+
+            body = {}
+            if raw:
+                try:
+                    body = json.loads(raw)
+                except ValueError:
+                    raise ApiError(400, "Body must be JSON.")
+                if not isinstance(body, dict):
+                    raise ApiError(400, "Body must be a JSON object.")
+
+            status, payload = fn(match.groupdict(), parse_qs(url.query), body)
+            self._send(status, payload, etag)
+        except ApiError as e:
+            self._send(e.status, {"error": str(e)}, headers=e.headers)
+        except Exception:
+            self.log_error("unhandled error on %s %s", method, self.path)
+            if self._streaming:             # headers already out: just drop it
+                self.close_connection = True
+            else:
+                self._send(500, {"error": "Internal server error."})
+
+
+def make_server(host="127.0.0.1", port=8600) -> ThreadingHTTPServer:
+    db.initialize_database()
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="NeonLib headless JSON API")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8600)
+    args = ap.parse_args()
+    srv = make_server(args.host, args.port)
+    print(f"NeonLib API on http://{args.host}:{args.port}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -5,12 +5,15 @@ Rule  : Calls auth.py and services.py.  NEVER calls database.py directly.
         Contains zero business logic.
 """
 
+import os
+import time
+import functools
 import streamlit as st
 from database import initialize_database
 import auth
 import services
-import database as db
-from utils import fmt_date, days_until_due, pw_score
+import fragments
+from utils import fmt_date, pw_score
 
 # ── page config (must be first Streamlit call) ────────────────
 st.set_page_config(
@@ -20,6 +23,7 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
+_T0 = time.thread_time()           # CPU spent by this full script run
 initialize_database()
 
 # ── theme bootstrap ───────────────────────────────────────────
@@ -30,10 +34,10 @@ DARK = st.session_state["theme"] == "dark"
 
 
 # ══════════════════════════════════════════════════════════════
-# CSS  — injected once, switches on DARK flag
+# CSS  — one stylesheet per theme, built once per process
 # ══════════════════════════════════════════════════════════════
-def _css():
-    if DARK:
+def _css_text(dark: bool) -> str:
+    if dark:
         # ── dark palette ──────────────────────────────────────
         BG    = "#030712";  CARD  = "#0d1117";  CARD2 = "#111827"
         SB    = "linear-gradient(180deg,#080e1a,#0a0f1e)"
@@ -76,7 +80,7 @@ def _css():
     # ── scan-line animation colour ─────────────────────────────
     SC = A1
 
-    st.markdown(f"""
+    return f"""
 <style>
 @import url('https://fonts.googleapis.com/css2?family=Orbitron:wght@400;700;900&family=Share+Tech+Mono&family=Rajdhani:wght@300;400;600;700&family=Inter:wght@300;400;500;600;700&display=swap');
 
@@ -261,7 +265,18 @@ hr{{border:none!important;height:1px!important;background:linear-gradient(90deg,
 #MainMenu,footer,header{{visibility:hidden;}}
 .block-container{{padding-top:1.5rem!important;}}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+def _css():
+    """
+    Inject the theme's stylesheet.  It is formatted once per process
+    and reused as the same string on every rerun and session.  A full
+    rerun still sends it to the browser (`bench.py css` reports the
+    bytes); clicks inside @_partial regions do not re-run it at all.
+    """
+    st.markdown(fragments.static(("css", DARK), lambda: _css_text(DARK)),
+                unsafe_allow_html=True)
 
 
 _css()
@@ -288,6 +303,53 @@ def _cshadow():
     return "box-shadow:0 2px 10px rgba(0,0,0,.35);" if DARK else "box-shadow:0 2px 12px rgba(99,102,241,.07);"
 
 
+# ══════════════════════════════════════════════════════════════
+# FRAGMENT CACHE — rendered HTML reused across reruns and sessions
+# ══════════════════════════════════════════════════════════════
+def _frag(kind, entity_id, version, build) -> str:
+    """
+    One entity's HTML (book card, journal event, notification, user
+    card); rebuilt only when `version` — the fields it shows — changes.
+    The version must come from data the page already holds: a query
+    made only to compute it costs more than the formatting saved.  Small
+    helpers (stars, pbar, status_badge …) are not cached on their own:
+    they format faster than a cache round trip, and are reused inside
+    the cached cards that embed them.
+    """
+    return fragments.cache.get((kind, entity_id, DARK), version, build)
+
+
+# ══════════════════════════════════════════════════════════════
+# PARTIAL RERUNS
+# A click inside a @_partial region reruns that function only (an
+# st.fragment) — not _css(), the sidebar counts or the rest of the page.
+# Each region records its CPU time; admins see it next to the cost of
+# the last full script run.  NEONLIB_FRAGMENTS=0 turns the regions back
+# into plain calls (every click reruns the page) for `bench.py clicks`.
+# ══════════════════════════════════════════════════════════════
+FRAGMENTS = os.environ.get("NEONLIB_FRAGMENTS", "1") != "0"
+_PARTIAL  = "fragment" if FRAGMENTS else "app"      # st.rerun scope of a region's own clicks
+
+
+def _partial(fn):
+    if not FRAGMENTS:
+        return fn
+
+    @st.fragment
+    @functools.wraps(fn)
+    def region(*args, **kwargs):
+        t0 = time.thread_time()
+        fn(*args, **kwargs)
+        ss = st.session_state
+        last, full = ss.get(f"_cpu_{fn.__name__}"), ss.get("_cpu_full")
+        ss[f"_cpu_{fn.__name__}"] = (time.thread_time() - t0) * 1000
+        if last is not None and full is not None and (auth.current_user() or {}).get("role") == "admin":
+            st.markdown(f'<div style="font-size:.6rem;color:#64748b;text-align:right;">'
+                        f'⏱ this panel {last:.0f} ms CPU · full page run {full:.0f} ms CPU</div>',
+                        unsafe_allow_html=True)
+    return region
+
+
 # ══════════════════════════════════════════════════════════════
 # REUSABLE HTML COMPONENTS
 # ══════════════════════════════════════════════════════════════
@@ -404,8 +466,8 @@ def sidebar() -> str:
         # ── logged-in ─────────────────────────────────────────
         u = auth.current_user()
         color   = u.get("avatar_color", _a("1"))
-        unread  = db.count_unread_notifications(u["user_id"])
-        pending = db.count_pending_requests() if u["role"] == "admin" else 0
+        unread  = services.unread_count(u["user_id"])
+        pending = services.pending_request_count() if u["role"] == "admin" else 0
 
         st.markdown(
             f'<div style="background:{_a("bg2")};border:1px solid {_a("1")}22;'
@@ -539,7 +601,7 @@ def page_dash():
 def _admin_dash(u):
     st.markdown(section_title("ADMIN DASHBOARD", "SYSTEM OVERVIEW & ANALYTICS"), unsafe_allow_html=True)
     s = services.library_stats()
-    pend = db.count_pending_requests()
+    pend = services.pending_request_count()
 
     c1,c2,c3,c4,c5,c6 = st.columns(6)
     c1.markdown(metric_card(s["total_books"],       "TOTAL BOOKS",  "1","📚"), unsafe_allow_html=True)
@@ -548,18 +610,35 @@ def _admin_dash(u):
     c4.markdown(metric_card(s["unique_authors"],    "AUTHORS",      "3","✍"), unsafe_allow_html=True)
     c5.markdown(metric_card(s["unique_categories"], "CATEGORIES",   "5","🗂"), unsafe_allow_html=True)
     c6.markdown(metric_card(pend, "PENDING REQS",   "4" if pend else "6","📬"), unsafe_allow_html=True)
+    cat = s["catalog"]
+    st.markdown(f'<div style="font-size:.63rem;color:#64748b;text-align:right;margin-top:.4rem;">'
+                f'CATALOGUE SNAPSHOT · {cat["rows"]} rows · {cat["bytes"] / 1024:.0f} KB · '
+                f'{cat["full_loads"]} full loads · {cat["deltas_applied"]} deltas</div>',
+                unsafe_allow_html=True)
+    w = s["writer"]
+    st.markdown(f'<div style="font-size:.63rem;color:#64748b;text-align:right;">'
+                f'WRITE QUEUE · depth {w["queue_depth"]} · {w["batches"]} commits · '
+                f'batch avg {w["avg_batch"]} / max {w["max_batch"]} · '
+                f'{w["busy_retries"]} lock retries · {w["lock_wait_ms"]:.0f} ms lock wait</div>',
+                unsafe_allow_html=True)
+    fc = fragments.cache.stats()
+    st.markdown(f'<div style="font-size:.63rem;color:#64748b;text-align:right;">'
+                f'HTML FRAGMENTS · {fc["entries"]:,} cached · {fc["bytes"] / 1024:,.0f} / '
+                f'{fc["max_bytes"] / 1048576:.0f} MB · hit rate {fc["hit_rate"]:.0%} · '
+                f'{fc["evictions"]:,} evicted</div>',
+                unsafe_allow_html=True)
 
     st.markdown("---")
     cl, cr = st.columns([1.2, 1])
 
     with cl:
-        st.markdown(section_title("TOP BORROWED BOOKS", "O(n log n) Timsort", "5"), unsafe_allow_html=True)
+        st.markdown(section_title("TOP BORROWED BOOKS", "O(n log k) heap", "5"), unsafe_allow_html=True)
         rank_c = [_a("5"), "#c0c0c0", "#cd7f32"]
         top = s["top_books"]
         for i, book in enumerate(top):
             rc = rank_c[i] if i < 3 else "#64748b"
             pct = min(100, book["borrow_count"] / max(1, top[0]["borrow_count"]) * 100)
-            avg_r, rc_n = db.get_book_avg_rating(book["book_id"])
+            avg_r, rc_n = services.book_rating(book["book_id"])
             st.markdown(
                 f'<div class="card" style="padding:.9rem;margin:.35rem 0;">'
                 f'<div style="display:flex;align-items:center;gap:.9rem;">'
@@ -576,17 +655,8 @@ def _admin_dash(u):
                 unsafe_allow_html=True)
 
     with cr:
-        st.markdown(section_title("RECENT LOANS", "", "4"), unsafe_allow_html=True)
-        for row in list(db.get_all_issued_books())[:5]:
-            d = days_until_due(row["due_date"])
-            badge = f'<span class="b-ov">OVERDUE {abs(d)}d</span>' if d < 0 else f'<span class="b-ok">{d}d left</span>'
-            st.markdown(
-                f'<div style="background:{_a("bg2")};border:1px solid {_a("4")}1f;border-radius:8px;'
-                f'padding:.55rem 1rem;margin:.28rem 0;">'
-                f'<span style="color:{_a("t")};font-weight:600;font-size:.88rem;">{row["title"]}</span>'
-                f'<span style="color:#64748b;font-size:.78rem;"> → {row["borrower_name"]}</span>'
-                f'<span style="float:right;">{badge}</span></div>',
-                unsafe_allow_html=True)
+        st.markdown(section_title("RECENT ACTIVITY", f'{s["total_overdue"]} OVERDUE' if s["total_overdue"] else "", "4"), unsafe_allow_html=True)
+        _activity_feed()
 
         st.markdown("---")
         st.markdown(section_title("AUTHORS", "SET O(1) dedup", "3"), unsafe_allow_html=True)
@@ -596,20 +666,106 @@ def _admin_dash(u):
             for a in sorted(list(s["authors_set"]))[:18]])
         st.markdown(f'<div style="line-height:2.2;">{tags}</div>', unsafe_allow_html=True)
 
+    with st.expander("⬇  AUDIT EXPORTS"):
+        _exports()
+
+
+EXPORT_DOWNLOAD_MB = 50            # bigger files: migrate.py export / GET /exports
+
+
+@_partial
+def _exports():
+    """
+    Stream an export to a file with a live progress bar.  Small ones are
+    read back once for the download button and the file deleted; big ones
+    stay on disk for collection until prune_exports() ages them out.
+    """
+    c1, c2, c3 = st.columns([2, 1, 1])
+    kind = c1.selectbox("Data", services.EXPORT_KINDS, key="exp_kind")
+    fmt  = c2.selectbox("Format", services.EXPORT_FORMATS, key="exp_fmt")
+    with c3:
+        st.markdown("<br>", unsafe_allow_html=True)
+        go = st.button("⬇ EXPORT", use_container_width=True)
+    if go:
+        bar = st.progress(0.0, text="Counting rows…")
+        def progress(done, total, rate):
+            bar.progress(done / max(total, 1), text=f"{done:,} / {total:,} rows · {rate:,.0f} rows/s")
+        services.prune_exports()
+        old = st.session_state.pop("exp_last", None)
+        if old and old[2] is None and os.path.exists(old[0]):
+            os.remove(old[0])                     # this session's previous big export
+        path = services.export_path(kind, fmt)
+        r = services.export_to_file(kind, fmt, path, progress)
+        data = None
+        if r["bytes"] <= EXPORT_DOWNLOAD_MB * 1048576:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.remove(path)
+        st.session_state["exp_last"] = (path, r, data)
+    last = st.session_state.get("exp_last")
+    if not last:
+        return
+    path, r, data = last
+    st.caption(f"{r['rows']:,} rows · {r['bytes'] / 1048576:.1f} MB · {r['seconds']} s · "
+               f"{r['rows_per_s']:,} rows/s" + ("" if data is not None else f" → {path}"))
+    if data is not None:
+        st.download_button("💾 Download", data, file_name=os.path.basename(path), key="exp_dl")
+    elif os.path.exists(path):
+        st.info("Too large to hand to the browser from here — collect it from the path "
+                f"above within {services.EXPORT_KEEP_HOURS} h, or stream it with GET /exports.")
+
+
+_EVENT_STYLE = {   # kind → (icon, accent)
+    "issue": ("📤", "1"), "return": ("📥", "3"), "request": ("📬", "2"),
+    "approved": ("✅", "3"), "rejected": ("❌", "4"), "fine": ("💸", "4"),
+    "payment": ("🪙", "3"), "waiver": ("🕊", "2"),
+}
+
+
+@_partial
+def _activity_feed():
+    """Newest journal events, one kind or all; Older / Newer page back through history."""
+    kind = st.selectbox("Activity", ["all", *services.EVENT_KINDS], key="feed_kind",
+                        label_visibility="collapsed")
+    key = f"feed_{kind}"
+    events, nxt = _keyset_page(key, lambda after, n: services.activity_feed(
+        None if kind == "all" else kind, after, n), limit=6)
+    if not events:
+        st.info("No activity yet.")
+    for e in events:       # events never change: the seq alone is the version
+        st.markdown(_frag("event", e["seq"], 0, lambda: _event_row(e)), unsafe_allow_html=True)
+    _keyset_nav(key, nxt, scope=_PARTIAL)
+
+
+def _event_row(e) -> str:
+    icon, acc = _EVENT_STYLE.get(e["kind"], ("•", "1"))
+    what = f'₹{e["amount"]:.0f} · {e["detail"]}' if e["amount"] is not None else e["detail"]
+    return (f'<div style="background:{_a("bg2")};border:1px solid {_a(acc)}1f;border-radius:8px;'
+            f'padding:.55rem 1rem;margin:.28rem 0;">'
+            f'<span style="color:{_a(acc)};font-size:.66rem;font-weight:700;">{icon} {e["kind"].upper()}</span> '
+            f'<span style="color:{_a("t")};font-weight:600;font-size:.86rem;">{what}</span>'
+            f'<span style="color:#64748b;font-size:.78rem;"> → {e["user_name"]}</span>'
+            f'<span style="float:right;color:#64748b;font-size:.66rem;">{fmt_date(e["created_at"])}</span></div>')
+
+
+def _overview(u) -> dict:
+    """services.student_overview, kept in the session until anything commits."""
+    ov = st.session_state.get("_overview")
+    if ov is None or ov["user_id"] != u["user_id"] or ov["version"] != services.data_version():
+        ov = st.session_state["_overview"] = services.student_overview(u["user_id"])
+    return ov
+
 
 def _student_dash(u):
     st.markdown(section_title(f"WELCOME BACK, {u['name'].upper()}", "YOUR LIBRARY DASHBOARD"), unsafe_allow_html=True)
-    issued   = services.student_issued_books(u["user_id"])
-    _, total_fine = services.student_fines(u["user_id"])
-    wishlist = list(db.get_wishlist(u["user_id"]))
-    history  = db.get_reading_history(u["user_id"])
-    unread   = db.count_unread_notifications(u["user_id"])
+    ov = _overview(u)
+    issued, total_fine, unread = ov["recent_loans"], ov["fine_total"], ov["unread"]
 
     c1,c2,c3,c4,c5 = st.columns(5)
-    c1.markdown(metric_card(len(issued),          "ACTIVE LOANS","1","📖"), unsafe_allow_html=True)
+    c1.markdown(metric_card(ov["loans"],          "ACTIVE LOANS","1","📖"), unsafe_allow_html=True)
     c2.markdown(metric_card(f"₹{total_fine:.0f}", "FINE",        "4" if total_fine else "3","⚠️"), unsafe_allow_html=True)
-    c3.markdown(metric_card(len(wishlist),        "WISHLIST",    "2","♥"), unsafe_allow_html=True)
-    c4.markdown(metric_card(len(history),         "BOOKS READ",  "5","📚"), unsafe_allow_html=True)
+    c3.markdown(metric_card(ov["wishlist"],       "WISHLIST",    "2","♥"), unsafe_allow_html=True)
+    c4.markdown(metric_card(ov["read"],           "BOOKS READ",  "5","📚"), unsafe_allow_html=True)
     c5.markdown(metric_card(unread,               "NOTIFS",      "4" if unread else "1","🔔"), unsafe_allow_html=True)
 
     st.markdown("---")
@@ -630,6 +786,8 @@ def _student_dash(u):
                 f'</div>{badge}</div>'
                 f'{pbar(pct_, bc)}</div>',
                 unsafe_allow_html=True)
+        if ov["loans"] > len(issued):
+            st.caption(f"+{ov['loans'] - len(issued)} more due later — see Issue / Return.")
     else:
         st.markdown(
             f'<div style="text-align:center;padding:2rem;color:#64748b;'
@@ -641,6 +799,94 @@ def _student_dash(u):
 # ══════════════════════════════════════════════════════════════
 # PAGE: BOOKS
 # ══════════════════════════════════════════════════════════════
+PAGE_SIZES = [24, 48, 96]          # catalogue cards per page (multiples of 3 columns)
+
+
+def _book_card(bk, avg_r, in_w) -> str:
+    av   = bk["available_copies"]; tot = bk["total_copies"]
+    ac_  = _a("3") if av > 0 else "#ff2d55"
+    pct_ = (av / tot * 100) if tot else 0
+    return (
+        f'<div class="bcard">'
+        f'<{"div class=\'dot-g\'" if av else "div class=\'dot-r\'"}></div>'
+        f'<div style="font-weight:700;color:{_a("t")};font-size:.92rem;padding-right:1.4rem;line-height:1.35;margin-bottom:.28rem;">{bk["title"]}</div>'
+        f'<div style="font-size:.7rem;color:{_a("1")};">✍ {bk["author"]}</div>'
+        f'<div style="font-size:.68rem;color:#64748b;margin:.18rem 0 .5rem;">🗂 {bk["category"]}</div>'
+        f'{"<div style=\'font-size:.72rem;margin-bottom:.3rem;\'>" + stars(int(avg_r)) + "</div>" if avg_r else ""}'
+        f'<div style="display:flex;justify-content:space-between;font-size:.7rem;">'
+        f'<span style="color:{ac_};">{av}/{tot} avail</span>'
+        f'<span style="color:#3a4a5a;font-size:.63rem;">ID: {bk["book_id"]}</span></div>'
+        f'{pbar(pct_, ac_)}'
+        f'<div style="font-size:.63rem;color:#3a4a5a;margin-top:.35rem;">📊 {bk["borrow_count"]} borrows {"♥" if in_w else ""}</div>'
+        f'</div>')
+
+
+@_partial
+def _catalog_grid(u):
+    """
+    Search box, grid and pager.  Only the visible page is built and
+    sent: 24 cards, not the catalogue.  Hearts, holds and paging rerun
+    this fragment alone.
+    """
+    cs, cf, cn = st.columns([3, 1, .6])
+    with cs:
+        q = st.text_input("", placeholder="🔍  Search title, author or category…",
+                          label_visibility="collapsed", key="bk_q")
+    with cf:
+        sort = st.selectbox("", list(services.BOOK_SORTS),
+                            label_visibility="collapsed", key="bk_sort")
+    with cn:
+        size = st.selectbox("", PAGE_SIZES, label_visibility="collapsed", key="bk_size")
+
+    ss = st.session_state
+    if ss.get("bk_sig") != (q, sort, size):     # new search / sort → page 1
+        ss.bk_sig, ss.bk_page = (q, sort, size), 0
+    t0 = time.perf_counter()
+    books, total = services.catalog_page(q, sort, ss.bk_page, size)
+    ratings, wished = services.catalog_page_extras(u["user_id"], books)
+    pages = max(1, -(-total // size))
+
+    mf = "Share Tech Mono" if DARK else "Inter"
+    st.markdown(f'<div style="font-family:{mf},monospace;font-size:.72rem;color:#64748b;margin-bottom:.9rem;">'
+                f'{total} books{"  ·  trigram index" if q else ""}</div>',
+                unsafe_allow_html=True)
+
+    sent = 0
+    for i in range(0, len(books), 3):
+        cols_ = st.columns(3)
+        for j, bk in enumerate(books[i:i+3]):
+            with cols_[j]:
+                av   = bk["available_copies"]
+                in_w = bk["book_id"] in wished
+                avg_r = ratings.get(bk["book_id"], 0)
+                card = _frag("book", (bk["book_id"], in_w),
+                             (bk["title"], bk["author"], bk["category"], av,
+                              bk["total_copies"], bk["borrow_count"], int(avg_r)),
+                             lambda: _book_card(bk, avg_r, in_w))
+                sent += len(card.encode())
+                st.markdown(card, unsafe_allow_html=True)
+
+                wl = "♥ Wishlisted" if in_w else "♡ Wishlist"
+                if st.button(wl, key=f"wl_{bk['book_id']}", use_container_width=True):
+                    _, msg = services.toggle_wishlist(u["user_id"], bk["book_id"])
+                    st.toast(msg); st.rerun(scope=_PARTIAL)
+                if not av and st.button("⏳ Place Hold", key=f"hd_{bk['book_id']}",
+                                        use_container_width=True):
+                    ok, msg = services.place_hold(bk["book_id"], u["user_id"])
+                    st.toast(msg if ok else f"⛔ {msg}")
+
+    cp, ci, cx = st.columns([1, 2, 1])
+    if cp.button("◀ PREV", use_container_width=True, disabled=ss.bk_page == 0):
+        ss.bk_page -= 1; st.rerun(scope=_PARTIAL)
+    if cx.button("NEXT ▶", use_container_width=True, disabled=ss.bk_page + 1 >= pages):
+        ss.bk_page += 1; st.rerun(scope=_PARTIAL)
+    ci.markdown(
+        f'<div style="text-align:center;font-family:{mf},monospace;font-size:.7rem;color:#64748b;padding-top:.55rem;">'
+        f'PAGE {ss.bk_page + 1} / {pages}  ·  {len(books)} cards  ·  '
+        f'{sent / 1024:.1f} KB card HTML  ·  {(time.perf_counter() - t0) * 1000:.0f} ms</div>',
+        unsafe_allow_html=True)
+
+
 def page_books():
     auth.require_login()
     u = auth.current_user()
@@ -653,53 +899,7 @@ def page_books():
 
     # ── browse ────────────────────────────────────────────────
     with tabs[0]:
-        cs, cf = st.columns([3, 1])
-        with cs:
-            q = st.text_input("", placeholder="🔍  Search title, author or category…",
-                              label_visibility="collapsed")
-        with cf:
-            sort = st.selectbox("", ["Default","Most Borrowed","A–Z","Available First"],
-                                label_visibility="collapsed")
-
-        books = services.search_books(q) if q else services.all_books_as_dicts()
-        if sort == "Most Borrowed":    books = sorted(books, key=lambda b: b.get("borrow_count",0), reverse=True)
-        elif sort == "A–Z":            books = sorted(books, key=lambda b: b["title"].lower())
-        elif sort == "Available First":books = sorted(books, key=lambda b: b["available_copies"], reverse=True)
-
-        mf = "Share Tech Mono" if DARK else "Inter"
-        st.markdown(f'<div style="font-family:{mf},monospace;font-size:.72rem;color:#64748b;margin-bottom:.9rem;">'
-                    f'{len(books)} books{"  ·  linear search O(n)" if q else ""}</div>',
-                    unsafe_allow_html=True)
-
-        for i in range(0, len(books), 3):
-            cols_ = st.columns(3)
-            for j, bk in enumerate(books[i:i+3]):
-                with cols_[j]:
-                    av   = bk["available_copies"]; tot = bk["total_copies"]
-                    ac_  = _a("3") if av > 0 else "#ff2d55"
-                    pct_ = (av / tot * 100) if tot else 0
-                    avg_r, _ = db.get_book_avg_rating(bk["book_id"])
-                    in_w = db.is_in_wishlist(u["user_id"], bk["book_id"])
-
-                    st.markdown(
-                        f'<div class="bcard">'
-                        f'<{"div class=\\'dot-g\\'" if av else "div class=\\'dot-r\\'"}></div>'
-                        f'<div style="font-weight:700;color:{_a("t")};font-size:.92rem;padding-right:1.4rem;line-height:1.35;margin-bottom:.28rem;">{bk["title"]}</div>'
-                        f'<div style="font-size:.7rem;color:{_a("1")};">✍ {bk["author"]}</div>'
-                        f'<div style="font-size:.68rem;color:#64748b;margin:.18rem 0 .5rem;">🗂 {bk["category"]}</div>'
-                        f'{"<div style=\\'font-size:.72rem;margin-bottom:.3rem;\\'>" + stars(int(avg_r)) + "</div>" if avg_r else ""}'
-                        f'<div style="display:flex;justify-content:space-between;font-size:.7rem;">'
-                        f'<span style="color:{ac_};">{av}/{tot} avail</span>'
-                        f'<span style="color:#3a4a5a;font-size:.63rem;">ID: {bk["book_id"]}</span></div>'
-                        f'{pbar(pct_, ac_)}'
-                        f'<div style="font-size:.63rem;color:#3a4a5a;margin-top:.35rem;">📊 {bk["borrow_count"]} borrows {"♥" if in_w else ""}</div>'
-                        f'</div>',
-                        unsafe_allow_html=True)
-
-                    wl = "♥ Wishlisted" if in_w else "♡ Wishlist"
-                    if st.button(wl, key=f"wl_{bk['book_id']}_{i}_{j}", use_container_width=True):
-                        _, msg = services.toggle_wishlist(u["user_id"], bk["book_id"])
-                        st.toast(msg); st.rerun()
+        _catalog_grid(u)
 
     # ── add / remove (admin) ──────────────────────────────────
     if u["role"] == "admin" and len(tabs) > 1:
@@ -720,7 +920,7 @@ def page_books():
         with tabs[2]:
             st.markdown(section_title("REMOVE BOOK","","4"), unsafe_allow_html=True)
             st.warning("⚠️ Books with active loans cannot be deleted.")
-            all_bks = services.all_books_as_dicts()
+            all_bks = services.all_books()
             if all_bks:
                 opts = {f"{b['title']}  ({b['book_id']})": b["book_id"] for b in all_bks}
                 sel = st.selectbox("SELECT BOOK", list(opts.keys()))
@@ -729,16 +929,53 @@ def page_books():
                     st.success(msg) if ok else st.error(msg)
                     if ok: st.rerun()
 
+            st.markdown(section_title("BULK WITHDRAW","WEEDING","4"), unsafe_allow_html=True)
+            raw = st.text_area("BOOK IDS (one per line or comma-separated)", height=120, key="wd_ids")
+            if st.button("🗑 WITHDRAW ALL LISTED", use_container_width=True, disabled=not raw.strip()):
+                ok, msg, blocked = services.withdraw_books(raw.replace(",", "\n").splitlines())
+                st.success(msg) if ok else st.error(msg)
+                if blocked:
+                    st.download_button("⬇ Blocked IDs (on loan)", "\n".join(blocked),
+                                       file_name="blocked_books.txt")
+
 
 # ══════════════════════════════════════════════════════════════
 # PAGE: ISSUE / RETURN
 # ══════════════════════════════════════════════════════════════
+_PICKERS = {   # kind → (typeahead service, id field, option label)
+    "books": (services.suggest_books, "book_id",
+              lambda b: f"{b.book_id} · {b.title} ({b.available_copies}/{b.total_copies} avail)"),
+    "users": (services.suggest_users, "user_id",
+              lambda x: f"{x.user_id} · {x.name} <{x.email}>"),
+}
+
+
+def _id_picker(label, key, kind, placeholder) -> str:
+    """
+    Text box → first matches on id prefix / title / name, picked from a
+    short list.  Returns the picked id, or the text as typed when
+    nothing matches.
+    """
+    text = st.text_input(label, placeholder=placeholder, key=key).strip()
+    if not text:
+        return ""
+    suggest, id_field, describe = _PICKERS[kind]
+    hits = {describe(h): h[id_field] for h in suggest(text)}
+    if not hits:
+        st.caption("No match — the ID is used as typed.")
+        return text
+    return hits[st.selectbox(label, list(hits), key=f"{key}_pick",
+                             label_visibility="collapsed")]
+
+
 def page_loans():
     auth.require_login()
     u = auth.current_user()
     st.markdown(section_title("ISSUE / RETURN", "MANAGE BOOK LOANS", "2"), unsafe_allow_html=True)
 
-    t1, t2 = st.tabs(["📤 Issue Book", "📥 Return Book"])
+    tabs = st.tabs(["📤 Issue Book", "📥 Return Book", "⏳ Holds"]
+                   + (["⚡ Desk Mode", "💸 Fine Desk"] if u["role"] == "admin" else []))
+    t1, t2 = tabs[:2]
 
     with t1:
         st.markdown(
@@ -748,38 +985,39 @@ def page_loans():
             unsafe_allow_html=True)
         ci, cb = st.columns([2, 1])
         with ci:
-            bid = st.text_input("BOOK ID", placeholder="BK-XXXXXX", key="iss_bid")
+            bid = _id_picker("BOOK", "iss_bid", "books", "BK-XXXXXX or title / author")
             target = u["user_id"]
             if u["role"] == "admin":
-                uf = st.text_input("ISSUE FOR USER ID (blank = yourself)", placeholder="USR-XXXXXX", key="iss_uid")
-                if uf.strip(): target = uf.strip()
+                uf = _id_picker("ISSUE FOR USER (blank = yourself)", "iss_uid", "users",
+                                "USR-XXXXXX or name / email")
+                if uf: target = uf
         with cb:
             st.markdown("<br><br>", unsafe_allow_html=True)
             if st.button("📤 ISSUE", use_container_width=True):
-                if not bid.strip(): st.error("Enter a Book ID.")
+                if not bid: st.error("Enter a Book ID.")
                 else:
-                    ok, msg = services.issue_book(bid.strip().upper(), target)
+                    ok, msg = services.issue_book(bid.upper(), target)
                     st.success(msg) if ok else st.error(f"⛔ {msg}")
                     if ok: st.rerun()
         st.markdown("---")
         st.markdown(f'<div style="font-size:.7rem;color:#64748b;margin-bottom:.4rem;">AVAILABLE BOOKS (quick ref)</div>', unsafe_allow_html=True)
-        for b in [x for x in services.all_books_as_dicts() if x["available_copies"] > 0][:8]:
+        for b in services.available_books(8):
             st.markdown(row_line(b["title"], b["book_id"], f'<span style="color:{_a("3")};">{b["available_copies"]} avail</span>'), unsafe_allow_html=True)
 
     with t2:
         cr, cb2 = st.columns([2, 1])
         with cr:
-            rbid = st.text_input("BOOK ID", placeholder="BK-XXXXXX", key="ret_bid")
+            rbid = _id_picker("BOOK", "ret_bid", "books", "BK-XXXXXX or title / author")
             rtarget = u["user_id"]
             if u["role"] == "admin":
-                ruf = st.text_input("RETURN FOR USER ID", placeholder="USR-XXXXXX", key="ret_uid")
-                if ruf.strip(): rtarget = ruf.strip()
+                ruf = _id_picker("RETURN FOR USER", "ret_uid", "users", "USR-XXXXXX or name / email")
+                if ruf: rtarget = ruf
         with cb2:
             st.markdown("<br><br>", unsafe_allow_html=True)
             if st.button("📥 RETURN", use_container_width=True):
-                if not rbid.strip(): st.error("Enter a Book ID.")
+                if not rbid: st.error("Enter a Book ID.")
                 else:
-                    ok, msg, fine = services.return_book(rbid.strip().upper(), rtarget)
+                    ok, msg, fine = services.return_book(rbid.upper(), rtarget)
                     if ok:
                         st.warning(msg) if fine > 0 else st.success(msg)
                         st.rerun()
@@ -791,6 +1029,144 @@ def page_loans():
             badge = f'<span class="b-ov">OVERDUE</span>' if b["is_overdue"] else f'<span class="b-ok">{days}d</span>'
             st.markdown(row_line(b["title"], b["book_id"], badge), unsafe_allow_html=True)
 
+    with tabs[2]:
+        _holds(u)
+
+    if len(tabs) > 3:
+        with tabs[3]:
+            _desk_mode()
+        with tabs[4]:
+            _fine_desk(u)
+
+
+@_partial
+def _holds(u):
+    """My place in each hold queue; admins also run the expiry sweep."""
+    if u["role"] == "admin":
+        n = services.hold_counts()
+        c1, c2, c3 = st.columns(3)
+        c1.markdown(metric_card(n["waiting"], "WAITING", "1", "⏳"), unsafe_allow_html=True)
+        c2.markdown(metric_card(n["ready"], "ON HOLD SHELF", "3", "📦"), unsafe_allow_html=True)
+        with c3:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("⌛ SWEEP EXPIRED", use_container_width=True):
+                st.toast(f"{services.expire_holds()} expired hold(s) passed on.")
+                st.rerun(scope=_PARTIAL)
+        st.markdown("---")
+
+    holds = services.student_holds(u["user_id"])
+    if not holds:
+        st.info(f"No holds. Fully issued books can be held from the catalog — "
+                f"you get {services.HOLD_PICKUP_DAYS} days to pick up a copy set aside for you.")
+    for h in holds:
+        if h["status"] == "ready":
+            badge = f'<span class="b-ok">READY · PICK UP BY {fmt_date(h["expires_at"])}</span>'
+        else:
+            badge = f'<span class="b-pe">#{h["ahead"] + 1} IN LINE</span>'
+        c1, c2 = st.columns([5, 1])
+        c1.markdown(row_line(h["title"], h["book_id"], badge), unsafe_allow_html=True)
+        if c2.button("✕", key=f"hx_{h['hold_id']}", help="Cancel hold"):
+            _, msg = services.cancel_hold(h["book_id"], u["user_id"])
+            st.toast(msg); st.rerun(scope=_PARTIAL)
+
+
+def _desk_scan():
+    """on_change of the scan box: a scanner types the code + Enter."""
+    ss = st.session_state
+    code = ss.desk_scan.strip().upper()
+    if code and code not in ss.desk_items:      # ignore double scans
+        ss.desk_items.append(code)
+    ss.desk_scan = ""
+
+
+@_partial
+def _desk_mode():
+    """
+    Front-desk batch checkout.  Each scan only queues a Book ID and
+    reruns this fragment alone; one click then issues / returns the
+    whole stack in ONE transaction.
+    """
+    ss = st.session_state
+    ss.setdefault("desk_items", [])
+    mode = st.radio("MODE", ["Issue", "Return"], horizontal=True, key="desk_mode")
+    uid  = st.text_input("STUDENT ID (scan card)", placeholder="USR-…", key="desk_uid").strip()
+    st.text_input("SCAN BOOK", placeholder="Scan or type a Book ID, then Enter",
+                  key="desk_scan", on_change=_desk_scan)
+
+    for code in ss.desk_items:
+        st.markdown(row_line(code, "", "queued"), unsafe_allow_html=True)
+    c1, c2 = st.columns([2, 1])
+    if c1.button(f"⚡ {mode.upper()} {len(ss.desk_items)} ITEM(S)", use_container_width=True,
+                 disabled=not (ss.desk_items and uid)):
+        run = services.issue_books if mode == "Issue" else services.return_books
+        ss.desk_results = run([(b, uid) for b in ss.desk_items])
+        ss.desk_items = []
+        st.rerun(scope=_PARTIAL)
+    if c2.button("✕ CLEAR", use_container_width=True):
+        ss.desk_items, ss.desk_results = [], []
+        st.rerun(scope=_PARTIAL)
+
+    results = ss.get("desk_results") or []
+    if results:
+        done = sum(r["ok"] for r in results)
+        st.markdown(section_title("LAST BATCH", f"{done}/{len(results)} OK", "2"), unsafe_allow_html=True)
+        for r in results:
+            badge = '<span class="b-ok">OK</span>' if r["ok"] else '<span class="b-ov">FAILED</span>'
+            st.markdown(row_line(r["book_id"], r["message"], badge), unsafe_allow_html=True)
+
+
+def _parse_payments(raw) -> tuple[list, list]:
+    """'USR-… 25' per line (commas ok) → ([(user_id, amount), …], unreadable lines)."""
+    pays, bad = [], []
+    for line in raw.splitlines():
+        parts = line.replace(",", " ").split()
+        if not parts:
+            continue
+        amount = services.payment_amount(parts[1].lstrip("₹")) if len(parts) == 2 else None
+        if amount is None:
+            bad.append(line.strip())
+        else:
+            pays.append((parts[0], amount))
+    return pays, bad
+
+
+@_partial
+def _fine_desk(u):
+    """
+    End of day: the desk's cash sheet pasted in, settled in ONE
+    transaction — each payment pays off that user's oldest fines first.
+    """
+    ss = st.session_state
+    raw = st.text_area("PAYMENTS — one per line: USER_ID AMOUNT", key="pay_lines", height=140,
+                       placeholder="USR-…  25\nUSR-…  10")
+    pays, bad = _parse_payments(raw)
+    if bad:
+        st.warning(f"Skipping {len(bad)} unreadable line(s): {', '.join(bad[:5])}")
+    note = st.text_input("NOTE (optional)", key="pay_note", placeholder="e.g. desk cash, 19 Oct")
+    if st.button(f"💸 SETTLE {len(pays)} PAYMENT(S)", use_container_width=True, disabled=not pays):
+        ss.pay_results = services.settle_payments(pays, u["name"], note.strip())
+        st.rerun(scope=_PARTIAL)
+
+    results = ss.get("pay_results") or []
+    if results:
+        done = [r for r in results if r["ok"]]
+        st.markdown(section_title("LAST SETTLEMENT",
+                                  f"{len(done)}/{len(results)} OK · ₹{sum(r['amount'] for r in done):.2f}",
+                                  "3"), unsafe_allow_html=True)
+        for r in results:
+            badge = '<span class="b-ok">OK</span>' if r["ok"] else '<span class="b-ov">REFUSED</span>'
+            st.markdown(row_line(r["user_id"], r["message"], badge), unsafe_allow_html=True)
+
+    st.markdown("---")
+    cf, cn, cb = st.columns([2, 2, 1])
+    fid  = cf.text_input("WAIVE FINE", placeholder="FIN-…", key="waive_fid").strip()
+    why  = cn.text_input("REASON", key="waive_note")
+    with cb:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("🕊 WAIVE", use_container_width=True, disabled=not fid):
+            ok, msg = services.waive_fine(fid, u["name"], why.strip())
+            st.success(msg) if ok else st.error(f"⛔ {msg}")
+
 
 # ══════════════════════════════════════════════════════════════
 # PAGE: BOOK REQUESTS
@@ -822,11 +1198,11 @@ def _student_reqs(u):
             st.success(msg) if ok else st.error(msg)
 
     with t2:
-        reqs = db.get_requests_by_user(u["user_id"])
+        reqs = services.student_requests(u["user_id"],
+                                         st.checkbox("Include archived", key="req_arch"))
         if not reqs:
             st.info("No requests submitted yet.")
         for r in reqs:
-            r = dict(r)
             note_html = (f'<div style="font-size:.78rem;color:{_a("3")};margin-top:.3rem;">'
                          f'💬 Admin: {r["admin_note"]}</div>') if r["admin_note"] else ""
             st.markdown(
@@ -845,15 +1221,18 @@ def _student_reqs(u):
 
 def _admin_reqs(u):
     st.markdown(section_title("BOOK REQUESTS", "REVIEW & RESPOND", "5"), unsafe_allow_html=True)
-    pend = db.count_pending_requests()
+    pend = services.pending_request_count()
     t1, t2 = st.tabs([f"⏳ Pending ({pend})", "📋 All"])
 
     for idx, tab in enumerate([t1, t2]):
         with tab:
-            all_r = [dict(r) for r in db.get_all_requests()]
-            reqs  = [r for r in all_r if r["status"] == "pending"] if idx == 0 else all_r
+            key  = "reqs_pending" if idx == 0 else "reqs_all"
+            reqs, nxt = _keyset_page(key, lambda after, n: services.requests_page(
+                "pending" if idx == 0 else None, after, n))
             if not reqs:
                 st.info("Nothing here."); continue
+            if idx == 0:
+                _bulk_respond(u, reqs)
             for r in reqs:
                 with st.expander(f"📬  {r['book_title']}  —  {r['user_name']}", expanded=(r["status"]=="pending")):
                     st.markdown(
@@ -875,6 +1254,42 @@ def _admin_reqs(u):
                             if st.button("❌ Reject", key=f"rj_{r['request_id']}", use_container_width=True):
                                 ok, msg = services.respond_to_request(r["request_id"], "rejected", note, u["name"])
                                 st.warning(msg); st.rerun()
+            _keyset_nav(key, nxt)
+
+
+def _bulk_respond(u, reqs):
+    """Approve / reject many requests on this page in one transaction."""
+    with st.expander("⚡ BULK RESPOND"):
+        every = st.checkbox("Select all on this page", key="bulk_all")
+        ids = [r.request_id for r in reqs] if every else st.multiselect(
+            "Requests", [r.request_id for r in reqs], key="bulk_sel",
+            format_func=lambda rid: next(f"{r.book_title} — {r.user_name}" for r in reqs if r.request_id == rid))
+        note = st.text_input("Admin note (sent to every student)", key="bulk_note")
+        ca, cb_ = st.columns(2)
+        for col, status, label in ((ca, "approved", "✅ Approve selected"),
+                                   (cb_, "rejected", "❌ Reject selected")):
+            if col.button(f"{label} ({len(ids)})", key=f"bulk_{status}",
+                          use_container_width=True, disabled=not ids):
+                ok, msg = services.respond_to_requests(ids, status, note, u["name"])
+                st.success(msg) if ok else st.error(msg); st.rerun()
+
+
+def _keyset_page(key, fetch, limit=20):
+    """
+    Current page of a services.*_page(after, limit) listing.  The
+    cursors of the pages visited so far live in session_state[key].
+    """
+    stack = st.session_state.setdefault(key, [None])
+    return fetch(stack[-1], limit)
+
+
+def _keyset_nav(key, next_key, scope="app"):
+    stack = st.session_state[key]
+    cp, cn = st.columns(2)
+    if len(stack) > 1 and cp.button("◀ Newer", key=f"{key}_prev", use_container_width=True):
+        stack.pop(); st.rerun(scope=scope)
+    if next_key and cn.button("Older ▶", key=f"{key}_next", use_container_width=True):
+        stack.append(next_key); st.rerun(scope=scope)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -884,28 +1299,19 @@ def page_notifs():
     auth.require_login()
     u = auth.current_user()
     st.markdown(section_title("NOTIFICATIONS", "YOUR ACTIVITY FEED"), unsafe_allow_html=True)
-    notifs = db.get_notifications(u["user_id"], 30)
+    _notif_feed(u)
+
+
+@_partial
+def _notif_feed(u):
+    """Mark-all-read reruns the feed only; the sidebar badge catches up on the next page."""
+    notifs, _ = services.user_notifications(u["user_id"], limit=30)
     if notifs:
         if st.button("✓  Mark all as read"):
-            db.mark_notifications_read(u["user_id"]); st.rerun()
-        tmap = {"success":_a("3"),"warning":_a("5"),"error":"#ff2d55","info":_a("1")}
-        imap = {"success":"✅","warning":"⚠️","error":"❌","info":"ℹ️"}
+            services.mark_notifications_read(u["user_id"]); st.rerun(scope=_PARTIAL)
         for n in notifs:
-            n = dict(n)
-            c = tmap.get(n["type"], _a("1"))
-            ico = imap.get(n["type"], "ℹ️")
-            op = "1" if not n["is_read"] else ".44"
-            dot = '<span class="ndot"></span>' if not n["is_read"] else ""
-            st.markdown(
-                f'<div style="background:{_a("bg2")};border:1px solid {c}22;border-radius:10px;'
-                f'padding:.78rem 1rem;margin:.28rem 0;opacity:{op};transition:opacity .3s;">'
-                f'<div style="display:flex;align-items:flex-start;gap:.8rem;">'
-                f'<span style="font-size:1.05rem;">{ico}</span>'
-                f'<div style="flex:1;">'
-                f'<div style="font-size:.88rem;color:{_a("t")};">{n["message"]}{dot}</div>'
-                f'<div style="font-size:.67rem;color:#64748b;margin-top:3px;">{fmt_date(n["created_at"])}</div>'
-                f'</div></div></div>',
-                unsafe_allow_html=True)
+            st.markdown(_frag("notif", n["notif_id"], n["is_read"], lambda: _notif_card(n)),
+                        unsafe_allow_html=True)
     else:
         st.markdown(
             f'<div style="text-align:center;padding:3rem;color:#64748b;">'
@@ -914,6 +1320,24 @@ def page_notifs():
             unsafe_allow_html=True)
 
 
+def _notif_card(n) -> str:
+    tmap = {"success":_a("3"),"warning":_a("5"),"error":"#ff2d55","info":_a("1")}
+    imap = {"success":"✅","warning":"⚠️","error":"❌","info":"ℹ️"}
+    c = tmap.get(n["type"], _a("1"))
+    ico = imap.get(n["type"], "ℹ️")
+    op = "1" if not n["is_read"] else ".44"
+    dot = '<span class="ndot"></span>' if not n["is_read"] else ""
+    return (
+        f'<div style="background:{_a("bg2")};border:1px solid {c}22;border-radius:10px;'
+        f'padding:.78rem 1rem;margin:.28rem 0;opacity:{op};transition:opacity .3s;">'
+        f'<div style="display:flex;align-items:flex-start;gap:.8rem;">'
+        f'<span style="font-size:1.05rem;">{ico}</span>'
+        f'<div style="flex:1;">'
+        f'<div style="font-size:.88rem;color:{_a("t")};">{n["message"]}{dot}</div>'
+        f'<div style="font-size:.67rem;color:#64748b;margin-top:3px;">{fmt_date(n["created_ts"] or n["created_at"])}</div>'
+        f'</div></div></div>')
+
+
 # ══════════════════════════════════════════════════════════════
 # PAGE: WISHLIST
 # ══════════════════════════════════════════════════════════════
@@ -921,7 +1345,12 @@ def page_wishlist():
     auth.require_login()
     u = auth.current_user()
     st.markdown(section_title("MY WISHLIST", "BOOKS YOU WANT TO READ", "2"), unsafe_allow_html=True)
-    items = list(db.get_wishlist(u["user_id"]))
+    _wishlist_grid(u)
+
+
+@_partial
+def _wishlist_grid(u):
+    items = list(services.student_wishlist(u["user_id"]))
     if not items:
         st.markdown(
             f'<div style="text-align:center;padding:3rem;color:#64748b;'
@@ -947,7 +1376,7 @@ def page_wishlist():
                     f'</div>',
                     unsafe_allow_html=True)
                 if st.button("♥ Remove", key=f"rw_{it['book_id']}_{i}_{j}", use_container_width=True):
-                    db.remove_from_wishlist(u["user_id"], it["book_id"]); st.rerun()
+                    services.remove_from_wishlist(u["user_id"], it["book_id"]); st.rerun(scope=_PARTIAL)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -957,7 +1386,7 @@ def page_history():
     auth.require_login()
     u = auth.current_user()
     st.markdown(section_title("READING HISTORY", "BOOKS YOU'VE READ — RATE & REVIEW", "5"), unsafe_allow_html=True)
-    hist = db.get_reading_history(u["user_id"])
+    hist = services.reading_history(u["user_id"], st.checkbox("Include archived", key="hist_arch"))
     if not hist:
         st.info("No history yet. Return a book to start tracking!"); return
 
@@ -977,8 +1406,8 @@ def page_history():
     st.markdown("---")
     for h in hist:
         h = dict(h)
-        avg_r, rev_n = db.get_book_avg_rating(h["book_id"])
-        with st.expander(f"📖  {h['book_title']}  —  {h['author']}  —  {fmt_date(h['returned_at'])}"):
+        avg_r, rev_n = services.book_rating(h["book_id"])
+        with st.expander(f"📖  {h['book_title']}  —  {h['author']}  —  {fmt_date(h['returned_ts'] or h['returned_at'])}"):
             cl1, cl2 = st.columns([2, 1])
             with cl1:
                 st.markdown(
@@ -994,6 +1423,8 @@ def page_history():
                         f'background:{_a("bg2")};border-radius:6px;font-style:italic;">"{h["review"]}"</div>',
                         unsafe_allow_html=True)
             with cl2:
+                if h.get("archived"):
+                    st.caption("Archived — read only"); continue
                 st.markdown(f'<div style="font-size:.72rem;color:#64748b;margin-bottom:.28rem;">YOUR RATING</div>', unsafe_allow_html=True)
                 nr   = st.selectbox("R", [0,1,2,3,4,5], index=h["rating"],
                                     format_func=lambda x: "Not rated" if x==0 else "⭐"*x,
@@ -1030,30 +1461,54 @@ def page_profile():
             unsafe_allow_html=True)
 
     with cr:
-        issued   = services.student_issued_books(u["user_id"])
-        fines, total_fine = services.student_fines(u["user_id"])
-        history  = db.get_reading_history(u["user_id"])
-        wishlist = list(db.get_wishlist(u["user_id"]))
+        ov = _overview(u)
+        fines, total_fine = ov["recent_fines"], ov["fine_total"]
 
         c1,c2,c3,c4 = st.columns(4)
-        c1.markdown(metric_card(len(issued),          "ACTIVE LOANS","1","📖"), unsafe_allow_html=True)
+        c1.markdown(metric_card(ov["loans"],          "ACTIVE LOANS","1","📖"), unsafe_allow_html=True)
         c2.markdown(metric_card(f"₹{total_fine:.0f}", "FINE",        "4" if total_fine else "3","💸"), unsafe_allow_html=True)
-        c3.markdown(metric_card(len(history),         "READ",        "5","📚"), unsafe_allow_html=True)
-        c4.markdown(metric_card(len(wishlist),        "WISHLIST",    "2","♥"), unsafe_allow_html=True)
+        c3.markdown(metric_card(ov["read"],           "READ",        "5","📚"), unsafe_allow_html=True)
+        c4.markdown(metric_card(ov["wishlist"],       "WISHLIST",    "2","♥"), unsafe_allow_html=True)
 
         if fines:
             st.markdown(section_title("FINE HISTORY","","4"), unsafe_allow_html=True)
-            for f in fines[:6]:
+            for f in fines:
                 sc = "#ff2d55" if not f["paid"] else _a("3")
+                state = ("PAID" if f["paid"] else
+                         f'PART-PAID ₹{f["settled"]:.0f}' if f["settled"] else "UNPAID")
                 st.markdown(
                     f'<div style="background:{_a("bg2")};border:1px solid {_a("4")}1f;border-radius:8px;'
                     f'padding:.55rem 1rem;margin:.28rem 0;">'
                     f'<span style="font-weight:600;color:{_a("t")};">{f["title"]}</span>'
                     f'<span style="float:right;font-weight:700;color:{sc};">₹{f["amount"]:.0f}</span><br>'
                     f'<span style="font-size:.67rem;color:#64748b;">{f["days_late"]}d late · {fmt_date(f["created_at"])}</span>'
-                    f'<span style="float:right;font-size:.67rem;color:{sc};">{"UNPAID" if not f["paid"] else "PAID"}</span>'
+                    f'<span style="float:right;font-size:.67rem;color:{sc};">{state}</span>'
                     f'</div>',
                     unsafe_allow_html=True)
+            _ledger(u)
+
+
+_LEDGER_STYLE = {"charge": ("#ff2d55", "CHARGE"), "payment": ("3", "PAYMENT"), "waiver": ("2", "WAIVED")}
+
+
+@_partial
+def _ledger(u):
+    """Charges, payments and waivers, newest first, each with the balance after it."""
+    key = f"ledger_{u['user_id']}"
+    rows, nxt = _keyset_page(key, lambda after, n: services.fine_ledger(u["user_id"], after, n),
+                             limit=8)
+    if not rows:
+        return
+    st.markdown(section_title("FINE LEDGER", "RUNNING BALANCE", "3"), unsafe_allow_html=True)
+    for e in rows:
+        acc, label = _LEDGER_STYLE.get(e["kind"], ("1", e["kind"].upper()))
+        col = acc if acc.startswith("#") else _a(acc)
+        what = e["note"] or (e["fine_id"] or "")
+        st.markdown(row_line(f'{label} ₹{abs(e["amount"]):.2f}',
+                             f'{what} · {fmt_date(e["created_at"])}',
+                             f'<span style="color:{col};">bal ₹{e["balance_after"]:.2f}</span>'),
+                    unsafe_allow_html=True)
+    _keyset_nav(key, nxt, scope=_PARTIAL)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -1065,34 +1520,39 @@ def page_users():
     st.markdown(section_title("USER REGISTRY", "ALL REGISTERED ACCOUNTS", "2"), unsafe_allow_html=True)
 
     q = st.text_input("", placeholder="🔍  Search by name or email…", label_visibility="collapsed")
-    users = services.search_users(q) if q else services.all_users_as_dicts()
+    users = services.search_users(q) if q else services.all_users()
     mf = "Share Tech Mono" if DARK else "Inter"
     st.markdown(f'<div style="font-family:{mf},monospace;font-size:.72rem;color:#64748b;margin-bottom:.8rem;">{len(users)} users</div>', unsafe_allow_html=True)
 
+    # 3 grouped reads for all users: the card text and its cache version
+    counts = services.user_counts(u["user_id"] for u in users)
     for u in users:
-        u = dict(u) if not isinstance(u, dict) else u
-        color  = u.get("avatar_color", _a("1"))
-        issued = db.get_issued_books_by_user(u["user_id"])
-        fine   = db.get_total_fine_by_user(u["user_id"])
-        hist   = db.get_reading_history(u["user_id"])
-        st.markdown(
-            f'<div class="card {"card-m" if u["role"]=="admin" else ""}">'
-            f'<div style="display:flex;align-items:center;gap:.9rem;">'
-            f'<div style="width:42px;height:42px;border-radius:50%;background:{color};flex-shrink:0;'
-            f'display:flex;align-items:center;justify-content:center;'
-            f'font-weight:900;font-size:1.1rem;color:#000;{_sh(color,11)}">'
-            f'{u["name"][0].upper()}</div>'
-            f'<div style="flex:1;">'
-            f'<div style="font-weight:700;color:{_a("t")};font-size:.93rem;">{u["name"]}</div>'
-            f'<div style="font-size:.67rem;color:#64748b;">{u["email"]} · {u["user_id"]}</div>'
-            f'</div>'
-            f'<div style="display:flex;gap:.55rem;align-items:center;flex-shrink:0;">'
-            f'{status_badge(u["role"])}'
-            f'<span style="font-size:.67rem;color:{_a("1")};">{len(issued)} loans</span>'
-            f'<span style="font-size:.67rem;color:{_a("5")};">{len(hist)} read</span>'
-            f'{"<span style=\\'font-size:.67rem;color:" + _a("4") + ";\\'>" + f"₹{fine:.0f}" + "</span>" if fine > 0 else ""}'
-            f'</div></div></div>',
-            unsafe_allow_html=True)
+        color = u.get("avatar_color", _a("1"))
+        loans, read, fine = counts[u["user_id"]]
+        st.markdown(_frag("user", u["user_id"],
+                          (u["name"], u["email"], u["role"], color, loans, read, fine),
+                          lambda: _user_card(u, color, loans, read, fine)),
+                    unsafe_allow_html=True)
+
+
+def _user_card(u, color, loans, read, fine) -> str:
+    return (
+        f'<div class="card {"card-m" if u["role"]=="admin" else ""}">'
+        f'<div style="display:flex;align-items:center;gap:.9rem;">'
+        f'<div style="width:42px;height:42px;border-radius:50%;background:{color};flex-shrink:0;'
+        f'display:flex;align-items:center;justify-content:center;'
+        f'font-weight:900;font-size:1.1rem;color:#000;{_sh(color,11)}">'
+        f'{u["name"][0].upper()}</div>'
+        f'<div style="flex:1;">'
+        f'<div style="font-weight:700;color:{_a("t")};font-size:.93rem;">{u["name"]}</div>'
+        f'<div style="font-size:.67rem;color:#64748b;">{u["email"]} · {u["user_id"]}</div>'
+        f'</div>'
+        f'<div style="display:flex;gap:.55rem;align-items:center;flex-shrink:0;">'
+        f'{status_badge(u["role"])}'
+        f'<span style="font-size:.67rem;color:{_a("1")};">{loans} loans</span>'
+        f'<span style="font-size:.67rem;color:{_a("5")};">{read} read</span>'
+        f'{"<span style=\\'font-size:.67rem;color:" + _a("4") + ";\\'>" + f"₹{fine:.0f}" + "</span>" if fine > 0 else ""}'
+        f'</div></div></div>')
 
 
 # ══════════════════════════════════════════════════════════════
@@ -1118,6 +1578,7 @@ def main():
         "USERS":  page_users,
     }
     dispatch.get(page, page_dash)()
+    st.session_state["_cpu_full"] = (time.thread_time() - _T0) * 1000
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""
+aservices.py
+Layer : Business Logic Layer — asyncio facade
+Rule  : Thin await-able wrappers around services.py.  No rules of its own.
+        Must NOT import streamlit.
+
+        DB work runs on two bounded executors:
+          writes   M threads  → mutating services; each thread only hands its
+                                op to database.py's one writer thread and
+                                waits, so concurrent writes share a group commit
+          readers  N threads  → read-only services, run side by side (WAL)
+        The event loop itself never blocks, so an async server can hold
+        thousands of slow clients while only N+1 threads touch SQLite.
+        At most MAX_PENDING calls per event loop wait in the executors;
+        callers beyond that await a slot instead of growing an unbounded
+        queue.
+"""
+
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import services
+import database as db
+
+READERS     = int(os.environ.get("NEONLIB_READERS", "8"))
+WRITE_SLOTS = int(os.environ.get("NEONLIB_WRITE_SLOTS", str(db.GROUP_COMMIT_MAX)))
+MAX_PENDING = int(os.environ.get("NEONLIB_MAX_PENDING", "1024"))
+
+_writes  = ThreadPoolExecutor(WRITE_SLOTS, thread_name_prefix="neonlib-write")
+_readers = ThreadPoolExecutor(READERS, thread_name_prefix="neonlib-reader")
+# A Semaphore binds to the loop that first waits on it, so each running
+# loop gets its own.  Entries for closed loops are dropped when a new loop
+# first calls in (the Semaphore holds its loop, so weak keys would not).
+_slots: dict = {}
+
+
+def _wrap(fn, pool):
+    @functools.wraps(fn)
+    async def call(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        slots = _slots.get(loop)
+        if slots is None:
+            for old in [l for l in _slots if l.is_closed()]:
+                del _slots[old]
+            slots = _slots[loop] = asyncio.Semaphore(MAX_PENDING)
+        async with slots:
+            return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+    return call
+
+
+def _read(fn):
+    return _wrap(fn, _readers)
+
+
+def _write(fn):
+    return _wrap(fn, _writes)
+
+
+def shutdown(wait: bool = True) -> None:
+    _writes.shutdown(wait=wait)
+    _readers.shutdown(wait=wait)
+
+
+# ══════════════════════════════════════════════════════════════
+# READS  (reader pool)
+# ══════════════════════════════════════════════════════════════
+all_books            = _read(services.all_books)
+search_books         = _read(services.search_books)
+suggest_books        = _read(services.suggest_books)
+available_books      = _read(services.available_books)
+books_page           = _read(services.books_page)
+get_book             = _read(services.get_book)
+book_availability    = _read(services.book_availability)
+all_users            = _read(services.all_users)
+search_users         = _read(services.search_users)
+suggest_users        = _read(services.suggest_users)
+library_stats        = _read(services.library_stats)
+student_issued_books = _read(services.student_issued_books)
+student_fines        = _read(services.student_fines)
+fine_balance         = _read(services.fine_balance)
+fine_ledger          = _read(services.fine_ledger)
+reading_history      = _read(services.reading_history)
+student_requests     = _read(services.student_requests)
+student_overview     = _read(services.student_overview)
+requests_page        = _read(services.requests_page)
+activity_feed        = _read(services.activity_feed)
+user_notifications   = _read(services.user_notifications)
+student_holds        = _read(services.student_holds)
+
+# ══════════════════════════════════════════════════════════════
+# WRITES  (write slots → database.py's single writer, group commit)
+# ══════════════════════════════════════════════════════════════
+add_book                = _write(services.add_book)
+remove_book             = _write(services.remove_book)
+withdraw_books          = _write(services.withdraw_books)
+issue_book              = _write(services.issue_book)
+return_book             = _write(services.return_book)
+issue_books             = _write(services.issue_books)
+return_books            = _write(services.return_books)
+settle_payments         = _write(services.settle_payments)
+pay_fine                = _write(services.pay_fine)
+waive_fine              = _write(services.waive_fine)
+place_hold              = _write(services.place_hold)
+cancel_hold             = _write(services.cancel_hold)
+expire_holds            = _write(services.expire_holds)
+submit_request          = _write(services.submit_request)
+respond_to_request      = _write(services.respond_to_request)
+respond_to_requests     = _write(services.respond_to_requests)
+mark_notifications_read = _write(services.mark_notifications_read)
+toggle_wishlist         = _write(services.toggle_wishlist)
+rate_book               = _write(services.rate_book)
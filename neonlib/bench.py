@@ -0,0 +1,972 @@
+"""
+bench.py — Micro-benchmarks for the data layer.  Runs against a
+throw-away SQLite file, never library.db.
+Usage:   python3 bench.py rows [--n 1000000]
+         python3 bench.py concurrency [--clients 1000] [--threads 64]
+         python3 bench.py ids [--n 1000000]
+         python3 bench.py writes [--threads 64] [--n 20000]
+         python3 bench.py stress [--procs 8] [--n 500]
+         python3 bench.py withdraw [--n 20000]
+         python3 bench.py desk [--n 200]
+         python3 bench.py holds [--n 10000]
+         python3 bench.py wishlist [--n 5000]
+         python3 bench.py catalog [--n 20000]
+         python3 bench.py fragments [--n 5000]
+         python3 bench.py css
+         python3 bench.py picker [--n 50000]
+         python3 bench.py overview [--n 5000]
+         python3 bench.py feed [--n 100000]
+         python3 bench.py export [--n 1000000]
+         python3 bench.py ledger [--n 200000] [--payments 500]
+         python3 bench.py pages [--sizes 1000 10000 50000] [--runs 3] [--budget-ms MS]
+         python3 bench.py clicks [--n 10000] [--runs 5]
+"""
+
+import os
+import sys
+import ast
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import multiprocessing
+import tempfile
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database as db
+
+
+def _temp_db():
+    """Point database.py at a fresh file and create the schema."""
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="neonlib-bench-"), "bench.db")
+    db.initialize_database()
+    return db.DB_PATH
+
+
+# Raw bulk inserts, but with the INTEGER *_ts twins filled the way
+# database.insert_book / insert_user fill them — queries key on those.
+_BOOKS_SQL = (f"INSERT INTO books ({db._BOOK_COLS},added_ts) "
+              f"VALUES (?1,?2,?3,?4,?5,?6,?7,?8,?9,{db._epoch('?8')})")
+_USERS_SQL = (f"INSERT INTO users ({db._USER_COLS},created_ts) "
+              f"VALUES (?1,?2,?3,?4,?5,?6,?7,{db._epoch('?6')})")
+
+
+def _measure(fn):
+    """
+    → (rows, seconds, bytes still held by the result).
+    Timed and traced in separate runs: tracemalloc skews wall time.
+    """
+    t0 = time.perf_counter()
+    n = len(fn())
+    secs = time.perf_counter() - t0
+    tracemalloc.start()
+    out = fn()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del out
+    return n, secs, held
+
+
+def _report(label, n, secs, held):
+    print(f"  {label:<34} {secs:7.2f}s  {n / secs:>11,.0f} rows/s"
+          f"  {held / 2**20:8.1f} MiB  ({held / n:.0f} B/row)")
+
+
+# ══════════════════════════════════════════════════════════════
+# rows — sqlite3.Row → dict  vs  tuple row factory → slotted Book
+# ══════════════════════════════════════════════════════════════
+def bench_rows(n):
+    path = _temp_db()
+    c = sqlite3.connect(path)
+    c.executemany(
+        _BOOKS_SQL,
+        ((f"BK-{i:08d}", f"Title {i}", f"Author {i % 5000}", f"Cat {i % 40}",
+          3, 2, "ADMIN001", f"2024-01-01T00:00:{i % 60:02d}", i % 97)
+         for i in range(n)))
+    c.commit()
+    c.close()
+    print(f"\nListing {n:,} books\n")
+
+    def as_dicts():
+        c = sqlite3.connect(path)
+        c.row_factory = sqlite3.Row
+        rows = [dict(r) for r in c.execute("SELECT * FROM books ORDER BY added_at DESC")]
+        c.close()
+        return rows
+
+    for label, fn in (("sqlite3.Row → dict (before)", as_dicts),
+                      ("row factory → slotted Book", db.get_all_books)):
+        _report(label, *_measure(fn))
+
+
+
+# ══════════════════════════════════════════════════════════════
+# concurrency — thread-per-request sync vs asyncio facade
+# Each client makes `per_client` calls (90 % reads, 10 % issue+return)
+# and after each one holds its connection for `latency` seconds, the
+# way a slow kiosk / mobile client would.
+# ══════════════════════════════════════════════════════════════
+def _seed_load(n_books=500, n_users=200):
+    path = _temp_db()
+    c = sqlite3.connect(path)
+    c.executemany(_BOOKS_SQL,
+                  ((f"BK-{i:06d}", f"Title {i}", f"Author {i % 50}", "Cat",
+                    50, 50, "ADMIN001", f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}", 0)
+                   for i in range(n_books)))
+    c.executemany(_USERS_SQL,
+                  ((f"USR-{i:06d}", f"User {i}", f"u{i}@x.com", "x", "student",
+                    "2024-01-01T00:00:00", "#00f5ff") for i in range(n_users)))
+    c.commit()
+    c.close()
+    return [f"BK-{i:06d}" for i in range(n_books)], [f"USR-{i:06d}" for i in range(n_users)]
+
+
+def bench_concurrency(clients, per_client, threads, latency):
+    import services
+    import aservices
+    books, users = _seed_load()
+    total = clients * per_client
+    print(f"\n{clients} clients × {per_client} calls, {latency * 1000:.0f} ms client latency\n")
+
+    def plan(i):
+        rnd = random.Random(i)
+        return [(rnd.random() < 0.1, rnd.choice(books), users[i % len(users)])
+                for _ in range(per_client)]
+
+    # ── sync: a fixed pool of request threads, each blocks on the client ──
+    def sync_client(i):
+        for write, bid, uid in plan(i):
+            if write:
+                services.issue_book(bid, uid)
+                services.return_book(bid, uid)
+            else:
+                services.book_availability(bid)
+            time.sleep(latency)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(sync_client, range(clients)))
+    sync_s = time.perf_counter() - t0
+
+    # ── async: every client is a coroutine; DB work on the bounded pools, ──
+    # ── writes meeting in database.py's group-commit queue               ──
+    async def async_client(i):
+        for write, bid, uid in plan(i):
+            if write:
+                await aservices.issue_book(bid, uid)
+                await aservices.return_book(bid, uid)
+            else:
+                await aservices.book_availability(bid)
+            await asyncio.sleep(latency)
+
+    async def run_all():
+        await asyncio.gather(*(async_client(i) for i in range(clients)))
+
+    before = db.writer_stats()
+    t0 = time.perf_counter()
+    asyncio.run(run_all())
+    async_s = time.perf_counter() - t0
+    aservices.shutdown()
+    after = db.writer_stats()
+    per_batch = (after["ops"] - before["ops"]) / max(1, after["batches"] - before["batches"])
+
+    label = f"async ({aservices.WRITE_SLOTS} write slots + {aservices.READERS} readers)"
+    print(f"  {f'sync  ({threads} threads)':<36} {sync_s:7.2f}s  {total / sync_s:9,.0f} calls/s")
+    print(f"  {label:<36} {async_s:7.2f}s  {total / async_s:9,.0f} calls/s"
+          f"  {per_batch:.1f} writes/commit")
+
+
+
+# ══════════════════════════════════════════════════════════════
+# ids — legacy uuid4[:6] ids vs time-ordered ULID ids, bulk insert
+# ══════════════════════════════════════════════════════════════
+def bench_ids(n, batch=1000):
+    from utils import gen_book_id
+    print(f"\nBulk-inserting {n:,} books in batches of {batch:,}\n")
+    for label, gen in (("uuid4[:6] (before)", lambda: f"BK-{uuid.uuid4().hex[:6].upper()}"),
+                       ("ULID (time-ordered)", gen_book_id)):
+        c = sqlite3.connect(_temp_db())
+        t0 = time.perf_counter()
+        for start in range(0, n, batch):
+            c.executemany(
+                f"INSERT OR IGNORE INTO books ({db._BOOK_COLS}) VALUES (?,?,?,?,1,1,'ADMIN001','2024-01-01',0)",
+                ((gen(), f"Title {i}", "Author", "Cat") for i in range(start, min(n, start + batch))))
+            c.commit()
+        secs = time.perf_counter() - t0
+        kept = c.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+        pk_bytes = c.execute("SELECT SUM(pgsize) FROM dbstat "
+                             "WHERE name='sqlite_autoindex_books_1'").fetchone()[0]
+        c.close()
+        print(f"  {label:<22} {secs:7.2f}s  {n / secs:>9,.0f} rows/s"
+              f"  PK index {pk_bytes / 2**20:6.1f} MiB  collisions {n - kept:,}")
+
+
+# ══════════════════════════════════════════════════════════════
+# writes — connection-per-write commits vs the group-commit queue
+# ══════════════════════════════════════════════════════════════
+def bench_writes(threads, n):
+    _, users = _seed_load(n_books=1, n_users=threads)
+    ts = "2024-01-01T00:00:00"
+    print(f"\n{n:,} notification inserts from {threads} threads\n")
+
+    def direct(i):
+        c = sqlite3.connect(db.DB_PATH)
+        try:
+            c.execute("INSERT INTO notifications (notif_id,user_id,message,type,is_read,created_at,created_ts) "
+                      f"VALUES (?1,?2,?3,?4,0,?5,{db._epoch('?5')})", (f"D{i}", users[i % threads], "m", "info", ts))
+            c.commit()
+            return 0
+        except sqlite3.OperationalError:         # "database is locked"
+            return 1
+        finally:
+            c.close()
+
+    def queued(i):
+        db.insert_notification(f"Q{i}", users[i % threads], "m", "info", ts)
+        return 0
+
+    for label, fn in (("connection per write (before)", direct),
+                      ("group-commit queue", queued)):
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            errors = sum(pool.map(fn, range(n)))
+        secs = time.perf_counter() - t0
+        print(f"  {label:<30} {secs:7.2f}s  {n / secs:>9,.0f} writes/s  locked errors {errors:,}")
+    w = db.writer_stats()
+    print(f"\n  queue: {w['batches']:,} commits, batch avg {w['avg_batch']} / max {w['max_batch']}")
+
+
+# ══════════════════════════════════════════════════════════════
+# stress — N writer processes on one library.db (Streamlit replicas)
+# Each process issues + returns random books as one student.
+# "no busy handling" = busy timeout 0 and no retries, i.e. a lock
+# surfaces as an exception the way it used to.
+# ══════════════════════════════════════════════════════════════
+def _stress_worker(path, user_id, books, n, timeout_ms, retries):
+    import services
+    db.DB_PATH = path
+    db.BUSY_TIMEOUT_MS, db.BUSY_RETRIES = timeout_ms, retries
+    rnd, errors = random.Random(user_id), 0
+    for _ in range(n):
+        bid = rnd.choice(books)
+        try:
+            services.issue_book(bid, user_id)
+            services.return_book(bid, user_id)
+        except sqlite3.OperationalError:
+            errors += 1
+    return errors, db.writer_stats()
+
+
+def bench_stress(procs, n):
+    books, users = _seed_load(n_books=50, n_users=procs)
+    path = db.DB_PATH
+    ctx = multiprocessing.get_context("spawn")
+    print(f"\n{procs} processes × {n} issue+return pairs on one database\n")
+    for label, timeout_ms, retries in (
+            ("no busy handling (before)",    0, 0),
+            ("backoff + jitter retry only",  0, db.BUSY_RETRIES),
+            ("busy timeout + backoff retry", db.BUSY_TIMEOUT_MS, db.BUSY_RETRIES)):
+        t0 = time.perf_counter()
+        with ctx.Pool(procs) as pool:
+            out = pool.starmap(_stress_worker,
+                               [(path, u, books, n, timeout_ms, retries) for u in users])
+        secs = time.perf_counter() - t0
+        errors = sum(e for e, _ in out)
+        print(f"  {label:<30} {secs:6.2f}s  {(procs * n - errors) / secs:>6,.0f} ok pairs/s"
+              f"  errors {errors:,}  retries {sum(w['busy_retries'] for _, w in out):,}"
+              f"  lock wait {sum(w['lock_wait_ms'] for _, w in out) / 1000:.1f}s")
+
+
+# ══════════════════════════════════════════════════════════════
+# withdraw — remove_book per title vs one bulk withdraw_books call
+# 1 in 10 books is on loan and must be reported as blocked.
+# ══════════════════════════════════════════════════════════════
+def bench_withdraw(n):
+    import services
+    print(f"\nWithdrawing {n:,} books, 10 % of them on loan\n")
+    for label, run in (("remove_book per title", lambda ids: [services.remove_book(b) for b in ids]),
+                       ("withdraw_books (one transaction)", services.withdraw_books)):
+        books, users = _seed_load(n_books=n, n_users=50)
+        c = sqlite3.connect(db.DB_PATH)
+        c.executemany("INSERT INTO issued_books (issue_id,book_id,user_id,issue_date,due_date,issue_ts,due_ts) "
+                      "VALUES (?,?,?,'2024-01-01','2024-01-08',1704067200,1704672000)",
+                      ((f"ISS-{i}", b, users[i % 50]) for i, b in enumerate(books[::10])))
+        c.commit()
+        t0 = time.perf_counter()
+        run(books)
+        secs = time.perf_counter() - t0
+        left = c.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+        c.close()
+        print(f"  {label:<34} {secs:7.2f}s  {n / secs:>9,.0f} titles/s  kept (on loan) {left:,}")
+
+
+# ══════════════════════════════════════════════════════════════
+# desk — one student returns / borrows an armful of books:
+# issue_book + return_book per item vs issue_books + return_books
+# ══════════════════════════════════════════════════════════════
+def bench_desk(n):
+    import services
+    books, users = _seed_load(n_books=n, n_users=1)
+    pairs = [(b, users[0]) for b in books]
+    print(f"\n{n} items issued then returned at the desk\n")
+    for label, issue, ret in (
+            ("one service call per item", lambda: [services.issue_book(*p) for p in pairs],
+                                          lambda: [services.return_book(*p) for p in pairs]),
+            ("batch (one transaction each)", lambda: services.issue_books(pairs),
+                                             lambda: services.return_books(pairs))):
+        before = db.writer_stats()["batches"]
+        t0 = time.perf_counter()
+        issue()
+        ret()
+        secs = time.perf_counter() - t0
+        print(f"  {label:<30} {secs:7.3f}s  {2 * n / secs:>8,.0f} items/s"
+              f"  commits {db.writer_stats()['batches'] - before:,}")
+
+
+def bench_holds(n):
+    import services
+    print(f"\none title, 50 copies, hold queues of {n // 10:,} and {n:,}\n")
+    for size in (n // 10, n):
+        books, users = _seed_load(n_books=1, n_users=size + 50)
+        book, readers, queue = books[0], users[:50], users[50:]
+        services.issue_books([(book, u) for u in readers])
+        t0 = time.perf_counter()
+        for u in queue:
+            services.place_hold(book, u)
+        placed = time.perf_counter() - t0
+
+        # return a copy → front of the queue gets it → holder picks it up
+        cycles = min(200, size)
+        t0 = time.perf_counter()
+        for i in range(cycles):
+            services.return_book(book, readers[i % 50])
+            services.issue_book(book, queue[i])
+            readers[i % 50] = queue[i]
+        cycle = (time.perf_counter() - t0) / cycles
+
+        # 50 copies on the hold shelf, all past their pickup deadline
+        services.return_books([(book, u) for u in readers])
+        c = sqlite3.connect(db.DB_PATH)
+        c.execute("UPDATE holds SET expires_ts=0 WHERE status='ready'")
+        c.commit()
+        c.close()
+        t0 = time.perf_counter()
+        expired = services.expire_holds()
+        sweep = time.perf_counter() - t0
+        print(f"  queue {size:>7,}  place {size / placed:>8,.0f} holds/s"
+              f"  return→pickup {cycle * 1000:6.2f} ms"
+              f"  sweep {expired} expired {sweep * 1000:6.1f} ms"
+              f"  ({db.count_holds()['ready']} passed on)")
+
+
+def bench_wishlist(n):
+    import services
+    from utils import gen_notif_id, now_iso
+    books, users = _seed_load(n_books=1, n_users=n + 1)
+    book, reader, fans = books[0], users[0], users[1:]
+    c = sqlite3.connect(db.DB_PATH)
+    c.execute("UPDATE books SET total_copies=1, available_copies=1")
+    c.executemany("INSERT INTO wishlist (wish_id,user_id,book_id,added_at,added_ts) VALUES (?,?,?,?,?)",
+                  ((f"WSH-{u}", u, book, "2024-01-01T00:00:00", 1704067200) for u in fans))
+    c.commit()
+    plan = c.execute("""EXPLAIN QUERY PLAN SELECT user_id FROM wishlist
+                         WHERE book_id IN (?) AND alerted_ts < ?""", (book, 0)).fetchall()
+    c.close()
+    print(f"\none title back on the shelf, {n:,} wishlisters\n"
+          f"  lookup plan: {plan[-1][3]}\n")
+
+    t0 = time.perf_counter()
+    for u in fans:                                  # one write per alert
+        db.insert_notification(gen_notif_id(), u, "back", "info", now_iso())
+    per_row = time.perf_counter() - t0
+    print(f"  {'per-wishlister insert':<34} {per_row * 1000:8.1f} ms")
+
+    for label in ("return → batched alerts", "return again (inside window)"):
+        services.issue_book(book, reader)
+        before = db.writer_stats()["batches"]
+        t0 = time.perf_counter()
+        services.return_book(book, reader)
+        secs = time.perf_counter() - t0
+        sent = sum(1 for r in db.get_notifications(fans[0], limit=n) if "wishlist" in r["message"])
+        print(f"  {label:<34} {secs * 1000:8.1f} ms"
+              f"  commits {db.writer_stats()['batches'] - before}  alerts so far/user {sent}")
+
+
+def bench_catalog(n):
+    import services
+    books, users = _seed_load(n_books=n, n_users=1)
+    uid = users[0]
+    c = sqlite3.connect(db.DB_PATH)
+    c.executemany("""INSERT INTO reading_history
+        (history_id,user_id,book_id,book_title,author,category,returned_at,returned_ts,rating)
+        VALUES (?,?,?,'t','a','c','2024-01-01T00:00:00',1704067200,?)""",
+        ((f"HST-{i}", uid, b, 1 + i % 5) for i, b in enumerate(books[::3])))
+    c.commit()
+    c.close()
+    services.all_books()                            # warm the snapshot
+    print(f"\ncatalogue grid data for {n:,} books, sorted by Most Borrowed\n")
+
+    t0 = time.perf_counter()
+    rows = sorted(services.all_books(), key=lambda b: b.borrow_count, reverse=True)
+    for b in rows:                                  # old grid: 2 queries per card
+        db.get_book_avg_rating(b.book_id)
+        db.is_in_wishlist(uid, b.book_id)
+    print(f"  {'whole catalogue (old grid)':<28} {time.perf_counter() - t0:8.3f}s  cards {len(rows):,}")
+
+    for label, page in (("page 1", 0), ("page 100", 99)):
+        t0 = time.perf_counter()
+        rows, total = services.catalog_page("", "Most Borrowed", page, 24)
+        services.catalog_page_extras(uid, rows)
+        print(f"  {label + ' of ' + format(-(-total // 24), ','):<28} "
+              f"{time.perf_counter() - t0:8.3f}s  cards {len(rows)}")
+
+
+def _card_html(b, avg, dark):
+    """Stand-in for app._book_card (app.py needs Streamlit): same shape and size."""
+    ac = "#00ff88" if b.available_copies else "#ff2d55"
+    pct = b.available_copies / b.total_copies * 100
+    star = "".join(f'<span style="color:{"#ffd700" if i < avg else "#64748b"};">{"★" if i < avg else "☆"}</span>'
+                   for i in range(5))
+    return (f'<div class="bcard"><div class="{"dot-g" if b.available_copies else "dot-r"}"></div>'
+            f'<div style="font-weight:700;color:{"#e2e8f0" if dark else "#1e293b"};font-size:.92rem;'
+            f'padding-right:1.4rem;line-height:1.35;margin-bottom:.28rem;">{b.title}</div>'
+            f'<div style="font-size:.7rem;color:#00f5ff;">✍ {b.author}</div>'
+            f'<div style="font-size:.68rem;color:#64748b;margin:.18rem 0 .5rem;">🗂 {b.category}</div>'
+            f'<div style="font-size:.72rem;margin-bottom:.3rem;">{star}</div>'
+            f'<div style="display:flex;justify-content:space-between;font-size:.7rem;">'
+            f'<span style="color:{ac};">{b.available_copies}/{b.total_copies} avail</span>'
+            f'<span style="color:#3a4a5a;font-size:.63rem;">ID: {b.book_id}</span></div>'
+            f'<div class="pbar"><div class="pbar-inner" style="width:{pct:.0f}%;background:{ac};'
+            f'box-shadow:0 0 6px {ac};"></div></div>'
+            f'<div style="font-size:.63rem;color:#3a4a5a;margin-top:.35rem;">📊 {b.borrow_count} borrows</div></div>')
+
+
+def bench_fragments(n):
+    import services
+    import fragments
+    _seed_load(n_books=n, n_users=1)
+    books = services.all_books()
+    version = lambda b: (b.title, b.author, b.category, b.available_copies,
+                         b.total_copies, b.borrow_count, 3)
+    print(f"\n{n:,} book cards per rerun\n")
+
+    def rerun(cache, changed=()):
+        t0 = time.perf_counter()
+        for b in books:
+            v = version(b) + ((1,) if b.book_id in changed else ())
+            if cache is None:
+                _card_html(b, 3, True)
+            else:
+                cache.get(("book", b.book_id, True), v, lambda: _card_html(b, 3, True))
+        return (time.perf_counter() - t0) * 1000
+
+    print(f"  {'format every card':<32} {rerun(None):8.1f} ms")
+    cache = fragments.FragmentCache()
+    print(f"  {'cache, cold':<32} {rerun(cache):8.1f} ms")
+    print(f"  {'cache, warm (unchanged)':<32} {rerun(cache):8.1f} ms")
+    changed = {b.book_id for b in books[::100]}
+    print(f"  {'cache, 1% of rows changed':<32} {rerun(cache, changed):8.1f} ms")
+    st_ = cache.stats()
+    print(f"      {st_['entries']:,} entries  {st_['bytes'] / 1024:,.0f} KB  hit rate {st_['hit_rate']:.0%}")
+    small = fragments.FragmentCache(max_bytes=st_["bytes"] // 4)
+    rerun(small)
+    print(f"  {'cap = 1/4 of working set':<32} {rerun(small):8.1f} ms"
+          f"  ({small.stats()['bytes'] / 1024:,.0f} KB held, {small.evictions:,} evicted)")
+
+
+# ══════════════════════════════════════════════════════════════
+# css — what the theme stylesheet costs on the wire: the serialized
+# ForwardMsg a full rerun sends for it, and whether this Streamlit's
+# forward-message cache would replace it with a hash reference
+# ══════════════════════════════════════════════════════════════
+def _app_function(name):
+    """One top-level function of app.py, without running the Streamlit script."""
+    path = os.path.join(os.path.dirname(__file__), "app.py")
+    node = next(n for n in ast.parse(open(path).read()).body
+                if isinstance(n, ast.FunctionDef) and n.name == name)
+    ns = {}
+    exec(compile(ast.Module([node], []), path, "exec"), ns)
+    return ns[name]
+
+
+def bench_css():
+    try:
+        from streamlit import config
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    except ImportError:
+        sys.exit("bench.py css needs Streamlit:  pip install streamlit")
+    css_text = _app_function("_css_text")
+    try:
+        threshold = config.get_option("global.minCachedMessageSize")
+    except Exception:                       # option gone: no message cache at all
+        threshold = None
+    print(f"\nstylesheet per full rerun (fragment reruns send none)"
+          f" — message cache threshold: {threshold if threshold is not None else 'n/a'}\n")
+    for dark in (True, False):
+        sheet = css_text(dark)
+        msg = ForwardMsg()
+        msg.delta.new_element.markdown.body = sheet
+        msg.delta.new_element.markdown.allow_html = True
+        size = msg.ByteSize()
+        if threshold is None:
+            verdict = "re-sent (no message cache in this Streamlit)"
+        elif size >= threshold:
+            verdict = "cacheable: re-sent as a hash once the browser has it"
+        else:
+            verdict = "under the threshold: re-sent every rerun"
+        print(f"  {'dark' if dark else 'light':<6} {len(sheet.encode()):>7,} B sheet"
+              f"  {size:>7,} B message  {verdict}")
+
+
+# ══════════════════════════════════════════════════════════════
+# picker — Issue tab: "available books" quick reference and the
+# book / user typeahead, on a catalogue where 9 in 10 titles are out
+# ══════════════════════════════════════════════════════════════
+def bench_picker(n):
+    import services
+    books, users = _seed_load(n_books=n, n_users=n // 10)
+    c = sqlite3.connect(db.DB_PATH)
+    c.execute("UPDATE books SET available_copies = 0 WHERE rowid % 10 != 0")
+    c.commit()
+    c.close()
+    services.all_books()                            # warm the snapshot
+    services.suggest_books("Title")                 # … and the trigram indexes
+    services.suggest_users("User")
+    print(f"\n{n:,} books (10 % on the shelf), {n // 10:,} users — best of 20\n")
+
+    def best(fn):
+        out, t = None, []
+        for _ in range(20):
+            t0 = time.perf_counter()
+            out = fn()
+            t.append(time.perf_counter() - t0)
+        return min(t) * 1000, len(out)
+
+    for label, fn in (
+            ("quick ref: filter all_books()", lambda: [b for b in services.all_books()
+                                                       if b["available_copies"] > 0][:8]),
+            ("quick ref: available_books()",  lambda: services.available_books(8)),
+            ("suggest book, id prefix",       lambda: services.suggest_books(books[n // 2][:9])),
+            ("suggest book, title",           lambda: services.suggest_books("title 4242")),
+            ("suggest user, id prefix",       lambda: services.suggest_users(users[7][:10])),
+            ("suggest user, name",            lambda: services.suggest_users("user 77"))):
+        ms, rows = best(fn)
+        print(f"  {label:<32} {ms:8.2f} ms  rows {rows}")
+
+
+# ══════════════════════════════════════════════════════════════
+# overview — student dashboard + profile data for a heavy reader:
+# the old per-list queries vs student_overview vs a cached overview
+# ══════════════════════════════════════════════════════════════
+def bench_overview(n):
+    import services
+    books, users = _seed_load(n_books=max(n, 100), n_users=1)
+    uid = users[0]
+    c = sqlite3.connect(db.DB_PATH)
+    c.executemany("""INSERT INTO reading_history
+        (history_id,user_id,book_id,book_title,author,category,returned_at,returned_ts)
+        VALUES (?,?,?,'t','a','c','2024-01-01T00:00:00',?)""",
+        ((f"HST-{i}", uid, books[i % len(books)], 1704067200 + i) for i in range(n)))
+    c.executemany("""INSERT INTO fines
+        (fine_id,user_id,book_id,issue_id,days_late,amount,paid,created_at,created_ts)
+        VALUES (?,?,?,'x',2,10,?,'2024-01-01T00:00:00',?)""",
+        ((f"FIN-{i}", uid, books[i % len(books)], int(i % 10 != 0), 1704067200 + i)
+         for i in range(n // 5)))
+    c.executemany("INSERT INTO wishlist (wish_id,user_id,book_id,added_at,added_ts) "
+                  "VALUES (?,?,?,'2024-01-01T00:00:00',?)",
+                  ((f"WSH-{i}", uid, b, 1704067200 + i) for i, b in enumerate(books[:n // 10])))
+    c.commit()
+    c.close()
+    services.issue_books([(b, uid) for b in books[-12:]])
+    print(f"\none student: {n:,} books read, {n // 5:,} fines, {n // 10:,} wishlisted, 12 loans"
+          f" — dashboard + profile data, best of 20\n")
+
+    def before():                                   # what _student_dash + page_profile ran
+        services.student_issued_books(uid)
+        services.student_fines(uid)
+        list(db.get_wishlist(uid))
+        db.get_reading_history(uid)
+        db.count_unread_notifications(uid)
+        services.student_issued_books(uid)
+        services.student_fines(uid)
+        services.user_counts([uid])
+        list(db.get_wishlist(uid))
+
+    session = {}
+
+    def cached():                                   # app._overview, twice (both pages)
+        for _ in range(2):
+            ov = session.get("ov")
+            if ov is None or ov["version"] != db.data_version():
+                ov = session["ov"] = services.student_overview(uid)
+
+    for label, fn in (("separate queries, full lists", before),
+                      ("student_overview × 2",       lambda: (services.student_overview(uid),
+                                                              services.student_overview(uid))),
+                      ("session-cached overview",      cached)):
+        t = []
+        for _ in range(20):
+            t0 = time.perf_counter()
+            fn()
+            t.append(time.perf_counter() - t0)
+        print(f"  {label:<32} {min(t) * 1000:8.2f} ms")
+
+
+# ══════════════════════════════════════════════════════════════
+# feed — admin "recent" panel: slice of the full active-loans JOIN vs
+# one keyset page of the events journal (first page and deep in it)
+# ══════════════════════════════════════════════════════════════
+def bench_feed(n):
+    import services
+    books, users = _seed_load(n_books=n, n_users=1000)
+    c = sqlite3.connect(db.DB_PATH)
+    c.executemany("""INSERT INTO issued_books (issue_id,book_id,user_id,issue_date,due_date,issue_ts,due_ts)
+        VALUES (?,?,?,'2024-01-01T00:00:00','2024-01-08T00:00:00',?,?)""",
+        ((f"ISS-{i:08d}", b, users[i % 1000], 1704067200 + i, 1704672000 + i)
+         for i, b in enumerate(books)))              # one loan per title, journaled by trigger
+    c.commit()
+    mid = c.execute("SELECT seq FROM events ORDER BY seq LIMIT 1 OFFSET ?", (n // 2,)).fetchone()[0]
+    c.close()
+    print(f"\n{n:,} active loans, {n:,} journal events — best of 10\n")
+    for label, fn in (("get_all_issued_books()[:5]",   lambda: list(db.get_all_issued_books())[:5]),
+                      ("activity_feed, newest page",  lambda: services.activity_feed(limit=6)),
+                      ("activity_feed, mid-journal",  lambda: services.activity_feed(after=mid, limit=6)),
+                      ("activity_feed, kind=issue",   lambda: services.activity_feed("issue", mid, 6))):
+        t = []
+        for _ in range(10):
+            t0 = time.perf_counter()
+            fn()
+            t.append(time.perf_counter() - t0)
+        print(f"  {label:<32} {min(t) * 1000:9.2f} ms")
+
+
+# ══════════════════════════════════════════════════════════════
+# export — reading history to CSV: fetchall() then write vs the
+# streamed export, peak Python memory at 1 % of the rows and at all
+# ══════════════════════════════════════════════════════════════
+def bench_export(n):
+    import csv
+    import services
+    books, users = _seed_load(n_books=1000, n_users=1000)
+    c = sqlite3.connect(db.DB_PATH)
+    c.executemany("""INSERT INTO reading_history
+        (history_id,user_id,book_id,book_title,author,category,returned_at,days_kept,returned_ts)
+        VALUES (?,?,?,?,'Some Author','Fiction','2024-01-01T00:00:00',7,?)""",
+        ((f"HST-{i:09d}", users[i % 1000], books[i % 1000], f"Title {i % 1000}", 1704067200 + i)
+         for i in range(n)))
+    c.commit()
+    out = os.path.join(os.path.dirname(db.DB_PATH), "out.csv")
+
+    def fetchall_export(limit):
+        c = sqlite3.connect(db.DB_PATH)
+        rows = c.execute(f"SELECT * FROM reading_history LIMIT {limit}").fetchall()
+        c.close()
+        with open(out, "w", newline="") as f:
+            csv.writer(f).writerows(rows)
+        return len(rows)
+
+    def streamed_export(limit):
+        # same generator the services use, cut at `limit` rows
+        with open(out, "w", newline="") as f:
+            for text, done in services.export_stream("history", "csv"):
+                f.write(text)
+                if done >= limit:
+                    break
+        return done
+
+    print("\nreading history → CSV\n")
+    for label, fn in (("fetchall() then write", fetchall_export),
+                      ("streamed export", streamed_export)):
+        for rows in (n // 100, n):
+            t0 = time.perf_counter()
+            fn(rows)
+            secs = time.perf_counter() - t0
+            tracemalloc.start()
+            fn(rows)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {label:<24} {rows:>10,} rows  {secs:6.2f}s  {rows / secs:>9,.0f} rows/s"
+                  f"  peak {peak / 2**20:8.1f} MiB")
+
+
+# ══════════════════════════════════════════════════════════════
+# ledger — "what does this user owe": SUM over their open fines vs
+# the fine_balances row; then a day's desk payments settled one
+# service call each vs settle_payments in one transaction
+# ══════════════════════════════════════════════════════════════
+def bench_ledger(n, payments):
+    import services
+    books, users = _seed_load(n_books=100, n_users=1000)
+    heavy = users[0]                                   # a tenth of all fines
+    c = sqlite3.connect(db.DB_PATH)
+    c.executemany("""INSERT INTO fines
+        (fine_id,user_id,book_id,issue_id,days_late,amount,created_at,created_ts)
+        VALUES (?,?,?,?,2,10.0,'2024-01-01T00:00:00',?)""",
+        ((f"FIN-{i:08d}", heavy if i % 10 == 0 else users[i % 1000], books[i % 100],
+          f"ISS-{i:08d}", 1704067200 + i) for i in range(n)))
+    c.execute("DROP TABLE fine_ledger")                # reopen it as an upgraded DB
+    c.execute("DROP TABLE fine_balances")              # would: charges + balances
+    c.commit()
+    c.close()
+    db.initialize_database()
+
+    print(f"\n{n:,} open fines, {n // 10:,} of them one user's — best of 10\n")
+    sum_sql = "SELECT COALESCE(SUM(amount),0) FROM fines WHERE user_id=? AND paid=0"
+    for label, fn in (("SUM over open fines", lambda: db._conn().execute(sum_sql, (heavy,)).fetchone()),
+                      ("fine_balance (balance row)", lambda: services.fine_balance(heavy))):
+        t = []
+        for _ in range(10):
+            t0 = time.perf_counter()
+            fn()
+            t.append(time.perf_counter() - t0)
+        print(f"  {label:<32} {min(t) * 1000:9.3f} ms")
+
+    print(f"\n{payments} desk payments of ₹15, one per user\n")
+    for label, run in (
+            ("one service call per payment",
+             lambda pays: [services.pay_fine(u, a, "bench") for u, a in pays]),
+            ("settle_payments (one transaction)",
+             lambda pays: services.settle_payments(pays, "bench"))):
+        pays = [(u, 15.0) for u in random.sample(users[1:], payments)]
+        before = db.writer_stats()["batches"]
+        t0 = time.perf_counter()
+        run(pays)
+        secs = time.perf_counter() - t0
+        print(f"  {label:<34} {secs:7.3f}s  {payments / secs:>8,.0f} payments/s"
+              f"  commits {db.writer_stats()['batches'] - before:,}")
+
+
+# ══════════════════════════════════════════════════════════════
+# pages — rerun latency of every app.py page under Streamlit's AppTest,
+# signed in as the admin and as a student.  Each dataset size runs in a
+# fresh process: the catalogue snapshot and fragment cache are
+# process-wide.  Exits 1 when a page click overruns its budget.
+# ══════════════════════════════════════════════════════════════
+PAGE_BUDGET_MS = {"DASH": 1000, "BOOKS": 1000, "LOANS": 800, "REQS": 500, "NOTIFS": 500,
+                  "WISH": 500, "HIST": 500, "PROF": 500, "USERS": 1000}
+_NOT_QUERIES = ("PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+def _elements(node) -> int:
+    """Leaf elements under an AppTest block (tabs / columns are blocks)."""
+    kids = getattr(node, "children", None)
+    if kids is None:
+        return 1
+    return sum(_elements(k) for k in kids.values())
+
+
+def _pages_worker(n_books, runs):
+    from streamlit.testing.v1 import AppTest
+    import services
+    from models import User
+    queries = [0]
+
+    def count(sql):
+        if not sql.lstrip().upper().startswith(_NOT_QUERIES):
+            queries[0] += 1
+
+    db.trace_statements(count)
+    books, users = _seed_load(n_books=n_books, n_users=max(n_books // 10, 10))
+    me = users[0]                                   # u0@x.com: loans, history, wishlist, request
+    services.issue_books([(b, me) for b in books[:5]])
+    services.return_books([(b, me) for b in books[:3]])
+    for b in books[5:15]:
+        services.toggle_wishlist(me, b)
+    services.submit_request(me, "User 0", "Some Title", "Some Author", "For a course")
+
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    out = []
+    for email in ("admin@library.com", "u0@x.com"):
+        user = User.from_row(db.get_user_by_email(email)).to_session_dict()
+        at = AppTest.from_file(app, default_timeout=120)
+        at.session_state["user"] = user
+        at.session_state["logged_in"] = True
+        at.run()                                    # imports, stylesheet, snapshot load
+        pages = [p for p in PAGE_BUDGET_MS if p != "USERS" or user["role"] == "admin"]
+        for page in pages:
+            at.sidebar.radio[0].set_value(page)
+            times = []
+            for i in range(runs):
+                if i == 0:
+                    queries[0] = 0
+                t0 = time.perf_counter()
+                at.run()
+                times.append((time.perf_counter() - t0) * 1000)
+                if i == 0:
+                    click_q = queries[0]
+            if at.exception:
+                raise RuntimeError(f"{user['role']} {page}: {at.exception[0].message}")
+            rerun = sorted(times[1:])[len(times[1:]) // 2] if runs > 1 else times[0]
+            out.append((user["role"], page, times[0], rerun, click_q,
+                        _elements(at.main) + _elements(at.sidebar)))
+    return out
+
+
+# ══════════════════════════════════════════════════════════════
+# clicks — CPU per interaction under AppTest: widgets inside @_partial
+# regions, with the regions as st.fragment and with NEONLIB_FRAGMENTS=0
+# (every click reruns the whole page).  "page ran" tells whether the
+# click re-executed the page body at all.
+# ══════════════════════════════════════════════════════════════
+CLICKS = [   # (role, page, widget kind, key, values cycled through)
+    ("admin",   "DASH",  "selectbox",  "feed_kind", ["issue", "all"]),
+    ("admin",   "BOOKS", "selectbox",  "bk_sort",   ["A–Z", "Default"]),
+    ("admin",   "LOANS", "text_input", "desk_scan", ["BK-000001", "BK-000002"]),
+]
+
+
+def _clicks_worker(n_books, runs, fragments_on):
+    os.environ["NEONLIB_FRAGMENTS"] = "1" if fragments_on else "0"
+    from streamlit.testing.v1 import AppTest
+    import services
+    from models import User
+    books, users = _seed_load(n_books=n_books, n_users=max(n_books // 10, 10))
+    services.issue_books([(b, users[i % len(users)]) for i, b in enumerate(books[:200])])
+
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    user = User.from_row(db.get_user_by_email("admin@library.com")).to_session_dict()
+    at = AppTest.from_file(app, default_timeout=120)
+    at.session_state["user"] = user
+    at.session_state["logged_in"] = True
+    at.run()
+    out = []
+    for role, page, kind, key, values in CLICKS:
+        at.sidebar.radio[0].set_value(page)
+        at.run()
+        cpu, page_ran = [], 0
+        for i in range(runs + 1):                   # first click warms caches: dropped
+            widget = getattr(at, kind)(key=key)
+            (widget.input if kind == "text_input" else widget.set_value)(values[i % len(values)])
+            at.session_state["_cpu_full"] = -1.0
+            t0 = time.process_time()
+            at.run()
+            if i:
+                cpu.append((time.process_time() - t0) * 1000)
+                page_ran += at.session_state["_cpu_full"] != -1.0
+            if at.exception:
+                raise RuntimeError(f"{page} {key}: {at.exception[0].message}")
+        out.append((page, key, sorted(cpu)[len(cpu) // 2], page_ran))
+    return out
+
+
+def bench_clicks(n, runs):
+    try:
+        import streamlit.testing.v1            # noqa: F401
+    except ImportError:
+        sys.exit("bench.py clicks needs Streamlit's AppTest:  pip install \"streamlit>=1.37\"")
+    ctx = multiprocessing.get_context("spawn")
+    res = {}
+    for on in (False, True):                          # fresh process each: caches are process-wide
+        with ctx.Pool(1) as pool:
+            res[on] = pool.apply(_clicks_worker, (n, runs, on))
+    print(f"\n{n:,} books, admin — CPU per click, median of {runs}\n")
+    print(f"  {'page':<6} {'widget':<11} {'full rerun':>11} {'fragment':>10} {'saved':>7}  page ran")
+    for (page, key, full, _), (_, _, part, ran) in zip(res[False], res[True]):
+        print(f"  {page:<6} {key:<11} {full:8.1f} ms {part:7.1f} ms {1 - part / full:6.0%}"
+              f"  {ran}/{runs}")
+
+
+def bench_pages(sizes, runs, budget_ms):
+    try:
+        import streamlit.testing.v1            # noqa: F401
+    except ImportError:
+        sys.exit("bench.py pages needs Streamlit's AppTest:  pip install \"streamlit>=1.37\"")
+    ctx = multiprocessing.get_context("spawn")
+    over = []
+    for n in sizes:
+        with ctx.Pool(1) as pool:
+            rows = pool.apply(_pages_worker, (n, runs))
+        print(f"\n{n:,} books, {max(n // 10, 10):,} users — page click, then median of "
+              f"{max(runs - 1, 1)} rerun(s)\n")
+        print(f"  {'role':<8}{'page':<8}{'click':>10}{'rerun':>10}{'budget':>9}"
+              f"{'queries':>9}{'elements':>10}")
+        for role, page, click, rerun, queries, elements in rows:
+            budget = budget_ms or PAGE_BUDGET_MS[page]
+            flag = ""
+            if click > budget:
+                flag = "  OVER"
+                over.append(f"{n:,} books / {role} / {page}: {click:.0f} ms > {budget} ms")
+            print(f"  {role:<8}{page:<8}{click:8.0f} ms{rerun:7.0f} ms{budget:6} ms"
+                  f"{queries:>9,}{elements:>10,}{flag}")
+    if over:
+        print("\nover budget:\n  " + "\n  ".join(over))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("rows", help="Row→dict vs slotted model listing")
+    p.add_argument("--n", type=int, default=1_000_000)
+    p = sub.add_parser("concurrency", help="sync threads vs asyncio facade load test")
+    p.add_argument("--clients", type=int, default=1000)
+    p.add_argument("--per-client", type=int, default=5)
+    p.add_argument("--threads", type=int, default=64)
+    p.add_argument("--latency", type=float, default=0.2)
+    p = sub.add_parser("ids", help="uuid4[:6] vs ULID bulk insert speed / index size")
+    p.add_argument("--n", type=int, default=1_000_000)
+    p = sub.add_parser("writes", help="per-write commits vs group-commit writer queue")
+    p.add_argument("--threads", type=int, default=64)
+    p.add_argument("--n", type=int, default=20_000)
+    p = sub.add_parser("stress", help="multi-process writers: lock errors vs backoff retry")
+    p.add_argument("--procs", type=int, default=8)
+    p.add_argument("--n", type=int, default=500)
+    p = sub.add_parser("withdraw", help="per-title remove_book vs bulk withdraw_books")
+    p.add_argument("--n", type=int, default=20_000)
+    p = sub.add_parser("desk", help="per-item issue/return vs batch desk services")
+    p.add_argument("--n", type=int, default=200)
+    p = sub.add_parser("holds", help="hold-queue allocation cost vs queue length")
+    p.add_argument("--n", type=int, default=10_000)
+    p = sub.add_parser("wishlist", help="per-row vs batched return-triggered wishlist alerts")
+    p.add_argument("--n", type=int, default=5000)
+    p = sub.add_parser("catalog", help="whole-catalogue grid vs one paged grid")
+    p.add_argument("--n", type=int, default=20_000)
+    p = sub.add_parser("fragments", help="re-formatting cards vs the HTML fragment cache")
+    p.add_argument("--n", type=int, default=5000)
+    sub.add_parser("css", help="stylesheet bytes per rerun vs the forward-message cache")
+    p = sub.add_parser("picker", help="catalogue-scan quick ref vs partial index + typeahead")
+    p.add_argument("--n", type=int, default=50_000)
+    p = sub.add_parser("overview", help="per-list student queries vs one cached overview")
+    p.add_argument("--n", type=int, default=5000)
+    p = sub.add_parser("feed", help="active-loans JOIN slice vs keyset events journal page")
+    p.add_argument("--n", type=int, default=100_000)
+    p = sub.add_parser("export", help="fetchall() export vs streamed export, peak memory")
+    p.add_argument("--n", type=int, default=1_000_000)
+    p = sub.add_parser("ledger", help="SUM-per-view fine total vs balance row; bulk settlement")
+    p.add_argument("--n", type=int, default=200_000)
+    p.add_argument("--payments", type=int, default=500)
+    p = sub.add_parser("clicks", help="CPU per click: st.fragment regions vs full reruns (AppTest)")
+    p.add_argument("--n", type=int, default=10_000)
+    p.add_argument("--runs", type=int, default=5)
+    p = sub.add_parser("pages", help="AppTest rerun latency per page vs budget")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--budget-ms", type=int, default=None,
+                   help="one budget for every page (default: PAGE_BUDGET_MS)")
+    args = ap.parse_args()
+    {"ids":         lambda: bench_ids(args.n),
+     "rows":        lambda: bench_rows(args.n),
+     "writes":      lambda: bench_writes(args.threads, args.n),
+     "stress":      lambda: bench_stress(args.procs, args.n),
+     "withdraw":    lambda: bench_withdraw(args.n),
+     "desk":        lambda: bench_desk(args.n),
+     "holds":       lambda: bench_holds(args.n),
+     "wishlist":    lambda: bench_wishlist(args.n),
+     "catalog":     lambda: bench_catalog(args.n),
+     "fragments":   lambda: bench_fragments(args.n),
+     "css":         lambda: bench_css(),
+     "picker":      lambda: bench_picker(args.n),
+     "overview":    lambda: bench_overview(args.n),
+     "feed":        lambda: bench_feed(args.n),
+     "export":      lambda: bench_export(args.n),
+     "ledger":      lambda: bench_ledger(args.n, args.payments),
+     "pages":       lambda: bench_pages(args.sizes, args.runs, args.budget_ms),
+     "clicks":      lambda: bench_clicks(args.n, args.runs),
+     "concurrency": lambda: bench_concurrency(args.clients, args.per_client,
+                                              args.threads, args.latency),
+     }[args.bench]()
@@ -0,0 +1,188 @@
+"""
+catalog.py
+Layer : Read-Model Cache (sits between services.py and database.py)
+Rule  : Calls database.py only.  No Streamlit.
+        Holds ONE process-wide, column-oriented copy of the books table,
+        shared by every Streamlit session and rerun.  It is refreshed
+        only when PRAGMA data_version moves, by replaying change_log
+        deltas instead of re-reading the whole table.
+"""
+
+import sys
+import heapq
+import itertools
+import threading
+from array import array
+import database as db
+from models import Book
+
+COLUMNS  = Book.__slots__                          # model field order
+INT_COLS = ("total_copies", "available_copies", "borrow_count")
+_SHARED  = ("author", "category", "added_by")     # low-cardinality → interned
+
+
+class CatalogSnapshot:
+    """
+    Columnar store: one Python list per text column, one array('q')
+    per integer column, and a dict book_id → row position.
+    Rows are kept in insertion order (oldest → newest); deletions leave
+    a tombstone that is compacted away once they pile up.
+      get(book_id)  : O(1)
+      apply delta   : O(changed rows)
+      rows()        : O(n) — builds Book objects only when a caller asks
+      page()        : O(n log k) — builds only the k rows on the page
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None          # last PRAGMA data_version seen
+        self._seq = None              # last change_log seq applied
+        self._footprint = None
+        self.full_loads = 0
+        self.deltas_applied = 0
+        self._reset()
+
+    def _reset(self):
+        self._cols = {c: array("q") if c in INT_COLS else [] for c in COLUMNS}
+        self._pos: dict[str, int] = {}
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    # ── refresh ───────────────────────────────────────────────
+    def refresh(self) -> None:
+        """No-op unless some connection committed since the last call."""
+        with self._lock:
+            version = db.data_version()
+            if version == self._version:
+                return
+            if self._seq is None:
+                ok, last, changed = False, db.last_change_seq(), []
+            else:
+                ok, last, changed = db.get_changes_since("books", self._seq)
+            if not ok:
+                self._load_full()
+            elif changed:
+                self._apply(changed)
+            self._seq, self._version = last, version
+
+    def _load_full(self):
+        self._reset()
+        for r in reversed(db.get_all_books()):        # oldest first
+            self._append(r)
+        self._footprint = None
+        self.full_loads += 1
+
+    def _apply(self, changed):
+        rows = {r["book_id"]: r for r in db.get_books_by_ids(changed)}
+        for bid in changed:
+            r = rows.get(bid)
+            i = self._pos.get(bid)
+            if r is None and i is not None:           # deleted
+                del self._pos[bid]
+                self._cols["book_id"][i] = None
+                self._dead += 1
+            elif r is not None and i is None:         # inserted
+                self._append(r)
+            elif r is not None:                       # updated in place
+                for c in COLUMNS:
+                    self._cols[c][i] = self._cell(c, r[c])
+        if self._dead > 1024 and self._dead * 4 > len(self._cols["book_id"]):
+            self._compact()
+        self._footprint = None
+        self.deltas_applied += 1
+
+    @staticmethod
+    def _cell(col, value):
+        if col in INT_COLS:
+            return value or 0
+        if col in _SHARED and value:
+            return sys.intern(value)
+        return value
+
+    def _append(self, r):
+        self._pos[r["book_id"]] = len(self._cols["book_id"])
+        for c in COLUMNS:
+            self._cols[c].append(self._cell(c, r[c]))
+
+    def _compact(self):
+        live = [i for i, b in enumerate(self._cols["book_id"]) if b is not None]
+        self._cols = {c: (array("q", (v[i] for i in live)) if c in INT_COLS
+                          else [v[i] for i in live])
+                      for c, v in self._cols.items()}
+        self._pos = {b: i for i, b in enumerate(self._cols["book_id"])}
+        self._dead = 0
+
+    # ── reads ─────────────────────────────────────────────────
+    def _row(self, i) -> Book:
+        return Book(*(self._cols[c][i] for c in COLUMNS))
+
+    def get(self, book_id) -> Book | None:
+        with self._lock:
+            i = self._pos.get(book_id)
+            return None if i is None else self._row(i)
+
+    def rows(self) -> list:
+        """Every book, newest first (same order as get_all_books)."""
+        with self._lock:
+            cols = [self._cols[c] for c in COLUMNS]
+            return [Book(*t) for t in reversed(list(zip(*cols)))
+                    if t[0] is not None]
+
+    def column(self, col) -> list:
+        """Live values of one column, without building row objects."""
+        with self._lock:
+            ids = self._cols["book_id"]
+            return [v for b, v in zip(ids, self._cols[col]) if b is not None]
+
+    def top(self, col, n=3) -> list:
+        """Heap top-n by an integer column → O(n log k), no full sort."""
+        with self._lock:
+            vals = self._cols[col]
+            best = heapq.nlargest(n, self._pos.values(), key=vals.__getitem__)
+            return [self._row(i) for i in best]
+
+    def page(self, col=None, desc=True, start=0, n=24) -> list:
+        """
+        Rows start … start+n ordered by `col` (None → newest first; ties
+        newest first, like a stable sort of rows()).  A heap selects the
+        first start+n positions; only the page becomes Book objects.
+        """
+        with self._lock:
+            ids = self._cols["book_id"]
+            newest = (i for i in range(len(ids) - 1, -1, -1) if ids[i] is not None)
+            k = start + n
+            if col is None:
+                picked = list(itertools.islice(newest, k))
+            else:
+                vals = self._cols[col]
+                key = (lambda i: vals[i].lower()) if col == "title" else vals.__getitem__
+                picked = (heapq.nlargest if desc else heapq.nsmallest)(k, newest, key=key)
+            return [self._row(i) for i in picked[start:]]
+
+    # ── memory ────────────────────────────────────────────────
+    def footprint(self) -> dict:
+        """
+        Bytes held by the snapshot: containers + every distinct object
+        they reference (interned strings are counted once).
+        """
+        with self._lock:
+            if self._footprint is None:
+                seen, total = set(), sys.getsizeof(self._pos)
+                for c in COLUMNS:
+                    col = self._cols[c]
+                    total += sys.getsizeof(col)
+                    if c in INT_COLS:
+                        continue                  # values live inside the array
+                    for v in col:
+                        if id(v) not in seen:
+                            seen.add(id(v))
+                            total += sys.getsizeof(v)
+                self._footprint = total
+            return {"rows": len(self._pos), "bytes": self._footprint,
+                    "full_loads": self.full_loads,
+                    "deltas_applied": self.deltas_applied}
+
+
+snapshot = CatalogSnapshot()
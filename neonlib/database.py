@@ -8,19 +8,331 @@ Exports : initialize_database() + one function per SQL operation.
 
 import sqlite3
 import os
+import time
+import queue
+import random
+import functools
+import threading
+from concurrent.futures import Future
+from models import User, Book, IssuedBook, Fine, BookRequest, row_factory, columns
 
 DB_PATH = "library.db"
+CHANGE_LOG_KEEP = 20000          # newest change_log rows retained
+
+# Lock handling when several processes share library.db.  SQLite's own
+# busy handler waits up to BUSY_TIMEOUT_MS; if the write lock is still
+# taken, the whole batch is rolled back and retried after a full-jitter
+# exponential backoff (BACKOFF_MS · 2^attempt, capped at BACKOFF_MAX_MS).
+BUSY_TIMEOUT_MS = int(os.environ.get("NEONLIB_BUSY_TIMEOUT_MS", "1000"))
+BUSY_RETRIES    = int(os.environ.get("NEONLIB_BUSY_RETRIES", "10"))
+BACKOFF_MS      = float(os.environ.get("NEONLIB_BACKOFF_MS", "5"))
+BACKOFF_MAX_MS  = float(os.environ.get("NEONLIB_BACKOFF_MAX_MS", "500"))
+
+_version_conn = None
+_version_path = None            # DB_PATH _version_conn was opened on
+_version_base = 0               # keeps data_version() rising across reconnects
+_version_last = 0
+_version_lock = threading.Lock()
+_trace = None                    # callback(sql) on every statement, or None
 
 
 # ─── connection ───────────────────────────────────────────────
+def trace_statements(callback) -> None:
+    """
+    Call `callback(sql)` for each statement run on connections opened
+    from now on (None switches it off).  Install it before the first
+    write — the writer's connection is opened once.  Used by bench.py.
+    """
+    global _trace
+    _trace = callback
+
+
 def _conn():
-    c = sqlite3.connect(DB_PATH)
+    if _writer is not None and threading.current_thread() is _writer:
+        return _writer.conn              # inside a queued op: see its own writes
+    c = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+    if _trace is not None:
+        c.set_trace_callback(_trace)
     c.row_factory = sqlite3.Row          # row["col"] dict-style access
     c.execute("PRAGMA journal_mode=WAL")  # faster concurrent reads
     c.execute("PRAGMA foreign_keys=ON")
     return c
 
 
+def _fetch(cls, sql, params=(), c=None):
+    """Run a SELECT whose columns follow `cls` field order → list[cls]."""
+    own = c is None
+    if own:
+        c = _conn()
+    cur = c.cursor()
+    cur.row_factory = row_factory(cls)
+    rows = cur.execute(sql, params).fetchall()
+    if own:
+        c.close()
+    return rows
+
+def _fetch_one(cls, sql, params=()):
+    rows = _fetch(cls, sql, params)
+    return rows[0] if rows else None
+
+def _epoch(expr):
+    """SQL: ISO-8601 local time (text / param) → INTEGER epoch seconds."""
+    return f"CAST(strftime('%s', {expr}, 'utc') AS INTEGER)"
+
+def _days_until(ts_col, now):
+    """SQL: whole days from `now` to `ts_col`, floored like timedelta.days."""
+    d = f"({ts_col} - {now})"
+    return f"({d} / 86400 - ({d} % 86400 < 0))"
+
+# (table, ISO text column, INTEGER epoch twin)
+_EPOCH_COLS = [
+    ("users",           "created_at",  "created_ts"),
+    ("books",           "added_at",    "added_ts"),
+    ("issued_books",    "issue_date",  "issue_ts"),
+    ("issued_books",    "due_date",    "due_ts"),
+    ("fines",           "created_at",  "created_ts"),
+    ("book_requests",   "created_at",  "created_ts"),
+    ("book_requests",   "updated_at",  "updated_ts"),
+    ("notifications",   "created_at",  "created_ts"),
+    ("reading_history", "returned_at", "returned_ts"),
+    ("wishlist",        "added_at",    "added_ts"),
+    ("holds",           "created_at",  "created_ts"),
+    ("holds",           "expires_at",  "expires_ts"),
+]
+
+_MAX_CHAR = "\U0010ffff"          # sorts after any text: prefix range upper bound
+
+_USER_COLS = columns(User)
+_BOOK_COLS = columns(Book)
+_REQ_COLS  = columns(BookRequest)
+
+
+def data_version():
+    """
+    PRAGMA data_version on one long-lived connection.  The value moves
+    whenever any other connection — any session, any process — commits,
+    and reading it touches no table.  Cheap "has anything changed?" probe.
+    Reopened when DB_PATH is repointed (bench, tests); the value carries
+    on above the last one returned, so no cache keyed on it sees a repeat.
+    """
+    global _version_conn, _version_path, _version_base, _version_last
+    with _version_lock:
+        if _version_conn is None or _version_path != DB_PATH:
+            if _version_conn is not None:
+                _version_conn.close()
+                _version_base = _version_last
+            _version_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            _version_path = DB_PATH
+        _version_last = _version_base + _version_conn.execute("PRAGMA data_version").fetchone()[0]
+        return _version_last
+
+
+# ══════════════════════════════════════════════════════════════
+# WRITE QUEUE — one writer thread, group commit
+# Every mutating query below is @_writes: callers on any thread
+# enqueue it and block until the batch holding it has committed.
+# The writer takes what is queued, plus stragglers within GROUP_COMMIT_MS
+# when under load (at most GROUP_COMMIT_MAX ops), runs each op inside
+# its own SAVEPOINT so a
+# failing op is rolled back alone, then COMMITs once: one fsync per
+# batch, and sessions in this process never race for the write lock.
+# ══════════════════════════════════════════════════════════════
+GROUP_COMMIT_MS  = float(os.environ.get("NEONLIB_GROUP_COMMIT_MS", "2"))
+GROUP_COMMIT_MAX = int(os.environ.get("NEONLIB_GROUP_COMMIT_MAX", "64"))
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _is_busy(e) -> bool:
+    return isinstance(e, sqlite3.OperationalError) and (
+        "locked" in str(e) or "busy" in str(e))
+
+
+class _Shared(sqlite3.Connection):
+    """
+    The writer's connection.  Queries running inside a queued op get it
+    from _conn(); their commit() / rollback() / close() are no-ops — the
+    batch commits, and a failing op is undone by its own SAVEPOINT, never
+    by rolling back other callers' writes in the same batch.
+    """
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Writer(threading.Thread):
+    def __init__(self):
+        super().__init__(name="neonlib-db-writer", daemon=True)
+        self.q = queue.SimpleQueue()
+        self.conn = None
+        self.path = None
+        self.batches = self.ops = self.failed = 0
+        self.last_batch = self.max_batch = 0
+        self.busy_retries = self.busy_failures = 0
+        self.lock_wait = 0.0
+
+    def submit(self, fn, args, kwargs):
+        fut = Future()
+        self.q.put((fn, args, kwargs, fut))
+        return fut.result()
+
+    def _connect(self):
+        c = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000,
+                            isolation_level=None,   # BEGIN / COMMIT issued below
+                            factory=_Shared)
+        if _trace is not None:
+            c.set_trace_callback(_trace)
+        try:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA foreign_keys=ON")
+        except sqlite3.Error:
+            sqlite3.Connection.close(c)
+            raise
+        c.row_factory = sqlite3.Row
+        if self.conn is not None:
+            sqlite3.Connection.close(self.conn)
+        self.conn, self.path = c, DB_PATH
+
+    def _take(self):
+        """
+        Block for one op, then take what queued up meanwhile.  Only when
+        others are waiting (concurrent load) hold the window open for
+        stragglers — a lone write commits with no added latency.
+        """
+        batch = [self.q.get()]
+        deadline = time.monotonic() + GROUP_COMMIT_MS / 1000
+        while len(batch) < GROUP_COMMIT_MAX:
+            wait = deadline - time.monotonic() if len(batch) > 1 else 0
+            try:
+                batch.append(self.q.get(timeout=wait) if wait > 0 else self.q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch):
+        """One transaction, one SAVEPOINT per op.  Raises only batch-level errors."""
+        c, results = self.conn, []
+        t0 = time.perf_counter()
+        c.execute("BEGIN IMMEDIATE")
+        self.lock_wait += time.perf_counter() - t0
+        for fn, args, kwargs, _ in batch:
+            c.execute("SAVEPOINT op")
+            try:
+                results.append((True, fn(c, *args, **kwargs)))
+            except Exception as e:
+                if _is_busy(e):
+                    raise                       # retry the whole batch
+                c.execute("ROLLBACK TO op")
+                results.append((False, e))
+            c.execute("RELEASE op")
+        c.execute("COMMIT")
+        return results
+
+    def run(self):
+        while True:
+            batch = self._take()
+            attempt = 0
+            while True:
+                try:
+                    if self.path != DB_PATH:    # first use, or bench repointed it
+                        self._connect()
+                    results = self._run_batch(batch)
+                    break
+                except Exception as e:
+                    try:
+                        if self.conn is not None and self.conn.in_transaction:
+                            self.conn.execute("ROLLBACK")
+                    except Exception:
+                        # connection unusable: fail this batch only and
+                        # reconnect before the next one
+                        self.path = None
+                    if _is_busy(e) and attempt < BUSY_RETRIES and self.path is not None:
+                        # rolled back → re-running every op is safe
+                        pause = random.uniform(0, min(BACKOFF_MAX_MS, BACKOFF_MS * 2 ** attempt))
+                        time.sleep(pause / 1000)
+                        self.lock_wait += pause / 1000
+                        self.busy_retries += 1
+                        attempt += 1
+                        continue
+                    self.busy_failures += _is_busy(e)
+                    self.failed += 1
+                    results = [(False, e)] * len(batch)
+                    break
+
+            self.batches += 1
+            self.ops += len(batch)
+            self.last_batch = len(batch)
+            self.max_batch = max(self.max_batch, len(batch))
+            for (ok, value), (*_, fut) in zip(results, batch):
+                if ok:
+                    fut.set_result(value)
+                else:
+                    fut.set_exception(value)
+
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                w = _Writer()
+                w.start()
+                _writer = w
+    return _writer
+
+
+def _writes(fn):
+    """
+    Route a write query `fn(c, *args)` through the writer thread;
+    the public function keeps its old signature without `c`.
+    Called from inside another queued op it runs inline on the same
+    transaction.
+    """
+    @functools.wraps(fn)
+    def call(*args, **kwargs):
+        w = _get_writer()
+        if threading.current_thread() is w:
+            return fn(w.conn, *args, **kwargs)
+        return w.submit(fn, args, kwargs)
+    return call
+
+
+def transaction(fn):
+    """
+    Decorator for a service function made of several database.py calls:
+    the whole function runs as ONE queued op — its reads see its own
+    writes, other processes can't interleave, and on SQLITE_BUSY it is
+    rolled back and re-run from the top.  Keep it free of side effects
+    outside the DB.
+    """
+    return _writes(functools.wraps(fn)(lambda _c, *a, **k: fn(*a, **k)))
+
+
+def writer_stats() -> dict:
+    """Queue depth right now, group-commit batch sizes and lock contention so far."""
+    w = _writer
+    if w is None:
+        return {"queue_depth": 0, "batches": 0, "ops": 0, "last_batch": 0,
+                "max_batch": 0, "avg_batch": 0.0, "failed_batches": 0,
+                "busy_retries": 0, "busy_failures": 0, "lock_wait_ms": 0.0}
+    return {"queue_depth":    w.q.qsize(),
+            "batches":        w.batches,
+            "ops":            w.ops,
+            "last_batch":     w.last_batch,
+            "max_batch":      w.max_batch,
+            "avg_batch":      round(w.ops / max(1, w.batches), 2),
+            "failed_batches": w.failed,
+            "busy_retries":   w.busy_retries,
+            "busy_failures":  w.busy_failures,
+            "lock_wait_ms":   round(w.lock_wait * 1000, 1)}
+
+
 # ══════════════════════════════════════════════════════════════
 # STEP-BY-STEP DATABASE INITIALISATION
 # Called once at app startup.  Creates every table if absent,
@@ -37,7 +349,13 @@ def initialize_database():
     STEP 7  Create  notifications  table
     STEP 8  Create  reading_history table
     STEP 9  Create  wishlist       table
-    STEP 10 Seed default admin (only when users table is empty)
+    STEP 10 Create  holds          table (per-book FIFO reservation queue)
+    STEP 11 Create  change_log     table + triggers on books / users
+    STEP 12 Migrate epoch columns onto older DBs + backfill them
+    STEP 13 Create  events         table + triggers (activity journal)
+    STEP 14 Create  fine_ledger + fine_balances (running balances)
+    STEP 15 Create  indexes
+    STEP 16 Seed default admin (only when users table is empty)
     """
     c = _conn()
 
@@ -50,7 +368,8 @@ def initialize_database():
             password     TEXT NOT NULL,       -- SHA-256 hex digest
             role         TEXT NOT NULL DEFAULT 'student',
             created_at   TEXT NOT NULL,
-            avatar_color TEXT DEFAULT '#00f5ff'
+            avatar_color TEXT DEFAULT '#00f5ff',
+            created_ts   INTEGER                -- epoch secs of created_at
         )""")
 
     # STEP 3 ── books ─────────────────────────────────────────
@@ -64,7 +383,8 @@ def initialize_database():
             available_copies INTEGER NOT NULL DEFAULT 1,
             added_by         TEXT,
             added_at         TEXT NOT NULL,
-            borrow_count     INTEGER DEFAULT 0
+            borrow_count     INTEGER DEFAULT 0,
+            added_ts         INTEGER
         )""")
 
     # STEP 4 ── issued_books ──────────────────────────────────
@@ -75,6 +395,8 @@ def initialize_database():
             user_id    TEXT NOT NULL,
             issue_date TEXT NOT NULL,
             due_date   TEXT NOT NULL,
+            issue_ts   INTEGER,
+            due_ts     INTEGER,
             FOREIGN KEY (book_id) REFERENCES books(book_id),
             FOREIGN KEY (user_id) REFERENCES users(user_id)
         )""")
@@ -88,8 +410,10 @@ def initialize_database():
             issue_id   TEXT NOT NULL,
             days_late  INTEGER NOT NULL,
             amount     REAL NOT NULL,
-            paid       INTEGER DEFAULT 0,
-            created_at TEXT NOT NULL
+            paid       INTEGER DEFAULT 0,     -- 1 once settled covers amount
+            created_at TEXT NOT NULL,
+            created_ts INTEGER,
+            settled    REAL NOT NULL DEFAULT 0  -- paid / waived towards it so far
         )""")
 
     # STEP 6 ── book_requests ─────────────────────────────────
@@ -104,7 +428,9 @@ def initialize_database():
             status     TEXT DEFAULT 'pending',
             admin_note TEXT DEFAULT '',
             created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL
+            updated_at TEXT NOT NULL,
+            created_ts INTEGER,
+            updated_ts INTEGER
         )""")
 
     # STEP 7 ── notifications ─────────────────────────────────
@@ -115,7 +441,8 @@ def initialize_database():
             message    TEXT NOT NULL,
             type       TEXT DEFAULT 'info',
             is_read    INTEGER DEFAULT 0,
-            created_at TEXT NOT NULL
+            created_at TEXT NOT NULL,
+            created_ts INTEGER
         )""")
 
     # STEP 8 ── reading_history ───────────────────────────────
@@ -130,7 +457,8 @@ def initialize_database():
             returned_at TEXT NOT NULL,
             days_kept  INTEGER DEFAULT 0,
             rating     INTEGER DEFAULT 0,
-            review     TEXT DEFAULT ''
+            review     TEXT DEFAULT '',
+            returned_ts INTEGER
         )""")
 
     # STEP 9 ── wishlist ──────────────────────────────────────
@@ -140,19 +468,255 @@ def initialize_database():
             user_id  TEXT NOT NULL,
             book_id  TEXT NOT NULL,
             added_at TEXT NOT NULL,
+            added_ts INTEGER,
+            alerted_ts INTEGER NOT NULL DEFAULT 0,  -- last "back on the shelf" alert
             UNIQUE(user_id, book_id)
         )""")
+    # Rows left behind by withdrawals made before withdraw_books cleaned them up.
+    c.execute("DELETE FROM wishlist WHERE book_id NOT IN (SELECT book_id FROM books)")
+
+    # STEP 10 ── holds ───────────────────────────────────────
+    # One row per student waiting for a book.  `position` is a per-book
+    # ticket number, so UNIQUE(book_id, position) is the queue itself:
+    # the front of a queue and its tail are both one index seek.
+    # 'waiting' → 'ready' when a returned copy is set aside for the
+    # holder, who then has until expires_ts to pick it up.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS holds (
+            hold_id    TEXT PRIMARY KEY,
+            book_id    TEXT NOT NULL,
+            user_id    TEXT NOT NULL,
+            position   INTEGER NOT NULL,
+            status     TEXT NOT NULL DEFAULT 'waiting',   -- 'waiting' | 'ready'
+            created_at TEXT NOT NULL,
+            expires_at TEXT,                  -- pickup deadline once 'ready'
+            created_ts INTEGER,
+            expires_ts INTEGER,
+            UNIQUE(book_id, position),
+            UNIQUE(book_id, user_id)
+        )""")
+
+    # STEP 11 ── change_log ──────────────────────────────────
+    # Append-only journal of row ids touched in books / users, filled
+    # by triggers so every writer (any session, any process) is seen.
+    # In-memory read models replay it to update incrementally.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq    INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl    TEXT NOT NULL,
+            row_id TEXT NOT NULL,
+            op     TEXT NOT NULL          -- 'I' | 'U' | 'D'
+        )""")
+    for tbl, key in (("books", "book_id"), ("users", "user_id")):
+        for op, event, ref in (("I", "INSERT", "NEW"), ("U", "UPDATE", "NEW"),
+                               ("D", "DELETE", "OLD")):
+            c.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{tbl}_{op.lower()}
+                AFTER {event} ON {tbl} BEGIN
+                    INSERT INTO change_log (tbl,row_id,op)
+                    VALUES ('{tbl}', {ref}.{key}, '{op}');
+                END""")
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_prune
+        AFTER INSERT ON change_log BEGIN
+            DELETE FROM change_log WHERE seq <= NEW.seq - {CHANGE_LOG_KEEP};
+        END""")
+
+    c.commit()
+
+    # STEP 12 ── epoch columns ─────────────────────────────────
+    # Every *_at ISO string has an INTEGER *_ts twin (epoch seconds) so
+    # range / overdue arithmetic runs in SQL with no per-row parsing.
+    # DBs created before the twins existed get them added and backfilled
+    # in bounded batches; the ISO text stays for display.
+    for tbl, iso_col, ts_col in _EPOCH_COLS:
+        have = {r[1] for r in c.execute(f"PRAGMA table_info({tbl})")}
+        if ts_col in have:
+            continue
+        c.execute(f"ALTER TABLE {tbl} ADD COLUMN {ts_col} INTEGER")
+        while c.execute(f"""UPDATE {tbl} SET {ts_col}={_epoch(iso_col)}
+                WHERE rowid IN (SELECT rowid FROM {tbl}
+                                WHERE {ts_col} IS NULL LIMIT 50000)""").rowcount:
+            c.commit()
+        c.commit()
+    if "alerted_ts" not in {r[1] for r in c.execute("PRAGMA table_info(wishlist)")}:
+        c.execute("ALTER TABLE wishlist ADD COLUMN alerted_ts INTEGER NOT NULL DEFAULT 0")
+        c.commit()
+    if "settled" not in {r[1] for r in c.execute("PRAGMA table_info(fines)")}:
+        c.execute("ALTER TABLE fines ADD COLUMN settled REAL NOT NULL DEFAULT 0")
+        c.commit()
+
+    # STEP 13 ── events ───────────────────────────────────────
+    # Append-only activity journal — issues, returns, requests and their
+    # answers, fines — for the admin feed.  Filled by triggers, like
+    # change_log, so every code path is journaled in the same transaction
+    # as the change itself.  `seq` doubles as the keyset cursor.  A DB
+    # that predates the table gets it backfilled from the rows it has.
+    fresh = not c.execute("SELECT 1 FROM sqlite_master WHERE name='events'").fetchone()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind       TEXT NOT NULL,   -- issue|return|request|approved|rejected|fine
+            user_id    TEXT,
+            book_id    TEXT,
+            ref_id     TEXT,            -- issue: loan, return: reading_history row,
+                                        -- request / answer: request, fine: fine
+            detail     TEXT NOT NULL DEFAULT '',   -- book title at the time
+            amount     REAL,            -- fines only
+            created_at TEXT NOT NULL,
+            created_ts INTEGER NOT NULL
+        )""")
+    now = "strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'), CAST(strftime('%s', 'now') AS INTEGER)"
+    title = "COALESCE((SELECT title FROM books WHERE book_id={}.book_id), '')"
+    # the loan row is gone after a return; its history row (written first,
+    # by return_books) is what the event points at — as in the backfill
+    hist = """(SELECT history_id FROM reading_history WHERE user_id=OLD.user_id
+                 AND book_id=OLD.book_id AND returned_ts >= OLD.issue_ts
+                 ORDER BY returned_ts DESC LIMIT 1)"""
+    if c.execute("""SELECT 1 FROM sqlite_master WHERE name='trg_events_return'
+                    AND sql LIKE '%OLD.issue_id%'""").fetchone():
+        c.execute("DROP TRIGGER trg_events_return")     # pointed at the loan
+        c.execute("""UPDATE events SET ref_id=(
+                SELECT history_id FROM reading_history h WHERE h.user_id=events.user_id
+                AND h.book_id=events.book_id AND h.returned_ts <= events.created_ts
+                ORDER BY h.returned_ts DESC LIMIT 1)
+            WHERE kind='return'""")
+    for name, event, when, values in (
+            ("issue",   "AFTER INSERT ON issued_books", "",
+             f"'issue', NEW.user_id, NEW.book_id, NEW.issue_id, {title.format('NEW')}, NULL"),
+            ("return",  "AFTER DELETE ON issued_books", "",
+             f"'return', OLD.user_id, OLD.book_id, {hist}, {title.format('OLD')}, NULL"),
+            ("request", "AFTER INSERT ON book_requests", "",
+             "'request', NEW.user_id, NULL, NEW.request_id, NEW.book_title, NULL"),
+            ("answer",  "AFTER UPDATE OF status ON book_requests",
+             "WHEN NEW.status != OLD.status AND NEW.status IN ('approved', 'rejected')",
+             "NEW.status, NEW.user_id, NULL, NEW.request_id, NEW.book_title, NULL"),
+            ("fine",    "AFTER INSERT ON fines", "",
+             f"'fine', NEW.user_id, NEW.book_id, NEW.fine_id, {title.format('NEW')}, NEW.amount")):
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_events_{name} {event} {when} BEGIN
+                INSERT INTO events (kind,user_id,book_id,ref_id,detail,amount,created_at,created_ts)
+                VALUES ({values}, {now});
+            END""")
+    if fresh:
+        c.execute("""INSERT INTO events
+            (kind,user_id,book_id,ref_id,detail,amount,created_at,created_ts)
+            SELECT * FROM (
+                SELECT 'issue', ib.user_id, ib.book_id, ib.issue_id, COALESCE(b.title, ''),
+                       NULL, ib.issue_date, ib.issue_ts
+                FROM issued_books ib LEFT JOIN books b ON b.book_id=ib.book_id
+                UNION ALL
+                SELECT 'return', user_id, book_id, history_id, book_title,
+                       NULL, returned_at, returned_ts FROM reading_history
+                UNION ALL
+                SELECT 'request', user_id, NULL, request_id, book_title,
+                       NULL, created_at, created_ts FROM book_requests
+                UNION ALL
+                SELECT status, user_id, NULL, request_id, book_title,
+                       NULL, updated_at, updated_ts FROM book_requests
+                WHERE status IN ('approved', 'rejected')
+                UNION ALL
+                SELECT 'fine', f.user_id, f.book_id, f.fine_id, COALESCE(b.title, ''),
+                       f.amount, f.created_at, f.created_ts
+                FROM fines f LEFT JOIN books b ON b.book_id=f.book_id)
+            ORDER BY 8""")
+    c.commit()
+
+    # STEP 14 ── fine ledger ──────────────────────────────────
+    # Charges, payments and waivers as signed ledger rows (+ owed,
+    # − paid / waived), each with the user's balance after it.
+    # fine_balances keeps the current balance: one primary-key read.
+    # Both are written by the same service transaction.  A DB that
+    # predates the ledger opens it with its unpaid fines as charges.
+    fresh = not c.execute("SELECT 1 FROM sqlite_master WHERE name='fine_ledger'").fetchone()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS fine_ledger (
+            seq           INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id       TEXT NOT NULL,
+            fine_id       TEXT,              -- charge / waiver: the fine; payment: NULL
+            kind          TEXT NOT NULL,     -- 'charge' | 'payment' | 'waiver'
+            amount        REAL NOT NULL,     -- signed
+            balance_after REAL NOT NULL,
+            note          TEXT NOT NULL DEFAULT '',
+            created_by    TEXT NOT NULL,
+            created_at    TEXT NOT NULL,
+            created_ts    INTEGER NOT NULL
+        )""")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS fine_balances (
+            user_id TEXT PRIMARY KEY,
+            balance REAL NOT NULL
+        )""")
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_events_settle
+        AFTER INSERT ON fine_ledger WHEN NEW.kind != 'charge' BEGIN
+            INSERT INTO events (kind,user_id,book_id,ref_id,detail,amount,created_at,created_ts)
+            VALUES (NEW.kind, NEW.user_id, NULL, NEW.fine_id, 'by ' || NEW.created_by,
+                    -NEW.amount, NEW.created_at, NEW.created_ts);
+        END""")
+    if fresh:
+        c.execute("""INSERT INTO fine_ledger
+            (user_id,fine_id,kind,amount,balance_after,note,created_by,created_at,created_ts)
+            SELECT user_id, fine_id, 'charge', amount - settled,
+                   SUM(amount - settled) OVER (PARTITION BY user_id
+                                               ORDER BY created_ts, fine_id),
+                   'opening balance', 'system', created_at, created_ts
+            FROM fines WHERE paid=0 ORDER BY created_ts, fine_id""")
+        c.execute("""INSERT OR REPLACE INTO fine_balances
+            SELECT user_id, ROUND(SUM(amount - settled), 2) FROM fines
+            WHERE paid=0 GROUP BY user_id""")
+    c.commit()
+
+    # STEP 15 ── indexes ──────────────────────────────────────
+    # Composite (sort_key, pk) indexes let keyset pagination seek
+    # straight to the next page instead of OFFSET-scanning.
+    c.execute("CREATE INDEX IF NOT EXISTS idx_books_added ON books(added_at, book_id)")
+    # Partial: only titles with a copy on the shelf — the Issue tab's quick
+    # reference reads its newest rows without touching fully-issued books.
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_books_avail
+                 ON books(added_at, book_id) WHERE available_copies > 0""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_notifs_user
+                 ON notifications(user_id, created_at, notif_id)""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_issued_due  ON issued_books(due_ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_issued_user ON issued_books(user_id, issue_ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_issued_book ON issued_books(book_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_fines_user  ON fines(user_id, created_ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hist_user   ON reading_history(user_id, returned_ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hist_book   ON reading_history(book_id, rating)")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_reqs_status
+                 ON book_requests(status, created_at, request_id)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_reqs_created
+                 ON book_requests(created_at, request_id)""")
+    # cutoff scans for archive_cold_rows()
+    c.execute("CREATE INDEX IF NOT EXISTS idx_hist_ts   ON reading_history(returned_ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_fines_ts  ON fines(created_ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_reqs_ts   ON book_requests(updated_ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notifs_ts ON notifications(created_ts)")
+    # front of the waiting line and "#n in line" counts read this
+    # index alone; "my holds" and the pickup-expiry sweep (only 'ready'
+    # rows indexed) have their own
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_holds_queue
+                 ON holds(book_id, status, position)""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_holds_user ON holds(user_id, created_ts)")
+    # wishlisters of a returned book not alerted lately: one range per book
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_wishlist_book
+                 ON wishlist(book_id, alerted_ts, user_id)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_holds_expiry
+                 ON holds(expires_ts) WHERE status='ready'""")
+    # one kind of activity, newest first: a seek, whatever the journal size
+    c.execute("CREATE INDEX IF NOT EXISTS idx_events_kind ON events(kind, seq)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ledger_user ON fine_ledger(user_id, seq)")
 
     c.commit()
 
-    # STEP 10 ── seed default admin ───────────────────────────
+    # STEP 16 ── seed default admin ───────────────────────────
     if c.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
         import hashlib
         from datetime import datetime
         pw = hashlib.sha256("Admin@123".encode()).hexdigest()
-        c.execute("""
-            INSERT INTO users (user_id,name,email,password,role,created_at,avatar_color)
-            VALUES (?,?,?,?,?,?,?)
+        c.execute(f"""
+            INSERT INTO users (user_id,name,email,password,role,created_at,avatar_color,created_ts)
+            VALUES (?1,?2,?3,?4,?5,?6,?7,{_epoch("?6")})
         """, ("ADMIN001", "Super Admin", "admin@library.com",
               pw, "admin", datetime.now().isoformat(), "#ff00ff"))
         c.commit()
@@ -163,37 +727,25 @@ def initialize_database():
 # ══════════════════════════════════════════════════════════════
 # USER QUERIES
 # ══════════════════════════════════════════════════════════════
-def insert_user(user_id, name, email, pw_hash, role, created_at, avatar_color):
-    c = _conn()
+@_writes
+def insert_user(c, user_id, name, email, pw_hash, role, created_at, avatar_color):
     try:
-        c.execute("""INSERT INTO users
-            (user_id,name,email,password,role,created_at,avatar_color)
-            VALUES (?,?,?,?,?,?,?)""",
+        c.execute(f"""INSERT INTO users
+            (user_id,name,email,password,role,created_at,avatar_color,created_ts)
+            VALUES (?1,?2,?3,?4,?5,?6,?7,{_epoch("?6")})""",
             (user_id, name, email, pw_hash, role, created_at, avatar_color))
-        c.commit()
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        c.close()
 
 def get_user_by_email(email):
-    c = _conn()
-    row = c.execute("SELECT * FROM users WHERE email=?", (email,)).fetchone()
-    c.close()
-    return row
+    return _fetch_one(User, f"SELECT {_USER_COLS} FROM users WHERE email=?", (email,))
 
 def get_user_by_id(uid):
-    c = _conn()
-    row = c.execute("SELECT * FROM users WHERE user_id=?", (uid,)).fetchone()
-    c.close()
-    return row
+    return _fetch_one(User, f"SELECT {_USER_COLS} FROM users WHERE user_id=?", (uid,))
 
 def get_all_users():
-    c = _conn()
-    rows = c.execute("SELECT * FROM users ORDER BY created_at DESC").fetchall()
-    c.close()
-    return rows
+    return _fetch(User, f"SELECT {_USER_COLS} FROM users ORDER BY created_at DESC")
 
 def count_users():
     c = _conn()
@@ -201,34 +753,83 @@ def count_users():
     c.close()
     return n
 
+def get_user_counts(user_ids):
+    """
+    {user_id: (active loans, books read — archive included, fine balance)}
+    for all of `user_ids` in three grouped index reads; no rows loaded.
+    """
+    c = _conn()
+    marks = ",".join("?" * len(user_ids))
+    out = {u: [0, 0, 0.0] for u in user_ids}
+    for i, sql in enumerate((
+            f"SELECT user_id, COUNT(*) FROM issued_books WHERE user_id IN ({marks}) GROUP BY 1",
+            f"SELECT user_id, COUNT(*) FROM {_source(c, 'reading_history', True)} "
+            f"WHERE user_id IN ({marks}) GROUP BY 1",
+            f"SELECT user_id, balance FROM fine_balances WHERE user_id IN ({marks})")):
+        for user_id, n in c.execute(sql, list(user_ids)):
+            out[user_id][i] = n
+    c.close()
+    return {u: tuple(v) for u, v in out.items()}
+
+def get_users_by_ids(ids):
+    return _fetch(User,
+        f"SELECT {_USER_COLS} FROM users WHERE user_id IN ({','.join('?' * len(ids))})",
+        list(ids))
+
+def get_users_by_id_prefix(prefix, limit=8):
+    """Users whose id starts with `prefix`: one range seek on the primary key."""
+    return _fetch(User, f"""SELECT {_USER_COLS} FROM users
+        WHERE user_id >= ? AND user_id < ? ORDER BY user_id LIMIT ?""",
+        (prefix, prefix + _MAX_CHAR, limit))
+
 
 # ══════════════════════════════════════════════════════════════
 # BOOK QUERIES
 # ══════════════════════════════════════════════════════════════
-def insert_book(book_id, title, author, category, total_copies, added_by, added_at):
-    c = _conn()
-    c.execute("""INSERT INTO books
-        (book_id,title,author,category,total_copies,available_copies,added_by,added_at,borrow_count)
-        VALUES (?,?,?,?,?,?,?,?,0)""",
-        (book_id, title, author, category, total_copies, total_copies, added_by, added_at))
-    c.commit()
-    c.close()
+@_writes
+def insert_book(c, book_id, title, author, category, total_copies, added_by, added_at):
+    c.execute(f"""INSERT INTO books
+        (book_id,title,author,category,total_copies,available_copies,added_by,added_at,borrow_count,added_ts)
+        VALUES (?1,?2,?3,?4,?5,?5,?6,?7,0,{_epoch("?7")})""",
+        (book_id, title, author, category, total_copies, added_by, added_at))
 
 def get_all_books():
-    c = _conn()
-    rows = c.execute("SELECT * FROM books ORDER BY added_at DESC").fetchall()
-    c.close()
-    return rows
+    return _fetch(Book, f"SELECT {_BOOK_COLS} FROM books ORDER BY added_at DESC")
 
 def get_book_by_id(book_id):
-    c = _conn()
-    row = c.execute("SELECT * FROM books WHERE book_id=?", (book_id,)).fetchone()
-    c.close()
-    return row
+    return _fetch_one(Book, f"SELECT {_BOOK_COLS} FROM books WHERE book_id=?", (book_id,))
 
-def update_book_availability(book_id, delta):
+def get_books_by_ids(ids):
+    return _fetch(Book,
+        f"SELECT {_BOOK_COLS} FROM books WHERE book_id IN ({','.join('?' * len(ids))})",
+        list(ids))
+
+def get_available_books(limit=8):
+    """Newest titles with a copy on the shelf — walks idx_books_avail only."""
+    return _fetch(Book, f"""SELECT {_BOOK_COLS} FROM books WHERE available_copies > 0
+        ORDER BY added_at DESC, book_id DESC LIMIT ?""", (limit,))
+
+def get_books_by_id_prefix(prefix, limit=8):
+    """Books whose id starts with `prefix`: one range seek on the primary key."""
+    return _fetch(Book, f"""SELECT {_BOOK_COLS} FROM books
+        WHERE book_id >= ? AND book_id < ? ORDER BY book_id LIMIT ?""",
+        (prefix, prefix + _MAX_CHAR, limit))
+
+def get_books_page(after=None, limit=20):
+    """
+    Keyset page, newest first.  `after` = (added_at, book_id) of the
+    last row already seen; None → first page.
+    """
+    if after is None:
+        return _fetch(Book, f"""SELECT {_BOOK_COLS} FROM books
+            ORDER BY added_at DESC, book_id DESC LIMIT ?""", (limit,))
+    return _fetch(Book, f"""SELECT {_BOOK_COLS} FROM books
+        WHERE (added_at, book_id) < (?, ?)
+        ORDER BY added_at DESC, book_id DESC LIMIT ?""", (*after, limit))
+
+@_writes
+def update_book_availability(c, book_id, delta):
     """delta=-1 when issuing (also bumps borrow_count), +1 when returning."""
-    c = _conn()
     if delta < 0:
         c.execute("""UPDATE books
             SET available_copies=available_copies+?,
@@ -237,14 +838,33 @@ def update_book_availability(book_id, delta):
     else:
         c.execute("UPDATE books SET available_copies=available_copies+? WHERE book_id=?",
                   (delta, book_id))
-    c.commit()
-    c.close()
 
-def delete_book(book_id):
-    c = _conn()
+@_writes
+def adjust_books_availability(c, deltas, borrowed=None):
+    """
+    Batch form of update_book_availability: {book_id: delta}.  A negative
+    delta (copies going out) also adds |delta| to borrow_count, unless
+    `borrowed` ({book_id: n}) gives the count — copies picked up from
+    the hold shelf are borrowed without leaving available_copies.
+    """
+    if borrowed is None:
+        borrowed = {b: -d for b, d in deltas.items() if d < 0}
+    c.executemany("""UPDATE books
+        SET available_copies=available_copies+?1,
+            borrow_count=borrow_count+?2
+        WHERE book_id=?3""",
+        ((deltas.get(b, 0), borrowed.get(b, 0), b) for b in deltas.keys() | borrowed.keys()
+         if deltas.get(b) or borrowed.get(b)))
+
+@_writes
+def delete_book(c, book_id):
     c.execute("DELETE FROM books WHERE book_id=?", (book_id,))
-    c.commit()
-    c.close()
+
+@_writes
+def delete_books(c, book_ids):
+    """One executemany for many ids → rows deleted."""
+    return c.executemany("DELETE FROM books WHERE book_id=?",
+                         ((b,) for b in book_ids)).rowcount
 
 def count_books():
     c = _conn()
@@ -253,56 +873,104 @@ def count_books():
     return n
 
 def get_top_borrowed_books(limit=3):
-    c = _conn()
-    rows = c.execute("SELECT * FROM books ORDER BY borrow_count DESC LIMIT ?", (limit,)).fetchall()
-    c.close()
-    return rows
+    return _fetch(Book, f"SELECT {_BOOK_COLS} FROM books ORDER BY borrow_count DESC LIMIT ?", (limit,))
 
 
 # ══════════════════════════════════════════════════════════════
 # ISSUED-BOOKS QUERIES
 # ══════════════════════════════════════════════════════════════
-def insert_issued_book(issue_id, book_id, user_id, issue_date, due_date):
-    c = _conn()
-    c.execute("""INSERT INTO issued_books
-        (issue_id,book_id,user_id,issue_date,due_date) VALUES (?,?,?,?,?)""",
+@_writes
+def insert_issued_book(c, issue_id, book_id, user_id, issue_date, due_date):
+    c.execute(f"""INSERT INTO issued_books
+        (issue_id,book_id,user_id,issue_date,due_date,issue_ts,due_ts)
+        VALUES (?1,?2,?3,?4,?5,{_epoch("?4")},{_epoch("?5")})""",
         (issue_id, book_id, user_id, issue_date, due_date))
-    c.commit()
+
+@_writes
+def insert_issued_books(c, rows):
+    """rows = [(issue_id, book_id, user_id, issue_date, due_date), …]"""
+    c.executemany(f"""INSERT INTO issued_books
+        (issue_id,book_id,user_id,issue_date,due_date,issue_ts,due_ts)
+        VALUES (?1,?2,?3,?4,?5,{_epoch("?4")},{_epoch("?5")})""", rows)
+
+# days_left / is_overdue / fine (₹5 per overdue day) computed in SQL, then due_ts
+_LOAN_DUE = f"""{_days_until("ib.due_ts", "?1")},
+               {_days_until("ib.due_ts", "?1")} < 0,
+               MAX(0, -{_days_until("ib.due_ts", "?1")}) * 5.0,
+               ib.due_ts"""
+
+def get_issued_books_by_user(user_id, now=None):
+    return _fetch(IssuedBook, f"""
+        SELECT ib.issue_id, ib.book_id, ib.user_id, ib.issue_date, ib.due_date,
+               b.title, b.author, b.category, '', '', {_LOAN_DUE}
+        FROM issued_books ib JOIN books b ON ib.book_id=b.book_id
+        WHERE ib.user_id=?2 ORDER BY ib.issue_ts DESC""",
+        (now or int(time.time()), user_id))
+
+def get_all_issued_books(now=None):
+    return _fetch(IssuedBook, f"""
+        SELECT ib.issue_id, ib.book_id, ib.user_id, ib.issue_date, ib.due_date,
+               b.title, b.author, b.category, u.name AS borrower_name, u.email,
+               {_LOAN_DUE}
+        FROM issued_books ib
+        JOIN books b ON ib.book_id=b.book_id
+        JOIN users u ON ib.user_id=u.user_id
+        ORDER BY ib.issue_ts DESC""", (now or int(time.time()),))
+
+def get_issue_record(book_id, user_id, now=None):
+    """Active loan row plus SQL-computed days_late (≥0) and days_kept (≥1)."""
+    c = _conn()
+    row = c.execute(f"""
+        SELECT *, MAX(0, {_days_until("?1", "due_ts")})   AS days_late,
+                  MAX(1, {_days_until("?1", "issue_ts")}) AS days_kept
+        FROM issued_books WHERE book_id=?2 AND user_id=?3""",
+        (now or int(time.time()), book_id, user_id)).fetchone()
     c.close()
+    return row
 
-def get_issued_books_by_user(user_id):
+def get_loans_for_books(book_ids, now=None):
+    """Every active loan on `book_ids`, with days_late / days_kept like get_issue_record."""
     c = _conn()
-    rows = c.execute("""
-        SELECT ib.*, b.title, b.author, b.category
-        FROM issued_books ib JOIN books b ON ib.book_id=b.book_id
-        WHERE ib.user_id=? ORDER BY ib.issue_date DESC""", (user_id,)).fetchall()
+    rows = c.execute(f"""
+        SELECT *, MAX(0, {_days_until("?1", "due_ts")})   AS days_late,
+                  MAX(1, {_days_until("?1", "issue_ts")}) AS days_kept
+        FROM issued_books WHERE book_id IN ({','.join('?' * len(book_ids))})""",
+        (now or int(time.time()), *book_ids)).fetchall()
     c.close()
     return rows
 
-def get_all_issued_books():
+def count_overdue(now=None):
+    """Range scan on idx_issued_due — no row parsing."""
     c = _conn()
-    rows = c.execute("""
-        SELECT ib.*, b.title, u.name AS borrower_name, u.email
-        FROM issued_books ib
-        JOIN books b ON ib.book_id=b.book_id
-        JOIN users u ON ib.user_id=u.user_id
-        ORDER BY ib.issue_date DESC""").fetchall()
+    n = c.execute("SELECT COUNT(*) FROM issued_books WHERE due_ts < ?",
+                  (now or int(time.time()),)).fetchone()[0]
     c.close()
-    return rows
+    return n
 
-def get_issue_record(book_id, user_id):
+@_writes
+def delete_issue_record(c, issue_id):
+    c.execute("DELETE FROM issued_books WHERE issue_id=?", (issue_id,))
+
+@_writes
+def delete_issue_records(c, issue_ids):
+    c.executemany("DELETE FROM issued_books WHERE issue_id=?", ((i,) for i in issue_ids))
+
+def has_active_loan(book_id):
+    """Index probe on idx_issued_book — stops at the first loan."""
     c = _conn()
-    row = c.execute(
-        "SELECT * FROM issued_books WHERE book_id=? AND user_id=?",
-        (book_id, user_id)).fetchone()
+    r = c.execute("SELECT 1 FROM issued_books WHERE book_id=? LIMIT 1",
+                  (book_id,)).fetchone()
     c.close()
-    return row
+    return r is not None
 
-def delete_issue_record(issue_id):
+def get_books_on_loan(book_ids):
+    """Subset of `book_ids` with at least one active loan."""
     c = _conn()
-    c.execute("DELETE FROM issued_books WHERE issue_id=?", (issue_id,))
-    c.commit()
+    rows = c.execute(
+        f"SELECT DISTINCT book_id FROM issued_books WHERE book_id IN ({','.join('?' * len(book_ids))})",
+        list(book_ids)).fetchall()
     c.close()
+    return {r[0] for r in rows}
 
 def count_issued():
     c = _conn()
@@ -314,65 +982,158 @@ def count_issued():
 # ══════════════════════════════════════════════════════════════
 # FINES QUERIES
 # ══════════════════════════════════════════════════════════════
-def insert_fine(fine_id, user_id, book_id, issue_id, days_late, amount, created_at):
-    c = _conn()
-    c.execute("""INSERT INTO fines
-        (fine_id,user_id,book_id,issue_id,days_late,amount,paid,created_at)
-        VALUES (?,?,?,?,?,?,0,?)""",
+@_writes
+def insert_fine(c, fine_id, user_id, book_id, issue_id, days_late, amount, created_at):
+    c.execute(f"""INSERT INTO fines
+        (fine_id,user_id,book_id,issue_id,days_late,amount,paid,created_at,created_ts)
+        VALUES (?1,?2,?3,?4,?5,?6,0,?7,{_epoch("?7")})""",
         (fine_id, user_id, book_id, issue_id, days_late, amount, created_at))
-    c.commit()
-    c.close()
 
-def get_fines_by_user(user_id):
+@_writes
+def insert_fines(c, rows):
+    """rows = [(fine_id, user_id, book_id, issue_id, days_late, amount, created_at), …]"""
+    c.executemany(f"""INSERT INTO fines
+        (fine_id,user_id,book_id,issue_id,days_late,amount,paid,created_at,created_ts)
+        VALUES (?1,?2,?3,?4,?5,?6,0,?7,{_epoch("?7")})""", rows)
+
+# Fines outlive withdrawn books (fine_balances still counts them), so
+# fine lists LEFT JOIN books and show this in place of the title.
+_GONE_TITLE = "'(withdrawn)'"
+
+def get_fines_by_user(user_id, archived=False):
     c = _conn()
-    rows = c.execute("""
-        SELECT f.*, b.title FROM fines f JOIN books b ON f.book_id=b.book_id
-        WHERE f.user_id=? ORDER BY f.created_at DESC""", (user_id,)).fetchall()
+    rows = _fetch(Fine, f"""
+        SELECT f.fine_id, f.user_id, f.book_id, f.issue_id, f.days_late,
+               f.amount, f.paid, f.created_at, COALESCE(b.title, {_GONE_TITLE}),
+               COALESCE(f.settled, f.amount)
+        FROM {_source(c, "fines", archived)} f LEFT JOIN books b ON f.book_id=b.book_id
+        WHERE f.user_id=? ORDER BY f.created_ts DESC""", (user_id,), c)
     c.close()
     return rows
 
 def get_total_fine_by_user(user_id):
+    """What the user owes: their fine_balances row, one primary-key read."""
     c = _conn()
-    n = c.execute(
-        "SELECT COALESCE(SUM(amount),0) FROM fines WHERE user_id=? AND paid=0",
-        (user_id,)).fetchone()[0]
+    r = c.execute("SELECT balance FROM fine_balances WHERE user_id=?", (user_id,)).fetchone()
     c.close()
-    return n
+    return r[0] if r else 0.0
+
+def get_fine(fine_id):
+    c = _conn()
+    r = c.execute("SELECT * FROM fines WHERE fine_id=?", (fine_id,)).fetchone()
+    c.close()
+    return r
+
+def get_unpaid_fines(user_ids):
+    """Open fines of `user_ids`, oldest first per user (seeks idx_fines_user)."""
+    c = _conn()
+    rows = c.execute(f"""SELECT fine_id, user_id, amount, settled FROM fines
+        WHERE user_id IN ({','.join('?' * len(user_ids))}) AND paid=0
+        ORDER BY user_id, created_ts, fine_id""", list(user_ids)).fetchall()
+    c.close()
+    return rows
+
+@_writes
+def settle_fines(c, rows):
+    """rows = [(settled, fine_id), …]; a fine is paid once settled covers it."""
+    c.executemany("UPDATE fines SET settled=?1, paid=(?1 >= amount - 0.005) WHERE fine_id=?2", rows)
 
 
 # ══════════════════════════════════════════════════════════════
-# BOOK-REQUESTS QUERIES
+# FINE LEDGER QUERIES
 # ══════════════════════════════════════════════════════════════
-def insert_request(req_id, user_id, user_name, book_title, author, reason, ts):
+def get_fine_balances(user_ids):
+    """{user_id: balance} for those of `user_ids` with a ledger."""
     c = _conn()
-    c.execute("""INSERT INTO book_requests
-        (request_id,user_id,user_name,book_title,author,reason,status,admin_note,created_at,updated_at)
-        VALUES (?,?,?,?,?,?,'pending','',?,?)""",
-        (req_id, user_id, user_name, book_title, author, reason, ts, ts))
-    c.commit()
+    rows = c.execute(f"""SELECT user_id, balance FROM fine_balances
+        WHERE user_id IN ({','.join('?' * len(user_ids))})""", list(user_ids)).fetchall()
     c.close()
+    return dict(rows)
 
-def get_all_requests():
+@_writes
+def post_ledger_entries(c, entries, balances):
+    """
+    entries  = [(user_id, fine_id, kind, amount, balance_after, note, by, ts), …]
+    balances = {user_id: balance after the last of their entries}
+    Appends the entries and moves the balances in the same transaction.
+    """
+    c.executemany(f"""INSERT INTO fine_ledger
+        (user_id,fine_id,kind,amount,balance_after,note,created_by,created_at,created_ts)
+        VALUES (?1,?2,?3,?4,?5,?6,?7,?8,{_epoch("?8")})""", entries)
+    c.executemany("""INSERT INTO fine_balances (user_id, balance) VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET balance=excluded.balance""", balances.items())
+
+def get_ledger_page(user_id, after=None, limit=20):
+    """Keyset page of one user's ledger, newest first; `after` = seq last seen."""
     c = _conn()
-    rows = c.execute("SELECT * FROM book_requests ORDER BY created_at DESC").fetchall()
+    rows = c.execute(f"""SELECT * FROM fine_ledger WHERE user_id=?
+        {"AND seq<?" if after is not None else ""} ORDER BY seq DESC LIMIT ?""",
+        (user_id, *(() if after is None else (after,)), limit)).fetchall()
     c.close()
     return rows
 
-def get_requests_by_user(user_id):
+
+# ══════════════════════════════════════════════════════════════
+# BOOK-REQUESTS QUERIES
+# ══════════════════════════════════════════════════════════════
+@_writes
+def insert_request(c, req_id, user_id, user_name, book_title, author, reason, ts):
+    c.execute(f"""INSERT INTO book_requests
+        (request_id,user_id,user_name,book_title,author,reason,status,admin_note,
+         created_at,updated_at,created_ts,updated_ts)
+        VALUES (?1,?2,?3,?4,?5,?6,'pending','',?7,?7,{_epoch("?7")},{_epoch("?7")})""",
+        (req_id, user_id, user_name, book_title, author, reason, ts))
+
+def get_all_requests():
+    return _fetch(BookRequest,
+        f"SELECT {_REQ_COLS} FROM book_requests ORDER BY created_at DESC")
+
+def get_request_by_id(req_id):
+    return _fetch_one(BookRequest,
+        f"SELECT {_REQ_COLS} FROM book_requests WHERE request_id=?", (req_id,))
+
+def get_requests_by_ids(ids):
+    return _fetch(BookRequest,
+        f"SELECT {_REQ_COLS} FROM book_requests WHERE request_id IN ({','.join('?' * len(ids))})",
+        list(ids))
+
+def get_requests_page(status=None, after=None, limit=20):
+    """
+    Keyset page, newest first, optionally one status only.
+    `after` = (created_at, request_id) of the last row already seen.
+    Seeks idx_reqs_status / idx_reqs_created — no OFFSET, no full scan.
+    """
+    where, params = [], []
+    if status is not None:
+        where.append("status=?"); params.append(status)
+    if after is not None:
+        where.append("(created_at, request_id) < (?, ?)"); params.extend(after)
+    return _fetch(BookRequest, f"""SELECT {_REQ_COLS} FROM book_requests
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY created_at DESC, request_id DESC LIMIT ?""", (*params, limit))
+
+def get_requests_by_user(user_id, archived=False):
     c = _conn()
-    rows = c.execute(
-        "SELECT * FROM book_requests WHERE user_id=? ORDER BY created_at DESC",
-        (user_id,)).fetchall()
+    rows = _fetch(BookRequest,
+        f"SELECT {_REQ_COLS} FROM {_source(c, 'book_requests', archived)} "
+        "WHERE user_id=? ORDER BY created_at DESC", (user_id,), c)
     c.close()
     return rows
 
-def update_request_status(req_id, status, note, ts):
-    c = _conn()
+@_writes
+def update_request_status(c, req_id, status, note, ts):
     c.execute(
-        "UPDATE book_requests SET status=?,admin_note=?,updated_at=? WHERE request_id=?",
+        f"UPDATE book_requests SET status=?1,admin_note=?2,updated_at=?3,updated_ts={_epoch('?3')} "
+        "WHERE request_id=?4",
         (status, note, ts, req_id))
-    c.commit()
-    c.close()
+
+@_writes
+def update_requests_status(c, req_ids, status, note, ts):
+    """Bulk version for many requests; only rows still pending change → rows updated."""
+    return c.executemany(
+        f"UPDATE book_requests SET status=?1,admin_note=?2,updated_at=?3,updated_ts={_epoch('?3')} "
+        "WHERE request_id=?4 AND status='pending'",
+        ((status, note, ts, rid) for rid in req_ids)).rowcount
 
 def count_pending_requests():
     c = _conn()
@@ -385,27 +1146,39 @@ def count_pending_requests():
 # ══════════════════════════════════════════════════════════════
 # NOTIFICATIONS QUERIES
 # ══════════════════════════════════════════════════════════════
-def insert_notification(notif_id, user_id, message, ntype, ts):
-    c = _conn()
-    c.execute("""INSERT INTO notifications
-        (notif_id,user_id,message,type,is_read,created_at) VALUES (?,?,?,?,0,?)""",
+@_writes
+def insert_notification(c, notif_id, user_id, message, ntype, ts):
+    c.execute(f"""INSERT INTO notifications
+        (notif_id,user_id,message,type,is_read,created_at,created_ts)
+        VALUES (?1,?2,?3,?4,0,?5,{_epoch("?5")})""",
         (notif_id, user_id, message, ntype, ts))
-    c.commit()
-    c.close()
 
-def get_notifications(user_id, limit=30):
+@_writes
+def insert_notifications(c, rows):
+    """rows = [(notif_id, user_id, message, type, ts), …] in one executemany."""
+    c.executemany(f"""INSERT INTO notifications
+        (notif_id,user_id,message,type,is_read,created_at,created_ts)
+        VALUES (?1,?2,?3,?4,0,?5,{_epoch("?5")})""", rows)
+
+def get_notifications(user_id, limit=30, after=None, archived=False):
+    """Newest first.  `after` = (created_at, notif_id) keyset cursor."""
     c = _conn()
-    rows = c.execute(
-        "SELECT * FROM notifications WHERE user_id=? ORDER BY created_at DESC LIMIT ?",
-        (user_id, limit)).fetchall()
+    src = _source(c, "notifications", archived)
+    if after is None:
+        rows = c.execute(f"""SELECT * FROM {src} WHERE user_id=?
+            ORDER BY created_at DESC, notif_id DESC LIMIT ?""",
+            (user_id, limit)).fetchall()
+    else:
+        rows = c.execute(f"""SELECT * FROM {src}
+            WHERE user_id=? AND (created_at, notif_id) < (?, ?)
+            ORDER BY created_at DESC, notif_id DESC LIMIT ?""",
+            (user_id, *after, limit)).fetchall()
     c.close()
     return rows
 
-def mark_notifications_read(user_id):
-    c = _conn()
+@_writes
+def mark_notifications_read(c, user_id):
     c.execute("UPDATE notifications SET is_read=1 WHERE user_id=?", (user_id,))
-    c.commit()
-    c.close()
 
 def count_unread_notifications(user_id):
     c = _conn()
@@ -419,29 +1192,34 @@ def count_unread_notifications(user_id):
 # ══════════════════════════════════════════════════════════════
 # READING HISTORY QUERIES
 # ══════════════════════════════════════════════════════════════
-def insert_reading_history(hist_id, user_id, book_id, book_title, author, category, returned_at, days_kept):
-    c = _conn()
-    c.execute("""INSERT OR IGNORE INTO reading_history
-        (history_id,user_id,book_id,book_title,author,category,returned_at,days_kept,rating,review)
-        VALUES (?,?,?,?,?,?,?,?,0,'')""",
+@_writes
+def insert_reading_history(c, hist_id, user_id, book_id, book_title, author, category, returned_at, days_kept):
+    c.execute(f"""INSERT OR IGNORE INTO reading_history
+        (history_id,user_id,book_id,book_title,author,category,returned_at,days_kept,rating,review,returned_ts)
+        VALUES (?1,?2,?3,?4,?5,?6,?7,?8,0,'',{_epoch("?7")})""",
         (hist_id, user_id, book_id, book_title, author, category, returned_at, days_kept))
-    c.commit()
-    c.close()
 
-def get_reading_history(user_id):
+@_writes
+def insert_reading_histories(c, rows):
+    """rows = [(hist_id, user_id, book_id, title, author, category, returned_at, days_kept), …]"""
+    c.executemany(f"""INSERT OR IGNORE INTO reading_history
+        (history_id,user_id,book_id,book_title,author,category,returned_at,days_kept,rating,review,returned_ts)
+        VALUES (?1,?2,?3,?4,?5,?6,?7,?8,0,'',{_epoch("?7")})""", rows)
+
+def get_reading_history(user_id, archived=False):
+    """With archived=True rows carry an `archived` flag (archived ones are read-only)."""
     c = _conn()
     rows = c.execute(
-        "SELECT * FROM reading_history WHERE user_id=? ORDER BY returned_at DESC",
+        f"SELECT * FROM {_source(c, 'reading_history', archived)} "
+        "WHERE user_id=? ORDER BY returned_ts DESC",
         (user_id,)).fetchall()
     c.close()
     return rows
 
-def update_rating_review(hist_id, rating, review):
-    c = _conn()
+@_writes
+def update_rating_review(c, hist_id, rating, review):
     c.execute("UPDATE reading_history SET rating=?,review=? WHERE history_id=?",
               (rating, review, hist_id))
-    c.commit()
-    c.close()
 
 def get_book_avg_rating(book_id):
     c = _conn()
@@ -451,6 +1229,16 @@ def get_book_avg_rating(book_id):
     c.close()
     return round(row[0] or 0, 1), row[1] or 0
 
+def get_avg_ratings(book_ids):
+    """{book_id: avg rating} for the rated books among `book_ids` — one GROUP BY."""
+    c = _conn()
+    rows = c.execute(f"""
+        SELECT book_id, ROUND(AVG(rating), 1) FROM reading_history
+        WHERE book_id IN ({','.join('?' * len(book_ids))}) AND rating>0
+        GROUP BY book_id""", list(book_ids)).fetchall()
+    c.close()
+    return dict(rows)
+
 def get_reviews_for_book(book_id):
     c = _conn()
     rows = c.execute("""
@@ -465,23 +1253,23 @@ def get_reviews_for_book(book_id):
 # ══════════════════════════════════════════════════════════════
 # WISHLIST QUERIES
 # ══════════════════════════════════════════════════════════════
-def add_to_wishlist(wish_id, user_id, book_id, added_at):
-    c = _conn()
+@_writes
+def add_to_wishlist(c, wish_id, user_id, book_id, added_at):
     try:
-        c.execute("INSERT INTO wishlist (wish_id,user_id,book_id,added_at) VALUES (?,?,?,?)",
+        c.execute(f"INSERT INTO wishlist (wish_id,user_id,book_id,added_at,added_ts) "
+                  f"VALUES (?1,?2,?3,?4,{_epoch('?4')})",
                   (wish_id, user_id, book_id, added_at))
-        c.commit()
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        c.close()
 
-def remove_from_wishlist(user_id, book_id):
-    c = _conn()
+@_writes
+def remove_from_wishlist(c, user_id, book_id):
     c.execute("DELETE FROM wishlist WHERE user_id=? AND book_id=?", (user_id, book_id))
-    c.commit()
-    c.close()
+
+@_writes
+def delete_wishlist_for_books(c, book_ids):
+    c.executemany("DELETE FROM wishlist WHERE book_id=?", ((b,) for b in book_ids))
 
 def get_wishlist(user_id):
     c = _conn()
@@ -499,3 +1287,472 @@ def is_in_wishlist(user_id, book_id):
         (user_id, book_id)).fetchone()
     c.close()
     return r is not None
+
+def get_wishlisted(user_id, book_ids):
+    """Subset of `book_ids` on the user's wishlist (seeks on UNIQUE(user_id, book_id))."""
+    c = _conn()
+    rows = c.execute(
+        f"SELECT book_id FROM wishlist WHERE user_id=? "
+        f"AND book_id IN ({','.join('?' * len(book_ids))})", (user_id, *book_ids)).fetchall()
+    c.close()
+    return {r[0] for r in rows}
+
+def get_wishlisters(book_ids, alerted_before):
+    """
+    (user_id, book_id, title) for everyone who wishlisted `book_ids` and
+    was not alerted since `alerted_before` — a range on idx_wishlist_book.
+    """
+    c = _conn()
+    rows = c.execute(f"""
+        SELECT w.user_id, w.book_id, b.title
+        FROM wishlist w JOIN books b ON w.book_id=b.book_id
+        WHERE w.book_id IN ({','.join('?' * len(book_ids))}) AND w.alerted_ts < ?""",
+        (*book_ids, alerted_before)).fetchall()
+    c.close()
+    return rows
+
+@_writes
+def mark_wishlist_alerted(c, pairs, ts):
+    """pairs = [(user_id, book_id), …] alerted at epoch `ts`."""
+    c.executemany("UPDATE wishlist SET alerted_ts=? WHERE user_id=? AND book_id=?",
+                  ((ts, u, b) for u, b in pairs))
+
+
+# ══════════════════════════════════════════════════════════════
+# HOLD QUERIES
+# Every queue operation is a seek on UNIQUE(book_id, position):
+# O(log n) however long the queue for a popular title gets.
+# ══════════════════════════════════════════════════════════════
+# waiting holds ahead of h in its book's queue (range count on the key)
+_HOLD_AHEAD = """(SELECT COUNT(*) FROM holds a
+                  WHERE a.book_id=h.book_id AND a.position<h.position
+                    AND a.status='waiting') AS ahead"""
+
+@_writes
+def insert_hold(c, hold_id, book_id, user_id, created_at):
+    """Join the back of the book's queue; MAX(position) is one seek."""
+    c.execute(f"""INSERT INTO holds
+        (hold_id,book_id,user_id,position,created_at,created_ts)
+        VALUES (?1,?2,?3,
+                (SELECT COALESCE(MAX(position),0)+1 FROM holds WHERE book_id=?2),
+                ?4,{_epoch("?4")})""",
+        (hold_id, book_id, user_id, created_at))
+
+def get_hold(book_id, user_id):
+    c = _conn()
+    r = c.execute(f"SELECT h.*, {_HOLD_AHEAD} FROM holds h WHERE h.book_id=? AND h.user_id=?",
+                  (book_id, user_id)).fetchone()
+    c.close()
+    return r
+
+def get_holds_by_user(user_id):
+    c = _conn()
+    rows = c.execute(f"""
+        SELECT h.*, b.title, b.author, {_HOLD_AHEAD}
+        FROM holds h JOIN books b ON h.book_id=b.book_id
+        WHERE h.user_id=? ORDER BY h.created_ts""", (user_id,)).fetchall()
+    c.close()
+    return rows
+
+def get_ready_holds(book_ids):
+    """(book_id, user_id) pairs holding a set-aside copy of `book_ids`."""
+    c = _conn()
+    rows = c.execute(
+        f"SELECT book_id, user_id FROM holds WHERE status='ready' "
+        f"AND book_id IN ({','.join('?' * len(book_ids))})", list(book_ids)).fetchall()
+    c.close()
+    return {(r[0], r[1]) for r in rows}
+
+def get_next_holds(counts):
+    """
+    Front of each queue: up to n waiting holds per book for
+    counts = {book_id: n}, oldest ticket first.  One seek per book.
+    """
+    c = _conn()
+    rows = []
+    for book_id, n in counts.items():
+        rows += c.execute("""
+            SELECT h.hold_id, h.book_id, h.user_id, b.title
+            FROM holds h JOIN books b ON h.book_id=b.book_id
+            WHERE h.book_id=? AND h.status='waiting'
+            ORDER BY h.position LIMIT ?""", (book_id, n)).fetchall()
+    c.close()
+    return rows
+
+def get_expired_holds(now=None, limit=500):
+    """'ready' holds past their pickup deadline, via the partial idx_holds_expiry."""
+    c = _conn()
+    rows = c.execute("""
+        SELECT h.hold_id, h.book_id, h.user_id, b.title
+        FROM holds h JOIN books b ON h.book_id=b.book_id
+        WHERE h.status='ready' AND h.expires_ts < ?
+        ORDER BY h.expires_ts LIMIT ?""", (now or int(time.time()), limit)).fetchall()
+    c.close()
+    return rows
+
+@_writes
+def mark_holds_ready(c, hold_ids, expires_at):
+    c.executemany(f"""UPDATE holds SET status='ready', expires_at=?2,
+                      expires_ts={_epoch("?2")} WHERE hold_id=?1""",
+                  ((h, expires_at) for h in hold_ids))
+
+@_writes
+def delete_holds(c, hold_ids):
+    c.executemany("DELETE FROM holds WHERE hold_id=?", ((h,) for h in hold_ids))
+
+@_writes
+def delete_holds_for(c, pairs):
+    """Drop the holds of (book_id, user_id) pairs — e.g. once they borrowed the book."""
+    c.executemany("DELETE FROM holds WHERE book_id=? AND user_id=?", pairs)
+
+@_writes
+def delete_holds_for_books(c, book_ids):
+    c.executemany("DELETE FROM holds WHERE book_id=?", ((b,) for b in book_ids))
+
+def count_holds():
+    """→ {'waiting': n, 'ready': n}"""
+    c = _conn()
+    counts = dict(c.execute("SELECT status, COUNT(*) FROM holds GROUP BY status").fetchall())
+    c.close()
+    return {"waiting": counts.get("waiting", 0), "ready": counts.get("ready", 0)}
+
+
+# ══════════════════════════════════════════════════════════════
+# ACTIVITY JOURNAL  (events — written by triggers only)
+# ══════════════════════════════════════════════════════════════
+def get_events_page(kind=None, after=None, limit=20):
+    """
+    Keyset page of the journal, newest first, optionally one kind only.
+    `after` = seq of the last event already seen.  Walks the rowid (or
+    idx_events_kind) backwards from the cursor: O(limit) per page,
+    however long the journal grows.
+    """
+    where, params = [], []
+    if kind is not None:
+        where.append("e.kind=?"); params.append(kind)
+    if after is not None:
+        where.append("e.seq<?"); params.append(after)
+    c = _conn()
+    rows = c.execute(f"""SELECT e.*, COALESCE(u.name, e.user_id, '') AS user_name
+        FROM events e LEFT JOIN users u ON u.user_id=e.user_id
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY e.seq DESC LIMIT ?""", (*params, limit)).fetchall()
+    c.close()
+    return rows
+
+
+# ══════════════════════════════════════════════════════════════
+# EXPORTS — streamed, never fetchall()
+# ══════════════════════════════════════════════════════════════
+EXPORT_KINDS = ("loans", "fines", "history", "users")
+
+
+def _export_sql(c, kind):
+    """
+    SELECT for one export.  No ORDER BY: rows come in storage order, so
+    SQLite never sorts (or buffers) the whole set.  Fines and history
+    include the archive; user rows never carry the password hash.
+    """
+    if kind == "loans":
+        return """SELECT ib.issue_id, ib.book_id, b.title, ib.user_id, u.name AS user_name,
+                         u.email, ib.issue_date, ib.due_date
+                  FROM issued_books ib
+                  LEFT JOIN books b ON b.book_id=ib.book_id
+                  LEFT JOIN users u ON u.user_id=ib.user_id"""
+    if kind == "users":
+        return "SELECT user_id, name, email, role, created_at FROM users"
+    table = {"fines": "fines", "history": "reading_history"}[kind]
+    src = _source(c, table, True)
+    archived = "x.archived" if src.startswith("(") else "0"
+    if kind == "fines":
+        return f"""SELECT x.fine_id, x.user_id, u.name AS user_name, x.book_id, b.title,
+                          x.days_late, x.amount, x.settled, x.paid, x.created_at,
+                          {archived} AS archived
+                   FROM {src} x
+                   LEFT JOIN books b ON b.book_id=x.book_id
+                   LEFT JOIN users u ON u.user_id=x.user_id"""
+    return f"""SELECT x.history_id, x.user_id, u.name AS user_name, x.book_id, x.book_title,
+                      x.author, x.category, x.returned_at, x.days_kept, x.rating, x.review,
+                      {archived} AS archived
+               FROM {src} x LEFT JOIN users u ON u.user_id=x.user_id"""
+
+
+def count_export(kind):
+    c = _conn()
+    n = c.execute(f"SELECT COUNT(*) FROM ({_export_sql(c, kind)})").fetchone()[0]
+    c.close()
+    return n
+
+
+def iter_export(kind, chunk=1000):
+    """
+    Generator: the header tuple, then plain row tuples, pulled with
+    fetchmany(chunk) off one cursor — memory holds one chunk whatever the
+    row count.  The open cursor pins one WAL snapshot for the whole run:
+    the export is consistent, but checkpoints wait until it finishes.
+    """
+    c = _conn()
+    try:
+        cur = c.cursor()
+        cur.row_factory = None
+        cur.execute(_export_sql(c, kind))
+        yield tuple(d[0] for d in cur.description)
+        while rows := cur.fetchmany(chunk):
+            yield from rows
+    finally:
+        c.close()
+
+
+# ══════════════════════════════════════════════════════════════
+# STUDENT OVERVIEW — dashboard / profile in one snapshot
+# ══════════════════════════════════════════════════════════════
+def get_student_overview(user_id, limit=6, now=None) -> dict:
+    """
+    Every counter the student dashboard and profile show, plus the
+    newest `limit` rows of each list, read on ONE connection inside ONE
+    read transaction: a single WAL snapshot, so counts and lists agree.
+    Fine and reading-history counts include the archive when one exists.
+    """
+    c = _conn()
+    hist  = _source(c, "reading_history", True)     # ATTACH can't run inside BEGIN
+    fines = _source(c, "fines", True)
+    try:
+        c.execute("BEGIN")
+        counts = c.execute(f"""SELECT
+            (SELECT COUNT(*) FROM issued_books WHERE user_id=?1),
+            (SELECT COUNT(*) FROM {fines} WHERE user_id=?1),
+            (SELECT COALESCE((SELECT balance FROM fine_balances WHERE user_id=?1), 0)),
+            (SELECT COUNT(*) FROM {hist} WHERE user_id=?1),
+            (SELECT COUNT(*) FROM wishlist WHERE user_id=?1),
+            (SELECT COUNT(*) FROM notifications WHERE user_id=?1 AND is_read=0),
+            (SELECT COUNT(*) FROM holds WHERE user_id=?1)""", (user_id,)).fetchone()
+        out = dict(zip(("loans", "fines", "fine_total", "read", "wishlist", "unread", "holds"),
+                       counts))
+        out["recent_loans"] = _fetch(IssuedBook, f"""
+            SELECT ib.issue_id, ib.book_id, ib.user_id, ib.issue_date, ib.due_date,
+                   b.title, b.author, b.category, '', '', {_LOAN_DUE}
+            FROM issued_books ib JOIN books b ON ib.book_id=b.book_id
+            WHERE ib.user_id=?2 ORDER BY ib.due_ts LIMIT ?3""",
+            (now or int(time.time()), user_id, limit), c)
+        out["recent_fines"] = _fetch(Fine, f"""
+            SELECT f.fine_id, f.user_id, f.book_id, f.issue_id, f.days_late,
+                   f.amount, f.paid, f.created_at, COALESCE(b.title, {_GONE_TITLE}),
+                   COALESCE(f.settled, f.amount)
+            FROM {fines} f LEFT JOIN books b ON f.book_id=b.book_id
+            WHERE f.user_id=? ORDER BY f.created_ts DESC LIMIT ?""", (user_id, limit), c)
+        out["recent_reads"] = c.execute(f"""
+            SELECT * FROM {hist} WHERE user_id=? ORDER BY returned_ts DESC LIMIT ?""",
+            (user_id, limit)).fetchall()
+        out["recent_wishlist"] = c.execute("""
+            SELECT w.*, b.title, b.author, b.available_copies
+            FROM wishlist w JOIN books b ON w.book_id=b.book_id
+            WHERE w.user_id=? ORDER BY w.added_ts DESC LIMIT ?""", (user_id, limit)).fetchall()
+    finally:
+        c.rollback()                                 # read-only: just end the snapshot
+        c.close()
+    return out
+
+
+# ══════════════════════════════════════════════════════════════
+# ARCHIVE — cold rows in a second SQLite file
+# These tables only ever grow, and every per-user query walks them.
+# archive_cold_rows() moves rows past the cutoff into the archive file
+# (ATTACHed as `arc`) in bounded batches, each its own short write
+# transaction, so the hot file stays small and cache-resident and app
+# writes interleave between batches.  Readers see archived rows only
+# when they pass archived=True.
+# The policy keeps everything live code aggregates hot: unpaid fines,
+# pending requests, unread notifications, rated / reviewed history.
+# ══════════════════════════════════════════════════════════════
+ARCHIVE_PATH = os.environ.get("NEONLIB_ARCHIVE_PATH")   # None → <db>_archive.db
+
+# table → (primary key, epoch column, extra "row is cold" condition)
+ARCHIVE_POLICY = {
+    "reading_history": ("history_id", "returned_ts", "rating=0 AND review=''"),
+    "fines":           ("fine_id",    "created_ts",  "paid=1"),
+    "book_requests":   ("request_id", "updated_ts",  "status!='pending'"),
+    "notifications":   ("notif_id",   "created_ts",  "is_read=1"),
+}
+
+def archive_path():
+    return ARCHIVE_PATH or os.path.splitext(DB_PATH)[0] + "_archive.db"
+
+def _attach(c, create=False) -> bool:
+    path = archive_path()
+    if not create and not os.path.exists(path):
+        return False
+    if not any(r[1] == "arc" for r in c.execute("PRAGMA database_list")):
+        c.execute("ATTACH DATABASE ? AS arc", (path,))
+    return True
+
+def _source(c, table, archived):
+    """
+    FROM-clause for `table` on connection `c`: the hot table, or — when
+    archived=True and an archive exists — hot UNION ALL archived rows,
+    with an `archived` 0/1 column.
+    """
+    if not (archived and _attach(c)) or not c.execute(
+            "SELECT 1 FROM arc.sqlite_master WHERE type='table' AND name=?",
+            (table,)).fetchone():
+        return f"main.{table}"
+    cols = [r[1] for r in c.execute(f"PRAGMA main.table_info({table})")]
+    have = {r[1] for r in c.execute(f"PRAGMA arc.table_info({table})")}
+    hot = ",".join(f'"{col}"' for col in cols)
+    cold = ",".join(f'"{col}"' if col in have else f'NULL AS "{col}"' for col in cols)
+    return (f"(SELECT {hot}, 0 AS archived FROM main.{table} "      # archive not widened
+            f"UNION ALL SELECT {cold}, 1 FROM arc.{table})")         # yet: NULL-fill
+
+def _ensure_archive_table(c, table) -> str:
+    """Create / widen arc.<table> to match main (no foreign keys) → quoted column list."""
+    pk, ts, _ = ARCHIVE_POLICY[table]
+    main = c.execute(f"PRAGMA main.table_info({table})").fetchall()
+    have = {r[1] for r in c.execute(f"PRAGMA arc.table_info({table})")}
+    if not have:
+        defs = ", ".join(f'"{r[1]}" {r[2]}' + (" PRIMARY KEY" if r[1] == pk else "")
+                         for r in main)
+        c.execute(f"CREATE TABLE arc.{table} ({defs})")
+        c.execute(f"CREATE INDEX arc.idx_{table}_user ON {table}(user_id, {ts})")
+    for r in main:
+        if have and r[1] not in have:
+            c.execute(f'ALTER TABLE arc.{table} ADD COLUMN "{r[1]}" {r[2]}')
+    return ",".join(f'"{r[1]}"' for r in main)
+
+def archive_cold_rows(cutoff_ts, batch=500, tables=None) -> dict:
+    """
+    Move rows older than `cutoff_ts` (epoch secs) that the policy calls
+    cold into the archive, `batch` rows per transaction → {table: moved}.
+    With WAL a commit spanning two files is atomic per file only, so
+    each batch copies with INSERT OR IGNORE before it deletes: a crash
+    in between leaves a duplicate the next run cleans up, never a loss.
+    """
+    c = _conn()
+    c.isolation_level = None
+    _attach(c, create=True)
+    moved = {}
+    try:
+        for table in tables or ARCHIVE_POLICY:
+            pk, ts, cold = ARCHIVE_POLICY[table]
+            cols = _ensure_archive_table(c, table)
+            moved[table] = 0
+            while True:
+                c.execute("BEGIN IMMEDIATE")
+                ids = [r[0] for r in c.execute(
+                    f"SELECT {pk} FROM main.{table} WHERE {ts} < ? AND {cold} "
+                    f"ORDER BY {ts} LIMIT ?", (cutoff_ts, batch))]
+                if ids:
+                    marks = ",".join("?" * len(ids))
+                    c.execute(f"INSERT OR IGNORE INTO arc.{table} ({cols}) "
+                              f"SELECT {cols} FROM main.{table} WHERE {pk} IN ({marks})", ids)
+                    c.execute(f"DELETE FROM main.{table} WHERE {pk} IN ({marks})", ids)
+                c.execute("COMMIT")
+                moved[table] += len(ids)
+                if len(ids) < batch:
+                    break
+    finally:
+        if c.in_transaction:
+            c.execute("ROLLBACK")
+        c.close()
+    return moved
+
+def archive_counts() -> dict:
+    """{table: (hot rows, archived rows)}."""
+    c = _conn()
+    attached = _attach(c)
+    out = {}
+    for table in ARCHIVE_POLICY:
+        hot = c.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0]
+        cold = 0
+        if attached and c.execute("SELECT 1 FROM arc.sqlite_master WHERE name=?",
+                                  (table,)).fetchone():
+            cold = c.execute(f"SELECT COUNT(*) FROM arc.{table}").fetchone()[0]
+        out[table] = (hot, cold)
+    c.close()
+    return out
+
+
+# ══════════════════════════════════════════════════════════════
+# CHANGE-LOG QUERIES
+# ══════════════════════════════════════════════════════════════
+def last_change_seq():
+    c = _conn()
+    n = c.execute("SELECT COALESCE(MAX(seq),0) FROM change_log").fetchone()[0]
+    c.close()
+    return n
+
+def get_changes_since(tbl, seq):
+    """
+    Returns (ok, last_seq, row_ids) for changes to `tbl` after `seq`.
+    ok=False means older entries were pruned → caller must reload fully.
+    """
+    c = _conn()
+    first, last = c.execute(
+        "SELECT COALESCE(MIN(seq),0), COALESCE(MAX(seq),0) FROM change_log").fetchone()
+    if first > seq + 1 and seq < last:
+        c.close()
+        return False, last, []
+    rows = c.execute(
+        "SELECT DISTINCT row_id FROM change_log WHERE seq>? AND seq<=? AND tbl=?",
+        (seq, last, tbl)).fetchall()
+    c.close()
+    return True, last, [r[0] for r in rows]
+
+
+# ══════════════════════════════════════════════════════════════
+# ID RE-KEYING  (legacy uuid4 ids → time-ordered ids)
+# table → (primary key, creation timestamp, [(table, column) that reference it])
+# arc.* = the archived copies (ARCHIVE_POLICY); skipped while there are none.
+# ══════════════════════════════════════════════════════════════
+_ID_REFS = {
+    "users": ("user_id", "created_at", [
+        ("books", "added_by"), ("issued_books", "user_id"), ("fines", "user_id"),
+        ("book_requests", "user_id"), ("notifications", "user_id"),
+        ("reading_history", "user_id"), ("wishlist", "user_id"), ("holds", "user_id"),
+        ("events", "user_id"), ("fine_ledger", "user_id"), ("fine_balances", "user_id"),
+        ("arc.fines", "user_id"), ("arc.book_requests", "user_id"),
+        ("arc.notifications", "user_id"), ("arc.reading_history", "user_id")]),
+    "books": ("book_id", "added_at", [
+        ("issued_books", "book_id"), ("fines", "book_id"),
+        ("reading_history", "book_id"), ("wishlist", "book_id"), ("holds", "book_id"),
+        ("events", "book_id"), ("arc.fines", "book_id"), ("arc.reading_history", "book_id")]),
+}
+
+def get_id_timestamps(table):
+    key, ts, _ = _ID_REFS[table]
+    c = _conn()
+    rows = c.execute(f"SELECT {key}, {ts} FROM {table}").fetchall()
+    c.close()
+    return [tuple(r) for r in rows]
+
+def rekey_ids(table, mapping):
+    """
+    Rewrites primary keys old → new in `table` and in every column that
+    references them, archived rows included, in ONE transaction (FK
+    checks deferred to COMMIT).  The archive is a second file: with WAL
+    its commit is atomic per file, so run this with the app stopped.
+    Old keys are logged as deletions so in-memory snapshots drop them.
+    """
+    key, _, refs = _ID_REFS[table]
+    c = _conn()
+    try:
+        arc = set()
+        if _attach(c):                                  # ATTACH cannot run inside BEGIN
+            arc = {f"arc.{r[0]}" for r in c.execute(
+                "SELECT name FROM arc.sqlite_master WHERE type='table'")}
+        c.execute("BEGIN IMMEDIATE")
+        c.execute("PRAGMA defer_foreign_keys=ON")
+        c.execute("CREATE TEMP TABLE idmap (old TEXT PRIMARY KEY, new TEXT NOT NULL)")
+        c.executemany("INSERT INTO idmap VALUES (?,?)", mapping.items())
+        for tbl, col in [(table, key)] + refs:
+            if tbl.startswith("arc.") and tbl not in arc:
+                continue
+            c.execute(f"""UPDATE {tbl}
+                SET {col}=(SELECT new FROM idmap WHERE old={tbl.split(".")[-1]}.{col})
+                WHERE {col} IN (SELECT old FROM idmap)""")
+        c.execute(f"INSERT INTO change_log (tbl,row_id,op) SELECT '{table}', old, 'D' FROM idmap")
+        c.execute("DROP TABLE idmap")
+        c.commit()
+    except Exception:
+        c.rollback()
+        raise
+    finally:
+        c.close()
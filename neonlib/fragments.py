@@ -0,0 +1,97 @@
+"""
+fragments.py
+Layer : Presentation Cache (used by app.py only)
+Rule  : Pure Python.  No Streamlit, no database.
+        ONE process-wide LRU of rendered HTML fragments, shared by every
+        session and rerun (app.py itself is re-executed on each rerun, so
+        the cache has to live in an imported module).
+
+        Entry key     : (kind, entity id, theme)
+        Entry version : whatever the fragment shows — e.g. a book card's
+                        (title, copies, borrows, rating …).  A hit needs a
+                        matching version, so an edited row re-renders and
+                        replaces its old fragment in place.
+        Bounded by bytes: least-recently-used entries go first once the
+        rendered HTML held exceeds the cap.  Fragments are kept UTF-8
+        encoded — the cards are full of ★ / emoji, which would make a
+        str 4 bytes per character — and decoded on a hit (~1 µs/KB).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+MAX_BYTES = int(os.environ.get("NEONLIB_FRAGMENT_CACHE_MB", "16")) * 1024 * 1024
+_ENTRY_OVERHEAD = 200          # key tuple + OrderedDict slot, roughly
+
+
+class FragmentCache:
+    """
+    OrderedDict in recency order: key → (version, html, bytes).
+      get hit / miss : O(1)
+      eviction       : O(1) per entry dropped
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, version, build) -> str:
+        """Cached HTML for `key` at `version`, else build() and keep it."""
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None and e[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return e[1].decode()
+            self.misses += 1
+        html = build()                     # format outside the lock
+        data = html.encode()
+        size = len(data) + _ENTRY_OVERHEAD
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size <= self.max_bytes:
+                self._entries[key] = (version, data, size)
+                self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, n) = self._entries.popitem(last=False)
+                self._bytes -= n
+                self.evictions += 1
+        return html
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries":   len(self._entries),
+                    "bytes":     self._bytes,
+                    "max_bytes": self.max_bytes,
+                    "hits":      self.hits,
+                    "misses":    self.misses,
+                    "evictions": self.evictions,
+                    "hit_rate":  round(self.hits / total, 3) if total else 0.0}
+
+
+cache = FragmentCache()
+
+_static: dict = {}
+
+
+def static(key, build) -> str:
+    """
+    Build-once strings that cannot change while the process runs (the
+    per-theme stylesheets): kept outside the LRU, never evicted.
+    """
+    s = _static.get(key)
+    if s is None:
+        s = _static[key] = build()
+    return s
@@ -0,0 +1,103 @@
+"""
+migrate.py — Data migrations and maintenance jobs.
+Usage:   python3 migrate.py ids
+         python3 migrate.py archive [DAYS]
+         python3 migrate.py holds
+         python3 migrate.py export KIND [csv|jsonl] [PATH]
+
+  ids   Re-keys legacy USR-XXXXXX / BK-XXXXXX ids (6 hex chars of a uuid4)
+        to time-ordered ULID ids, back-dated to each row's creation time,
+        and rewrites every table that references them.  Other legacy ids
+        (ISS-, FIN-, NTF- …) are leaf keys nobody references; they stay
+        as they are and coexist with new ULID ids.  Rows already moved to
+        library_archive.db are re-keyed in the same transaction.
+        Logged-in users must sign in again afterwards.
+        Stop the app before running.
+
+  archive
+        Moves read notifications, paid fines, answered requests and
+        unrated reading history older than DAYS (default 365) into
+        library_archive.db.  Safe while the app runs; cron-able.
+
+  holds Expires holds not picked up within services.HOLD_PICKUP_DAYS
+        and hands each copy to the next student in line (or back to
+        the shelf).  Safe while the app runs; cron-able.
+
+  export
+        Streams loans | fines | history | users (fines / history include
+        the archive) to PATH, default exports/<kind>-<time>.<fmt> beside
+        the DB.  Memory stays flat at any row count.  Safe while the app
+        runs; cron-able.
+"""
+
+import sys, os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from datetime import datetime
+import database as db
+import services
+from utils import ulid, is_legacy_id
+
+PREFIX = {"users": "USR", "books": "BK"}
+
+
+def migrate_ids():
+    db.initialize_database()
+    for table, prefix in PREFIX.items():
+        mapping = {}
+        for old, ts in db.get_id_timestamps(table):
+            if not is_legacy_id(old):
+                continue
+            try:
+                at = datetime.fromisoformat(ts)
+            except (TypeError, ValueError):
+                at = None
+            mapping[old] = f"{prefix}-{ulid(at)}"
+        if mapping:
+            db.rekey_ids(table, mapping)
+        print(f"  ✓ {table}: {len(mapping)} legacy id(s) re-keyed")
+
+
+def archive(days):
+    db.initialize_database()
+    before = db.archive_counts()
+    moved = services.archive_cold_data(days)
+    for table, n in moved.items():
+        hot, cold = db.archive_counts()[table]
+        print(f"  ✓ {table}: {n} row(s) archived  ({before[table][0]} → {hot} hot, {cold} archived)")
+
+
+def sweep_holds():
+    db.initialize_database()
+    n = services.expire_holds()
+    left = db.count_holds()
+    print(f"  ✓ holds: {n} expired  ({left['ready']} ready, {left['waiting']} waiting)")
+
+
+def export(kind, fmt, path):
+    db.initialize_database()
+    path = path or services.export_path(kind, fmt)
+
+    def progress(done, total, rate):
+        print(f"\r  … {kind}: {done:,} / {total:,} rows  {rate:,.0f} rows/s", end="", flush=True)
+
+    r = services.export_to_file(kind, fmt, path, progress)
+    print("\r\033[K", end="")
+    print(f"  ✓ {kind}: {r['rows']:,} row(s), {r['bytes'] / 1048576:.1f} MB in {r['seconds']}s"
+          f"  ({r['rows_per_s']:,} rows/s) → {path}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args == ["ids"]:
+        migrate_ids()
+    elif args[:1] == ["archive"] and len(args) <= 2 and all(a.isdigit() for a in args[1:]):
+        archive(int(args[1]) if len(args) == 2 else services.ARCHIVE_AFTER_DAYS)
+    elif args == ["holds"]:
+        sweep_holds()
+    elif (args[:1] == ["export"] and 2 <= len(args) <= 4 and args[1] in services.EXPORT_KINDS
+          and (len(args) < 3 or args[2] in services.EXPORT_FORMATS)):
+        export(args[1], args[2] if len(args) > 2 else "csv", args[3] if len(args) > 3 else None)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -3,14 +3,41 @@ models.py
 Layer : Domain Model Layer
 Rule  : Pure Python dataclasses.  No DB calls.  No Streamlit.
         Defines the shape of every object the app passes around.
+
+        Every model is slotted (no per-instance __dict__) and its field
+        order matches the column order database.py SELECTs, so a cursor
+        row factory can build it straight from the tuple: Book(*row).
 """
 
 from dataclasses import dataclass
-from datetime import datetime
+import time
+
+
+class _RowAccess:
+    """
+    Lets a slotted model stand in wherever the UI used sqlite3.Row or a
+    dict:  m["title"],  m.get("x", default),  dict(m),  "title" in m.keys().
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
 
+    def keys(self) -> tuple:
+        return self.__slots__
 
-@dataclass
-class User:
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+@dataclass(slots=True)
+class User(_RowAccess):
     user_id:      str
     name:         str
     email:        str
@@ -46,8 +73,8 @@ class User:
         )
 
 
-@dataclass
-class Book:
+@dataclass(slots=True)
+class Book(_RowAccess):
     book_id:          str
     title:            str
     author:           str
@@ -76,20 +103,29 @@ class Book:
         )
 
 
-@dataclass
-class IssuedBook:
-    issue_id:     str
-    book_id:      str
-    user_id:      str
-    issue_date:   str
-    due_date:     str
-    title:        str = ""
-    author:       str = ""
+@dataclass(slots=True)
+class IssuedBook(_RowAccess):
+    issue_id:      str
+    book_id:       str
+    user_id:       str
+    issue_date:    str
+    due_date:      str
+    title:         str = ""
+    author:        str = ""
+    category:      str = ""
     borrower_name: str = ""
+    email:         str = ""
+    # computed in SQL from the epoch columns (database._LOAN_DUE)
+    days_left:     int = 0
+    is_overdue:    bool = False
+    fine:          float = 0.0
+    # issue_date / due_date stay as the display and API format; dropping
+    # them for smaller rows needs a table rebuild and is not done yet.
+    due_ts:        int = 0
 
     def days_overdue(self) -> int:
-        due = datetime.fromisoformat(self.due_date)
-        return max(0, (datetime.now() - due).days)
+        """Whole days past due_ts, floored like _LOAN_DUE — no date parsing."""
+        return max(0, (int(time.time()) - self.due_ts) // 86400)
 
     def fine_amount(self) -> float:
         return self.days_overdue() * 5.0
@@ -107,3 +143,48 @@ class IssuedBook:
             author        = row["author"]        if "author"        in keys else "",
             borrower_name = row["borrower_name"] if "borrower_name" in keys else "",
         )
+
+
+@dataclass(slots=True)
+class Fine(_RowAccess):
+    fine_id:    str
+    user_id:    str
+    book_id:    str
+    issue_id:   str
+    days_late:  int
+    amount:     float
+    paid:       int
+    created_at: str
+    title:      str = ""
+    settled:    float = 0.0      # paid / waived towards amount so far
+
+
+@dataclass(slots=True)
+class BookRequest(_RowAccess):
+    request_id: str
+    user_id:    str
+    user_name:  str
+    book_title: str
+    author:     str
+    reason:     str
+    status:     str
+    admin_note: str
+    created_at: str
+    updated_at: str
+
+    def is_pending(self) -> bool:
+        return self.status == "pending"
+
+
+def row_factory(cls):
+    """
+    sqlite3 row_factory that builds `cls` positionally from the raw
+    tuple — no sqlite3.Row, no dict, no per-column name lookup.
+    The query must SELECT columns in the model's field order.
+    """
+    return lambda _cursor, row: cls(*row)
+
+
+def columns(cls) -> str:
+    """'book_id,title,…' in field order, for the SELECT list."""
+    return ",".join(cls.__slots__)
@@ -5,19 +5,37 @@ Rule  : All domain rules live here.
         May call database.py and utils.py.
         Must NOT import streamlit.
         UI layer calls these functions and renders the results.
+
+        Services that read-then-write several tables are
+        @db.transaction: one queued write op, so the checks and the
+        writes are atomic and a lock conflict with another process
+        retries the whole service call.
 """
 
+import io
+import os
+import csv
+import json
+import math
+import time
+import threading
 from datetime import datetime
 import database as db
+from catalog import snapshot as catalog
 from utils import (
     gen_book_id, gen_issue_id, gen_fine_id,
-    gen_request_id, gen_notif_id, gen_hist_id, gen_wish_id,
-    now_iso, due_iso,
-    linear_search_books, linear_search_users,
-    get_unique_authors, get_unique_categories,
-    get_top_n_books,
+    gen_request_id, gen_notif_id, gen_hist_id, gen_wish_id, gen_hold_id,
+    now_iso, now_ts, due_iso,
+    TrigramIndex,
 )
 
+_BULK_CHUNK = 500          # ids per IN (…) lookup, well under SQLite's variable limit
+
+
+def _chunks(ids):
+    for i in range(0, len(ids), _BULK_CHUNK):
+        yield ids[i:i + _BULK_CHUNK]
+
 
 # ══════════════════════════════════════════════════════════════
 # BOOK SERVICES
@@ -34,49 +52,198 @@ def add_book(title, author, category, total_copies, added_by) -> tuple[bool, str
     return True, f"'{title}' added. ID: {bid}"
 
 
+@db.transaction
 def remove_book(book_id) -> tuple[bool, str]:
     book = db.get_book_by_id(book_id)
     if not book:
         return False, "Book not found."
-    for row in db.get_all_issued_books():
-        if row["book_id"] == book_id:
-            return False, "Cannot delete: book has active loans."
+    if db.has_active_loan(book_id):
+        return False, "Cannot delete: book has active loans."
+    db.delete_holds_for_books([book_id])
+    db.delete_wishlist_for_books([book_id])
     db.delete_book(book_id)
     return True, f"'{book['title']}' deleted."
 
 
-def all_books_as_dicts() -> list:
-    return [dict(r) for r in db.get_all_books()]
+@db.transaction
+def withdraw_books(book_ids) -> tuple[bool, str, list]:
+    """
+    Weeding: delete many books, with their holds and wishlist rows, in ONE
+    transaction.  Books still on loan are kept and returned as `blocked`;
+    unknown ids are counted.  Their fines stay, listed as "(withdrawn)".
+    → (ok, message, blocked_ids)
+    """
+    ids = list(dict.fromkeys(b.strip().upper() for b in book_ids if b.strip()))
+    if not ids:
+        return False, "No book IDs given.", []
+    blocked = set()
+    for chunk in _chunks(ids):
+        blocked |= db.get_books_on_loan(chunk)
+    gone = [b for b in ids if b not in blocked]
+    db.delete_holds_for_books(gone)
+    db.delete_wishlist_for_books(gone)
+    removed = db.delete_books(gone)
+    missing = len(ids) - len(blocked) - removed
+    msg = (f"{removed} book(s) withdrawn."
+           + (f" {len(blocked)} blocked by active loans." if blocked else "")
+           + (f" {missing} not found." if missing else ""))
+    return removed > 0, msg, sorted(blocked)
+
+
+def all_books() -> list:
+    """Book objects served from the shared catalogue snapshot, not a table scan."""
+    catalog.refresh()
+    return catalog.rows()
+
+
+def search_books(query: str, limit: int = 50) -> list:
+    """
+    Typo-tolerant search over title / author / category via the shared
+    trigram index.  Best matches first.
+    """
+    if not query or not query.strip():
+        return all_books()
+    return _index_search("books", query, limit)
+
+
+# sort label → (snapshot column, largest first); None = newest first
+BOOK_SORTS = {
+    "Default":         (None,               True),
+    "Most Borrowed":   ("borrow_count",     True),
+    "A–Z":             ("title",            False),
+    "Available First": ("available_copies", True),
+}
+SEARCH_HITS = 500          # best trigram matches a paged search can reach
+
+
+def catalog_page(query: str = "", sort: str = "Default",
+                 page: int = 0, size: int = 24) -> tuple[list, int]:
+    """
+    One page of the catalogue grid → (books, total matching).
+    Browsing heap-selects the page off the snapshot (O(n log k), only
+    `size` Book objects built); a search ranks its top SEARCH_HITS
+    matches, then sorts and slices those.
+    """
+    col, desc = BOOK_SORTS[sort]
+    start = page * size
+    if not (query and query.strip()):
+        catalog.refresh()
+        return catalog.page(col, desc, start, size), len(catalog)
+    hits = _index_search("books", query, SEARCH_HITS)
+    if col == "title":
+        hits = sorted(hits, key=lambda b: b.title.lower(), reverse=desc)
+    elif col:
+        hits = sorted(hits, key=lambda b: b[col], reverse=desc)
+    return hits[start:start + size], len(hits)
+
+
+def catalog_page_extras(user_id: str, books) -> tuple[dict, set]:
+    """Avg ratings and the user's wishlisted ids for one page — 2 queries, not 2 per card."""
+    ids = [b.book_id for b in books]
+    if not ids:
+        return {}, set()
+    return db.get_avg_ratings(ids), db.get_wishlisted(user_id, ids)
+
+
+def books_page(after=None, limit: int = 20) -> tuple[list, tuple | None]:
+    """
+    Keyset-paginated catalogue, newest first.
+    Returns (books, next_key); next_key is None on the last page.
+    """
+    rows = db.get_books_page(after, limit + 1)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1].added_at, rows[-1].book_id)
+
+
+def get_book(book_id):
+    catalog.refresh()
+    return catalog.get(book_id)
 
 
-def search_books(query: str) -> list:
-    """Linear search O(n) via utils.py."""
-    return linear_search_books(all_books_as_dicts(), query)
+def book_availability(book_id) -> dict | None:
+    catalog.refresh()
+    b = catalog.get(book_id)
+    if b is None:
+        return None
+    return {"book_id": b.book_id, "available": b.available_copies > 0,
+            "available_copies": b.available_copies, "total_copies": b.total_copies}
 
 
-def all_users_as_dicts() -> list:
-    return [dict(r) for r in db.get_all_users()]
+def available_books(limit: int = 8) -> list:
+    """Newest titles with a copy on the shelf (partial index, not a catalogue scan)."""
+    return db.get_available_books(limit)
 
 
-def search_users(query: str) -> list:
-    return linear_search_users(all_users_as_dicts(), query)
+SUGGEST_LIMIT = 8
+
+
+def suggest_books(text: str, limit: int = SUGGEST_LIMIT) -> list:
+    """
+    Typeahead for book pickers.  An id prefix ("BK-01J…") is a range seek
+    on the primary key; when that finds fewer than `limit`, the trigram
+    index over title / author tops it up.  → Book list, id matches first.
+    """
+    return _suggest("books", db.get_books_by_id_prefix, text, limit)
+
+
+def suggest_users(text: str, limit: int = SUGGEST_LIMIT) -> list:
+    """Same for user pickers: id prefix, then name / email matches."""
+    return _suggest("users", db.get_users_by_id_prefix, text, limit)
+
+
+def _suggest(tbl, by_prefix, text, limit):
+    text = (text or "").strip()
+    if not text:
+        return []
+    rows = by_prefix(text.upper(), limit)
+    if len(rows) < limit:
+        key = _INDEXES[tbl][0]
+        seen = {r[key] for r in rows}
+        rows += [r for r in _index_search(tbl, text, limit) if r[key] not in seen][:limit - len(rows)]
+    return rows
+
+
+def all_users() -> list:
+    return db.get_all_users()
+
+
+def user_counts(user_ids) -> dict:
+    """{user_id: (loans, books read incl. archived, fine owed)}, batched — no rows loaded."""
+    out = {}
+    for chunk in _chunks(list(user_ids)):
+        out.update(db.get_user_counts(chunk))
+    return out
+
+
+def search_users(query: str, limit: int = 50) -> list:
+    """Same trigram index, over user name + email."""
+    if not query or not query.strip():
+        return all_users()
+    return _index_search("users", query, limit)
 
 
 def library_stats() -> dict:
     """
-    Builds the admin dashboard metrics.
-    Uses SET for unique counts (O(n) build / O(1) membership).
-    Uses SORT for top books O(n log n).
+    Builds the admin dashboard metrics from the catalogue snapshot.
+    Uses SET over single columns for unique counts (O(n), no row objects).
+    Uses a HEAP for top books O(n log k).
     """
-    books = all_books_as_dicts()
+    catalog.refresh()
+    authors = set(catalog.column("author"))
     return {
-        "total_books":        db.count_books(),
+        "total_books":        len(catalog),
         "total_users":        db.count_users(),
         "total_issued":       db.count_issued(),
-        "unique_authors":     len(get_unique_authors(books)),
-        "unique_categories":  len(get_unique_categories(books)),
-        "top_books":          get_top_n_books(books, 3),
-        "authors_set":        get_unique_authors(books),
+        "total_overdue":      db.count_overdue(),
+        "unique_authors":     len(authors),
+        "unique_categories":  len(set(catalog.column("category"))),
+        "top_books":          catalog.top("borrow_count", 3),
+        "authors_set":        authors,
+        "catalog":            catalog.footprint(),
+        "writer":             db.writer_stats(),
+        "holds":              hold_counts(),
     }
 
 
@@ -88,67 +255,414 @@ def issue_book(book_id: str, user_id: str) -> tuple[bool, str]:
     """
     Rules:
       1. Book must exist.
-      2. At least one copy must be available.
-      3. User must not already have this book issued.
+      2. User must exist.
+      3. At least one copy must be available — or one is set aside
+         on the hold shelf for this user.
+      4. User must not already have this book issued.
+    """
+    r = issue_books([(book_id, user_id)])[0]
+    return r["ok"], r["message"]
+
+
+def return_book(book_id: str, user_id: str) -> tuple[bool, str, float]:
+    """
+    Rules:
+      1. Active issue record must exist for (book_id, user_id).
+      2. Calculate fine = days_late × ₹5.
+      3. Record reading history, delete issue, save fine.
+      4. The copy goes to the next hold in line, else back on the shelf.
+    """
+    r = return_books([(book_id, user_id)])[0]
+    return r["ok"], r["message"], r["fine"]
+
+
+@db.transaction
+def issue_books(pairs) -> list[dict]:
+    """
+    Desk mode: issue many (book_id, user_id) pairs in ONE transaction.
+    The issue_book rules are checked set-wise — one lookup each for the
+    books, the users and the loans they already hold — then every table
+    gets one executemany.  Pairs are taken in order, so later ones see
+    the copies earlier ones used up.  A copy set aside on the hold shelf
+    goes only to its holder, and any hold of a borrower is closed.
+    → one {book_id, user_id, ok, message} per pair, in input order.
+    """
+    pairs = [(b.strip().upper(), u.strip()) for b, u in pairs]
+    books, users, held, ready = {}, set(), set(), set()
+    for chunk in _chunks(list({b for b, _ in pairs})):
+        books.update((b.book_id, b) for b in db.get_books_by_ids(chunk))
+        held.update((l["book_id"], l["user_id"]) for l in db.get_loans_for_books(chunk))
+        ready |= db.get_ready_holds(chunk)
+    for chunk in _chunks(list({u for _, u in pairs})):
+        users.update(u.user_id for u in db.get_users_by_ids(chunk))
+
+    left = {b: book.available_copies for b, book in books.items()}
+    issue_dt = now_iso()
+    due_dt   = due_iso(7)         # 7-day loan
+    results, loans, notes = [], [], []
+    borrowed = {}
+    for book_id, user_id in pairs:
+        book = books.get(book_id)
+        if not book:
+            msg = "Book not found. Check the Book ID."
+        elif user_id not in users:
+            msg = "User not found. Check the User ID."
+        elif left[book_id] < 1 and (book_id, user_id) not in ready:
+            msg = f"'{book.title}' is fully issued. No copies available."
+        elif (book_id, user_id) in held:
+            msg = "You already have this book issued."
+        else:
+            if (book_id, user_id) in ready:     # picked up from the hold shelf
+                ready.discard((book_id, user_id))
+            else:
+                left[book_id] -= 1
+            borrowed[book_id] = borrowed.get(book_id, 0) + 1
+            held.add((book_id, user_id))
+            loans.append((gen_issue_id(), book_id, user_id, issue_dt, due_dt))
+            notes.append((gen_notif_id(), user_id,
+                          f"📚 '{book.title}' issued. Due: {due_dt[:10]}", "info", issue_dt))
+            results.append({"book_id": book_id, "user_id": user_id, "ok": True,
+                            "message": f"'{book.title}' issued! Due: {due_dt[:10]}"})
+            continue
+        results.append({"book_id": book_id, "user_id": user_id, "ok": False, "message": msg})
+
+    if loans:
+        db.insert_issued_books(loans)
+        db.adjust_books_availability({b: left[b] - books[b].available_copies for b in left},
+                                     borrowed)
+        db.delete_holds_for([(l[1], l[2]) for l in loans])
+        db.insert_notifications(notes)
+    return results
+
+
+@db.transaction
+def return_books(pairs) -> list[dict]:
+    """
+    Desk mode: return many (book_id, user_id) pairs in ONE transaction.
+    One lookup for the loans (late / kept days computed in SQL), then
+    one executemany each for history, loans, copies, fines, notifications;
+    each fine is also charged to the borrower's ledger.
+    Returned copies serve the books' hold queues before the shelf, and
+    a book back on the shelf alerts its wishlisters.
+    → one {book_id, user_id, ok, message, fine} per pair, in input order.
+    """
+    pairs = [(b.strip().upper(), u.strip()) for b, u in pairs]
+    books, loans = {}, {}
+    for chunk in _chunks(list({b for b, _ in pairs})):
+        books.update((b.book_id, b) for b in db.get_books_by_ids(chunk))
+        loans.update(((l["book_id"], l["user_id"]), l) for l in db.get_loans_for_books(chunk))
+
+    ts = now_iso()
+    results, history, closed, fines, notes = [], [], [], [], []
+    back = {}
+    for book_id, user_id in pairs:
+        issue = loans.pop((book_id, user_id), None)
+        if not issue:
+            results.append({"book_id": book_id, "user_id": user_id, "ok": False, "fine": 0.0,
+                            "message": "No active loan found for this book under your account."})
+            continue
+        book      = books[book_id]
+        days_late = issue["days_late"]          # computed in SQL from due_ts
+        fine      = days_late * 5.0
+        history.append((gen_hist_id(), user_id, book_id, book.title, book.author,
+                        book.category, ts, issue["days_kept"]))
+        closed.append(issue["issue_id"])
+        back[book_id] = back.get(book_id, 0) + 1
+        if days_late > 0:
+            fines.append((gen_fine_id(), user_id, book_id, issue["issue_id"], days_late, fine, ts))
+            msg = f"'{book.title}' returned. ⚠️ {days_late} day(s) late — fine ₹{fine:.0f}"
+            notes.append((gen_notif_id(), user_id, f"⚠️ {msg}", "warning", ts))
+        else:
+            msg = f"'{book.title}' returned on time! No fine."
+            notes.append((gen_notif_id(), user_id, f"✅ {msg}", "success", ts))
+        results.append({"book_id": book_id, "user_id": user_id, "ok": True,
+                        "message": msg, "fine": fine})
+
+    if closed:
+        db.insert_reading_histories(history)   # history before the loan goes
+        db.delete_issue_records(closed)
+        _restock(back, ts, notes, skip={(r["user_id"], r["book_id"]) for r in results if r["ok"]})
+        if fines:
+            db.insert_fines(fines)
+            _post([(f[1], f[0], "charge", f[5], f"{f[4]} day(s) late") for f in fines],
+                  "system", ts)
+        db.insert_notifications(notes)
+    return results
+
+
+# ══════════════════════════════════════════════════════════════
+# HOLD SERVICES
+# A fully issued book can be held.  Each returned copy goes to the
+# front of its queue instead of the shelf; the holder is notified and
+# has HOLD_PICKUP_DAYS to borrow it before expire_holds() passes it on.
+# ══════════════════════════════════════════════════════════════
+
+HOLD_PICKUP_DAYS = 3
+
+
+@db.transaction
+def place_hold(book_id: str, user_id: str) -> tuple[bool, str]:
+    """
+    Rules:
+      1. Book must exist and have no copy on the shelf.
+      2. User must not already have it issued or held.
     """
     book = db.get_book_by_id(book_id)
     if not book:
-        return False, "Book not found. Check the Book ID."
-    if book["available_copies"] < 1:
-        return False, f"'{book['title']}' is fully issued. No copies available."
+        return False, "Book not found."
+    if book.available_copies > 0:
+        return False, f"'{book.title}' is on the shelf — borrow it now."
     if db.get_issue_record(book_id, user_id):
         return False, "You already have this book issued."
+    if db.get_hold(book_id, user_id):
+        return False, "You already hold a place for this book."
+    db.insert_hold(gen_hold_id(), book_id, user_id, now_iso())
+    place = db.get_hold(book_id, user_id)["ahead"] + 1
+    return True, f"Hold placed on '{book.title}'. You are #{place} in line."
 
-    issue_id  = gen_issue_id()
-    issue_dt  = now_iso()
-    due_dt    = due_iso(7)        # 7-day loan
 
-    db.update_book_availability(book_id, delta=-1)
-    db.insert_issued_book(issue_id, book_id, user_id, issue_dt, due_dt)
+@db.transaction
+def cancel_hold(book_id: str, user_id: str) -> tuple[bool, str]:
+    """A cancelled 'ready' hold hands its copy to the next in line."""
+    hold = db.get_hold(book_id, user_id)
+    if not hold:
+        return False, "No hold found for this book."
+    db.delete_holds([hold["hold_id"]])
+    if hold["status"] == "ready":
+        notes = []
+        _restock({book_id: 1}, now_iso(), notes)
+        db.insert_notifications(notes)
+    return True, "Hold cancelled."
 
-    _notify(user_id,
-            f"📚 '{book['title']}' issued. Due: {due_dt[:10]}", "info")
-    return True, f"'{book['title']}' issued! Due: {due_dt[:10]}"
 
+def student_holds(user_id: str) -> list:
+    """Holds with status, pickup deadline and `ahead` (waiting holds in front)."""
+    return db.get_holds_by_user(user_id)
 
-def return_book(book_id: str, user_id: str) -> tuple[bool, str, float]:
+
+def hold_counts() -> dict:
+    """{'waiting': n, 'ready': n} — one GROUP BY over holds."""
+    return db.count_holds()
+
+
+def expire_holds(batch: int = 500) -> int:
     """
-    Rules:
-      1. Active issue record must exist for (book_id, user_id).
-      2. Calculate fine = days_late × ₹5.
-      3. Record reading history, delete issue, restore copy, save fine.
+    Sweeper: drop 'ready' holds whose pickup deadline has passed and
+    pass their copies on, `batch` holds per short transaction.
+    → number of holds expired.  Cron-able (migrate.py holds).
     """
-    issue = db.get_issue_record(book_id, user_id)
-    if not issue:
-        return False, "No active loan found for this book under your account.", 0.0
+    total = 0
+    while True:
+        n = _expire_hold_batch(batch)
+        total += n
+        if n < batch:
+            return total
 
-    due_dt   = datetime.fromisoformat(issue["due_date"])
-    days_late = max(0, (datetime.now() - due_dt).days)
-    fine      = days_late * 5.0
 
-    # record history before deleting issue
-    book = db.get_book_by_id(book_id)
-    issued_dt = datetime.fromisoformat(issue["issue_date"])
-    days_kept = max(1, (datetime.now() - issued_dt).days)
-    db.insert_reading_history(
-        gen_hist_id(), user_id, book_id,
-        book["title"], book["author"], book["category"],
-        now_iso(), days_kept)
-
-    db.delete_issue_record(issue["issue_id"])
-    db.update_book_availability(book_id, delta=+1)
-
-    if days_late > 0:
-        db.insert_fine(gen_fine_id(), user_id, book_id,
-                       issue["issue_id"], days_late, fine, now_iso())
-        msg = (f"'{book['title']}' returned. "
-               f"⚠️ {days_late} day(s) late — fine ₹{fine:.0f}")
-        _notify(user_id, f"⚠️ {msg}", "warning")
-    else:
-        msg = f"'{book['title']}' returned on time! No fine."
-        _notify(user_id, f"✅ {msg}", "success")
+@db.transaction
+def _expire_hold_batch(batch: int) -> int:
+    rows = db.get_expired_holds(now_ts(), batch)
+    if not rows:
+        return 0
+    ts, notes, freed = now_iso(), [], {}
+    for h in rows:
+        freed[h["book_id"]] = freed.get(h["book_id"], 0) + 1
+        notes.append((gen_notif_id(), h["user_id"],
+                      f"⌛ Your hold on '{h['title']}' expired — it was not picked up in time.",
+                      "warning", ts))
+    db.delete_holds([h["hold_id"] for h in rows])
+    _restock(freed, ts, notes)
+    db.insert_notifications(notes)
+    return len(rows)
+
+
+def _restock(copies: dict, ts: str, notes: list, skip=()) -> None:
+    """
+    Freed copies ({book_id: n}) go to the hold queues first, the rest
+    back on the shelf.  Books back from zero alert their wishlisters.
+    Call inside a @db.transaction; the caller inserts `notes`.
+    """
+    shelf = {b: n for b, n in _allocate_copies(copies, ts, notes).items() if n > 0}
+    if not shelf:
+        return
+    was_out = {b.book_id for chunk in _chunks(list(shelf))
+               for b in db.get_books_by_ids(chunk) if b.available_copies == 0}
+    db.adjust_books_availability(shelf)
+    if was_out:
+        _alert_wishlisters(was_out, ts, notes, skip)
+
+
+def _allocate_copies(copies: dict, ts: str, notes: list) -> dict:
+    """
+    Give freed copies ({book_id: n}) to the front of each book's hold
+    queue — one index seek per book — and queue a notice per holder.
+    Call inside a @db.transaction.  → copies left for the shelf.
+    """
+    nxt = db.get_next_holds(copies)
+    if not nxt:
+        return copies
+    shelf, pickup_by = dict(copies), due_iso(HOLD_PICKUP_DAYS)
+    for h in nxt:
+        shelf[h["book_id"]] -= 1
+        notes.append((gen_notif_id(), h["user_id"],
+                      f"🔔 '{h['title']}' is waiting for you. Pick it up by {pickup_by[:10]}.",
+                      "success", ts))
+    db.mark_holds_ready([h["hold_id"] for h in nxt], pickup_by)
+    return shelf
+
+
+# ══════════════════════════════════════════════════════════════
+# WISHLIST ALERTS
+# A book coming back on the shelf tells everyone who wishlisted it:
+# one index range per book, ONE notice per user however many of their
+# books came back, and nobody is told about the same book twice
+# within WISHLIST_ALERT_HOURS.
+# ══════════════════════════════════════════════════════════════
+
+WISHLIST_ALERT_HOURS = 24
+
+
+def _alert_wishlisters(book_ids, ts: str, notes: list, skip=()) -> None:
+    """Queue alerts into `notes`; `skip` = (user_id, book_id) pairs not to tell."""
+    now = now_ts()
+    per_user = {}
+    for chunk in _chunks(list(book_ids)):
+        for r in db.get_wishlisters(chunk, now - WISHLIST_ALERT_HOURS * 3600):
+            if (r["user_id"], r["book_id"]) not in skip:
+                per_user.setdefault(r["user_id"], []).append((r["book_id"], r["title"]))
+    if not per_user:
+        return
+    for user_id, items in per_user.items():
+        titles = ", ".join(f"'{t}'" for _, t in items)
+        notes.append((gen_notif_id(), user_id,
+                      f"♥ Back on the shelf from your wishlist: {titles}", "info", ts))
+    db.mark_wishlist_alerted([(u, b) for u, items in per_user.items() for b, _ in items], now)
+
+
+# ══════════════════════════════════════════════════════════════
+# FINE LEDGER
+# Every charge, payment and waiver is a signed ledger row carrying the
+# user's balance after it; fine_balances holds the current balance, so
+# "what does this user owe" is one primary-key read, never a SUM.
+# Money settles the user's oldest open fines first (fines.settled),
+# and a fine it covers is marked paid — and so becomes archivable.
+# ══════════════════════════════════════════════════════════════
+
+def _post(entries, by: str, ts: str) -> dict:
+    """
+    entries = [(user_id, fine_id, kind, signed amount, note), …] in order.
+    Appends them with running balances inside the caller's transaction
+    → {user_id: balance after their last entry}.
+    """
+    users = list({e[0] for e in entries})
+    bal = {}
+    for chunk in _chunks(users):
+        bal.update(db.get_fine_balances(chunk))
+    rows = []
+    for user_id, fine_id, kind, amount, note in entries:
+        bal[user_id] = round(bal.get(user_id, 0.0) + amount, 2)
+        rows.append((user_id, fine_id, kind, round(amount, 2), bal[user_id], note, by, ts))
+    db.post_ledger_entries(rows, {u: bal[u] for u in users})
+    return bal
+
+
+@db.transaction
+def settle_payments(payments, received_by: str, note: str = "") -> list[dict]:
+    """
+    Desk mode: post a day's fine payments — (user_id, amount) pairs — in
+    ONE transaction.  One read each for the balances and the open fines,
+    then one executemany each for ledger rows, balances, fines, notices.
+    A payment that is not a finite number, not positive, or more than is
+    still owed is refused on its own line (amount None when unreadable);
+    the rest settle each user's oldest fines first.
+    → one {user_id, amount, ok, message, balance} per payment, in input order.
+    """
+    payments = [(u.strip(), payment_amount(a)) for u, a in payments]
+    users = list({u for u, _ in payments})
+    owed, open_fines = {}, {}
+    for chunk in _chunks(users):
+        owed.update(db.get_fine_balances(chunk))
+        for f in db.get_unpaid_fines(chunk):
+            open_fines.setdefault(f["user_id"], []).append([f["fine_id"], f["amount"], f["settled"]])
+
+    ts = now_iso()
+    results, entries, settled, notes = [], [], {}, []
+    for user_id, amount in payments:
+        due = owed.get(user_id, 0.0)
+        if amount is None or amount <= 0 or amount > due + 0.005:
+            msg = ("Amount must be a number." if amount is None else
+                   "Amount must be more than zero." if amount <= 0 else
+                   f"Only ₹{due:.2f} is owed." if due > 0 else "Nothing is owed.")
+            results.append({"user_id": user_id, "amount": amount, "ok": False,
+                            "message": msg, "balance": due})
+            continue
+        left = amount
+        for f in open_fines.get(user_id, []):       # oldest first
+            take = min(left, round(f[1] - f[2], 2))
+            if take <= 0:
+                continue
+            f[2] = settled[f[0]] = round(f[2] + take, 2)
+            left = round(left - take, 2)
+            if left <= 0:
+                break
+        owed[user_id] = round(due - amount, 2)
+        entries.append((user_id, None, "payment", -amount, note))
+        msg = f"Payment of ₹{amount:.2f} received — balance ₹{owed[user_id]:.2f}"
+        notes.append((gen_notif_id(), user_id, f"💸 {msg}", "success", ts))
+        results.append({"user_id": user_id, "amount": amount, "ok": True,
+                        "message": msg, "balance": owed[user_id]})
+
+    if entries:
+        _post(entries, received_by, ts)
+        db.settle_fines([(v, k) for k, v in settled.items()])
+        db.insert_notifications(notes)
+    return results
+
+
+def payment_amount(value) -> float | None:
+    """A payment amount rounded to paise, or None unless a finite number."""
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        return None
+    return round(amount, 2) if math.isfinite(amount) else None
+
+
+def pay_fine(user_id: str, amount: float, received_by: str, note: str = "") -> tuple[bool, str]:
+    r = settle_payments([(user_id, amount)], received_by, note)[0]
+    return r["ok"], r["message"]
+
+
+@db.transaction
+def waive_fine(fine_id: str, admin_name: str, note: str = "") -> tuple[bool, str]:
+    """Write off what is left of one fine: a waiver entry, and the fine is paid."""
+    f = db.get_fine(fine_id.strip().upper())
+    if not f:
+        return False, "Fine not found."
+    rest = round(f["amount"] - f["settled"], 2)
+    if f["paid"] or rest <= 0:
+        return False, "Fine is already settled."
+    ts  = now_iso()
+    bal = _post([(f["user_id"], f["fine_id"], "waiver", -rest, note)], admin_name, ts)
+    db.settle_fines([(f["amount"], f["fine_id"])])
+    db.insert_notifications([(gen_notif_id(), f["user_id"],
+                              f"💸 ₹{rest:.2f} of fine {f['fine_id']} waived — "
+                              f"balance ₹{bal[f['user_id']]:.2f}", "info", ts)])
+    return True, f"₹{rest:.2f} waived — {f['user_id']} now owes ₹{bal[f['user_id']]:.2f}."
 
-    return True, msg, fine
+
+def fine_balance(user_id: str) -> float:
+    """What the user owes now: one primary-key read."""
+    return db.get_total_fine_by_user(user_id)
+
+
+def fine_ledger(user_id: str, after=None, limit: int = 20) -> tuple[list, int | None]:
+    """Keyset-paginated ledger, newest first, with running balances → (entries, next_key)."""
+    rows = db.get_ledger_page(user_id, after, limit + 1)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1]["seq"]
 
 
 # ══════════════════════════════════════════════════════════════
@@ -156,29 +670,51 @@ def return_book(book_id: str, user_id: str) -> tuple[bool, str, float]:
 # ══════════════════════════════════════════════════════════════
 
 def student_issued_books(user_id: str) -> list:
-    rows = db.get_issued_books_by_user(user_id)
-    result = []
-    for row in rows:
-        item = dict(row)
-        due = datetime.fromisoformat(item["due_date"])
-        days_left = (due - datetime.now()).days
-        item["days_left"]  = days_left
-        item["is_overdue"] = days_left < 0
-        item["fine"]       = abs(days_left) * 5 if days_left < 0 else 0
-        result.append(item)
-    return result
-
-
-def student_fines(user_id: str) -> tuple[list, float]:
-    rows  = db.get_fines_by_user(user_id)
+    """Active loans; days_left / is_overdue / fine come straight from SQL."""
+    return db.get_issued_books_by_user(user_id)
+
+
+def student_fines(user_id: str, archived: bool = False) -> tuple[list, float]:
+    """Total is the ledger balance — what is still owed, one primary-key read."""
+    rows  = db.get_fines_by_user(user_id, archived)
     total = db.get_total_fine_by_user(user_id)
-    return [dict(r) for r in rows], total
+    return rows, total
+
+
+def reading_history(user_id: str, archived: bool = False) -> list:
+    return db.get_reading_history(user_id, archived)
+
+
+def student_requests(user_id: str, archived: bool = False) -> list:
+    return db.get_requests_by_user(user_id, archived)
+
+
+OVERVIEW_ITEMS = 6         # rows of each list the dashboard / profile show
+
+
+def student_overview(user_id: str) -> dict:
+    """
+    Counters (loans, fines, fine_total, read, wishlist, unread, holds) and
+    the newest OVERVIEW_ITEMS loans / fines / reads / wishlist rows, from
+    one read transaction.  `version` is the data_version it was read at:
+    the overview stays current while data_version() still returns it.
+    """
+    version = db.data_version()                # before the read: never newer than the data
+    out = db.get_student_overview(user_id, OVERVIEW_ITEMS)
+    out.update(user_id=user_id, version=version)
+    return out
+
+
+def data_version() -> int:
+    """Moves on whenever any connection commits — one PRAGMA, no table read."""
+    return db.data_version()
 
 
 # ══════════════════════════════════════════════════════════════
 # BOOK-REQUEST SERVICES
 # ══════════════════════════════════════════════════════════════
 
+@db.transaction
 def submit_request(user_id, user_name, book_title, author, reason) -> tuple[bool, str]:
     if not book_title.strip():
         return False, "Book title is required."
@@ -193,24 +729,103 @@ def submit_request(user_id, user_name, book_title, author, reason) -> tuple[bool
     return True, f"Request submitted! Admin will review '{book_title}'."
 
 
+@db.transaction
 def respond_to_request(req_id, status, note, admin_name) -> tuple[bool, str]:
-    all_r = db.get_all_requests()
-    req   = next((dict(r) for r in all_r if r["request_id"] == req_id), None)
+    req = db.get_request_by_id(req_id)
     if not req:
         return False, "Request not found."
     db.update_request_status(req_id, status, note, now_iso())
+    _notify(req["user_id"], *_request_notice(req, status, note))
+    return True, f"Request {status} and student notified."
+
+
+@db.transaction
+def respond_to_requests(req_ids, status, note, admin_name) -> tuple[bool, str]:
+    """
+    Approve / reject many requests in ONE transaction: chunked id
+    lookups, one executemany UPDATE, one executemany for every student
+    notification.  Requests no longer pending are skipped.
+    """
+    if status not in ("approved", "rejected"):
+        return False, "Status must be 'approved' or 'rejected'."
+    req_ids = list(dict.fromkeys(req_ids))
+    pending = []
+    for chunk in _chunks(req_ids):
+        pending += [r for r in db.get_requests_by_ids(chunk) if r.is_pending()]
+    if not pending:
+        return False, "No pending requests selected."
+    ts = now_iso()
+    db.update_requests_status([r.request_id for r in pending], status, note, ts)
+    db.insert_notifications([(gen_notif_id(), r.user_id, *_request_notice(r, status, note), ts)
+                             for r in pending])
+    skipped = len(req_ids) - len(pending)
+    return True, (f"{len(pending)} request(s) {status} and students notified."
+                  + (f" {skipped} skipped (not pending)." if skipped else ""))
+
+
+def requests_page(status=None, after=None, limit: int = 20) -> tuple[list, tuple | None]:
+    """Keyset-paginated requests, newest first, optionally one status → (rows, next_key)."""
+    rows = db.get_requests_page(status, after, limit + 1)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1].created_at, rows[-1].request_id)
+
+
+EVENT_KINDS = ("issue", "return", "request", "approved", "rejected", "fine",
+               "payment", "waiver")
+
+
+def pending_request_count() -> int:
+    return db.count_pending_requests()
+
+
+def activity_feed(kind=None, after=None, limit: int = 20) -> tuple[list, int | None]:
+    """Keyset-paginated activity journal, newest first, optionally one kind → (events, next_key)."""
+    if kind is not None and kind not in EVENT_KINDS:
+        return [], None
+    rows = db.get_events_page(kind, after, limit + 1)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1]["seq"]
+
+
+def _request_notice(req, status, note) -> tuple[str, str]:
     icon = "✅" if status == "approved" else "❌"
-    _notify(req["user_id"],
-            f"{icon} Your request for '{req['book_title']}' was {status}. "
+    return (f"{icon} Your request for '{req['book_title']}' was {status}. "
             f"{('Admin note: ' + note) if note else ''}",
             "success" if status == "approved" else "warning")
-    return True, f"Request {status} and student notified."
+
+
+# ══════════════════════════════════════════════════════════════
+# NOTIFICATION SERVICES
+# ══════════════════════════════════════════════════════════════
+
+def user_notifications(user_id, after=None, limit: int = 30,
+                       archived: bool = False) -> tuple[list, tuple | None]:
+    """Keyset-paginated feed, newest first → (notifications, next_key)."""
+    rows = db.get_notifications(user_id, limit + 1, after, archived)
+    if len(rows) <= limit:
+        return [dict(r) for r in rows], None
+    rows = [dict(r) for r in rows[:limit]]
+    return rows, (rows[-1]["created_at"], rows[-1]["notif_id"])
+
+
+def unread_count(user_id) -> int:
+    return db.count_unread_notifications(user_id)
+
+
+def mark_notifications_read(user_id) -> tuple[bool, str]:
+    db.mark_notifications_read(user_id)
+    return True, "All notifications marked as read."
 
 
 # ══════════════════════════════════════════════════════════════
 # WISHLIST SERVICES
 # ══════════════════════════════════════════════════════════════
 
+@db.transaction
 def toggle_wishlist(user_id, book_id) -> tuple[bool, str]:
     if db.is_in_wishlist(user_id, book_id):
         db.remove_from_wishlist(user_id, book_id)
@@ -219,6 +834,16 @@ def toggle_wishlist(user_id, book_id) -> tuple[bool, str]:
     return True, "Added to wishlist ♥"
 
 
+def student_wishlist(user_id) -> list:
+    """Wishlisted books with title, author and copies on the shelf, newest first."""
+    return db.get_wishlist(user_id)
+
+
+def remove_from_wishlist(user_id, book_id) -> tuple[bool, str]:
+    db.remove_from_wishlist(user_id, book_id)
+    return True, "Removed from wishlist."
+
+
 # ══════════════════════════════════════════════════════════════
 # RATING / REVIEW SERVICES
 # ══════════════════════════════════════════════════════════════
@@ -230,9 +855,178 @@ def rate_book(history_id, rating, review) -> tuple[bool, str]:
     return True, "Rating saved! ⭐"
 
 
+def book_rating(book_id) -> tuple[float, int]:
+    """(average rating to one decimal, number of ratings) for one book."""
+    return db.get_book_avg_rating(book_id)
+
+
+# ══════════════════════════════════════════════════════════════
+# ARCHIVAL
+# ══════════════════════════════════════════════════════════════
+
+ARCHIVE_AFTER_DAYS = 365
+
+
+def archive_cold_data(days: int = ARCHIVE_AFTER_DAYS, batch: int = 500) -> dict:
+    """
+    Move history / fines / requests / notifications older than `days`
+    that nothing live depends on into the archive DB → {table: moved}.
+    Safe while the app runs: each batch is a short transaction.
+    """
+    if days < 1:
+        raise ValueError("days must be at least 1")
+    return db.archive_cold_rows(now_ts() - days * 86400, batch)
+
+
+# ══════════════════════════════════════════════════════════════
+# EXPORTS
+# Loans, fines, history and users for auditors, streamed chunk by
+# chunk from one cursor into a file, an HTTP response or a download:
+# memory stays flat at 1k or 10M rows.
+# ══════════════════════════════════════════════════════════════
+
+EXPORT_KINDS   = db.EXPORT_KINDS
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_CHUNK   = 2000          # rows per fetchmany() and per yielded text chunk
+EXPORT_DIR     = os.environ.get("NEONLIB_EXPORT_DIR")   # None → exports/ beside the DB
+EXPORT_KEEP_HOURS = 24         # prune_exports() deletes files older than this
+
+
+def export_stream(kind: str, fmt: str = "csv", chunk: int = EXPORT_CHUNK):
+    """
+    Generator of (text, rows so far): CSV with a header row, or JSONL
+    (one object per line), one text chunk per `chunk` rows.
+    """
+    if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        raise ValueError(f"kind must be one of {EXPORT_KINDS}, format one of {EXPORT_FORMATS}")
+    rows = db.iter_export(kind, chunk)
+    header = next(rows)
+    buf = io.StringIO()
+    if fmt == "csv":
+        out = csv.writer(buf)
+        out.writerow(header)
+        write = out.writerow
+    else:
+        write = lambda r: buf.write(json.dumps(dict(zip(header, r)), ensure_ascii=False) + "\n")
+    n = 0
+    for r in rows:
+        write(r)
+        n += 1
+        if n % chunk == 0:
+            yield buf.getvalue(), n
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue(), n
+
+
+def _export_dir() -> str:
+    return EXPORT_DIR or os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), "exports")
+
+
+def export_path(kind: str, fmt: str) -> str:
+    """Fresh timestamped file name under EXPORT_DIR (created if missing)."""
+    folder = _export_dir()
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{kind}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}")
+
+
+def prune_exports(hours: float = EXPORT_KEEP_HOURS) -> int:
+    """Delete export files older than `hours` from EXPORT_DIR → files removed."""
+    folder, cutoff, n = _export_dir(), time.time() - hours * 3600, 0
+    if not os.path.isdir(folder):
+        return 0
+    for e in os.scandir(folder):
+        name, _, ext = e.name.rpartition(".")
+        if (e.is_file() and ext in EXPORT_FORMATS and name.split("-")[0] in EXPORT_KINDS
+                and e.stat().st_mtime < cutoff):
+            try:
+                os.remove(e.path)
+                n += 1
+            except OSError:                 # already gone, or still open elsewhere
+                pass
+    return n
+
+
+def export_to_file(kind: str, fmt: str, path: str, progress=None,
+                   every: float = 0.25) -> dict:
+    """
+    Stream one export into `path` → {rows, bytes, seconds, rows_per_s}.
+    progress(done, total, rows_per_s) runs at most every `every` seconds
+    and once at the end; `total` is a COUNT(*) taken up front.
+    """
+    total = db.count_export(kind)
+    t0 = last = time.perf_counter()
+    done = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for text, done in export_stream(kind, fmt):
+            f.write(text)
+            now = time.perf_counter()
+            if progress and now - last >= every:
+                progress(done, max(total, done), done / (now - t0))
+                last = now
+    secs = max(time.perf_counter() - t0, 1e-9)
+    if progress:
+        progress(done, done, done / secs)
+    return {"rows": done, "bytes": os.path.getsize(path),
+            "seconds": round(secs, 2), "rows_per_s": round(done / secs)}
+
+
 # ══════════════════════════════════════════════════════════════
 # INTERNAL HELPER
 # ══════════════════════════════════════════════════════════════
 
 def _notify(user_id, message, ntype="info"):
     db.insert_notification(gen_notif_id(), user_id, message, ntype, now_iso())
+
+
+# ══════════════════════════════════════════════════════════════
+# SEARCH INDEXES  (process-wide, shared by every session)
+# Built once from the table, then kept current by replaying
+# change_log — so books/users added or removed anywhere are picked
+# up incrementally on the next search.
+# ══════════════════════════════════════════════════════════════
+
+_INDEXES = {
+    #  tbl      key        text fields                         full scan          fetch by ids
+    "books": ("book_id", ("title", "author", "category"), db.get_all_books, db.get_books_by_ids),
+    "users": ("user_id", ("name", "email"),               db.get_all_users, db.get_users_by_ids),
+}
+_index      = {tbl: TrigramIndex() for tbl in _INDEXES}
+_index_seq  = {tbl: None for tbl in _INDEXES}
+_index_ver  = {tbl: None for tbl in _INDEXES}
+_index_lock = threading.Lock()
+
+
+def _sync_index(tbl):
+    key, fields, load_all, load_ids = _INDEXES[tbl]
+    idx, seq = _index[tbl], _index_seq[tbl]
+    version = db.data_version()
+    if version == _index_ver[tbl]:
+        return                                         # nothing committed
+    ok, last, changed = (False, db.last_change_seq(), []) if seq is None \
+        else db.get_changes_since(tbl, seq)
+    if not ok:
+        idx.clear()
+        rows = load_all()
+    else:
+        rows = load_ids(changed) if changed else []
+        for rid in set(changed) - {r[key] for r in rows}:
+            idx.remove(rid)                            # deleted rows
+    for r in rows:
+        idx.add(r[key], *(r[f] for f in fields))
+    _index_seq[tbl], _index_ver[tbl] = last, version
+
+
+def _index_search(tbl, query, limit):
+    key, _, _, load_ids = _INDEXES[tbl]
+    with _index_lock:
+        _sync_index(tbl)
+        hits = _index[tbl].search(query, limit)
+    if not hits:
+        return []
+    if tbl == "books":
+        catalog.refresh()
+        rows = {rid: catalog.get(rid) for rid, _ in hits}
+    else:
+        rows = {r[key]: r for r in load_ids([h[0] for h in hits])}
+    return [rows[rid] for rid, _ in hits if rows.get(rid)]
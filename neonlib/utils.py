@@ -6,8 +6,13 @@ Rule  : No DB calls.  No Streamlit imports.
 """
 
 import hashlib
-import uuid
+import heapq
+import re
+import time
 import random
+import secrets
+import threading
+from collections import Counter
 from datetime import datetime, timedelta
 
 
@@ -89,6 +94,92 @@ def build_issued_dict(issued_rows: list) -> dict:
     return d
 
 
+# ══════════════════════════════════════════════════════════════
+# DATA STRUCTURE 4 – INVERTED INDEX  (typo-tolerant trigram search)
+# ══════════════════════════════════════════════════════════════
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def trigrams(text: str) -> set:
+    """
+    Lower-cases, splits into alphanumeric words and pads each word
+    ('  dune ') before slicing 3-char windows.  The padding lets 1–2
+    char queries still hit word prefixes ('py' → '  p', ' py', 'py ').
+    """
+    grams = set()
+    for w in _WORD_RE.findall(text.lower()):
+        p = f"  {w} "
+        grams.update(p[i:i + 3] for i in range(len(p) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    Inverted index  trigram → {doc_id}.
+    add / remove : O(t) where t = trigrams in the document.
+    search       : only walks the posting lists of the query's trigrams,
+                   never the whole collection → sublinear in n.
+    Score        : share of the query's trigrams found in the document,
+                   so 'Hebert' still scores 0.71 against 'Herbert'.
+    """
+
+    def __init__(self):
+        self._postings: dict[str, set] = {}
+        self._docs: dict[str, frozenset] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._docs
+
+    def add(self, doc_id: str, *fields: str) -> None:
+        """Index (or re-index) a document from one or more text fields."""
+        grams = frozenset(trigrams(" ".join(f for f in fields if f)))
+        if self._docs.get(doc_id) == grams:
+            return                                  # text unchanged
+        self.remove(doc_id)
+        self._docs[doc_id] = grams
+        for g in grams:
+            self._postings.setdefault(g, set()).add(doc_id)
+
+    def remove(self, doc_id: str) -> None:
+        grams = self._docs.pop(doc_id, None)
+        if grams is None:
+            return
+        for g in grams:
+            ids = self._postings.get(g)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self._postings[g]
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._docs.clear()
+
+    def search(self, query: str, limit: int = 20,
+               threshold: float = 0.3) -> list[tuple[str, float]]:
+        """
+        Returns up to `limit` (doc_id, score) pairs, best first.
+        Ties favour shorter documents (a tighter match).
+        """
+        q = trigrams(query or "")
+        if not q:
+            return []
+        hits = Counter()
+        for g in q:
+            hits.update(self._postings.get(g, ()))
+        n = len(q)
+        need = threshold * n
+        top = heapq.nlargest(
+            limit,
+            ((cnt, d) for d, cnt in hits.items() if cnt >= need),
+            key=lambda h: (h[0], -len(self._docs[h[1]])))
+        return [(d, round(cnt / n, 3)) for cnt, d in top]
+
+
 # ══════════════════════════════════════════════════════════════
 # PASSWORD UTILITIES
 # ══════════════════════════════════════════════════════════════
@@ -133,14 +224,53 @@ def pw_score(pw: str) -> int:
 # ID GENERATORS
 # ══════════════════════════════════════════════════════════════
 
-def gen_user_id()    -> str: return f"USR-{uuid.uuid4().hex[:6].upper()}"
-def gen_book_id()    -> str: return f"BK-{uuid.uuid4().hex[:6].upper()}"
-def gen_issue_id()   -> str: return f"ISS-{uuid.uuid4().hex[:8].upper()}"
-def gen_fine_id()    -> str: return f"FIN-{uuid.uuid4().hex[:8].upper()}"
-def gen_request_id() -> str: return f"REQ-{uuid.uuid4().hex[:8].upper()}"
-def gen_notif_id()   -> str: return f"NTF-{uuid.uuid4().hex[:8].upper()}"
-def gen_hist_id()    -> str: return f"HST-{uuid.uuid4().hex[:8].upper()}"
-def gen_wish_id()    -> str: return f"WSH-{uuid.uuid4().hex[:8].upper()}"
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"     # base32, no I L O U
+_ulid_lock = threading.Lock()
+_ulid_last = [0, 0]                                 # [ms, random part]
+
+
+def ulid(at: datetime | None = None) -> str:
+    """
+    26-char ULID: 48-bit millisecond timestamp + 80 random bits, in
+    Crockford base32, so string order = creation order.
+    2^80 values per millisecond → collisions are not a practical concern,
+    and new keys always land at the right edge of the B-tree.
+    Monotonic: ids minted in the same millisecond bump the random part.
+    `at` back-dates the timestamp (used when re-keying old rows).
+    """
+    if at is not None:
+        ms, rand = int(at.timestamp() * 1000), secrets.randbits(80)
+    else:
+        with _ulid_lock:
+            ms = time.time_ns() // 1_000_000
+            if ms <= _ulid_last[0]:
+                ms, rand = _ulid_last[0], _ulid_last[1] + 1
+                if rand >> 80:                      # random part overflowed
+                    ms, rand = ms + 1, 0
+            else:
+                rand = secrets.randbits(80)
+            _ulid_last[:] = [ms, rand]
+    n = (ms << 80) | rand
+    return "".join(_CROCKFORD[(n >> s) & 31] for s in range(125, -1, -5))
+
+
+_LEGACY_ID = re.compile(r"^(USR|BK|ISS|FIN|REQ|NTF|HST|WSH)-[0-9A-F]{6,8}$")
+
+
+def is_legacy_id(value: str) -> bool:
+    """True for the old 6/8-hex-char uuid4 ids (e.g. BK-3FA2C1)."""
+    return bool(_LEGACY_ID.match(value or ""))
+
+
+def gen_user_id()    -> str: return f"USR-{ulid()}"
+def gen_book_id()    -> str: return f"BK-{ulid()}"
+def gen_issue_id()   -> str: return f"ISS-{ulid()}"
+def gen_fine_id()    -> str: return f"FIN-{ulid()}"
+def gen_request_id() -> str: return f"REQ-{ulid()}"
+def gen_notif_id()   -> str: return f"NTF-{ulid()}"
+def gen_hist_id()    -> str: return f"HST-{ulid()}"
+def gen_wish_id()    -> str: return f"WSH-{ulid()}"
+def gen_hold_id()    -> str: return f"HLD-{ulid()}"
 
 
 # ══════════════════════════════════════════════════════════════
@@ -153,16 +283,30 @@ def now_iso() -> str:
 def due_iso(days: int = 7) -> str:
     return (datetime.now() + timedelta(days=days)).isoformat()
 
-def fmt_date(iso: str) -> str:
-    try:
-        return datetime.fromisoformat(iso).strftime("%d %b %Y")
-    except Exception:
-        return iso
+def now_ts() -> int:
+    return int(time.time())
+
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+           "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
 
-def days_until_due(due_iso: str) -> int:
-    """Positive = days remaining.  Negative = days overdue."""
+def fmt_date(value) -> str:
+    """
+    '2024-03-09T10:15:00' or epoch seconds → '09 Mar 2024'.
+    ISO strings are sliced, not parsed.
+    """
+    if isinstance(value, int):
+        return time.strftime("%d %b %Y", time.localtime(value))
+    try:
+        return f"{value[8:10]} {_MONTHS[int(value[5:7]) - 1]} {value[:4]}"
+    except (TypeError, ValueError, IndexError):
+        return value
+
+def days_until_due(due) -> int:
+    """Positive = days remaining.  Negative = days overdue.  Accepts epoch secs or ISO."""
+    if isinstance(due, int):
+        return (due - int(time.time())) // 86400
     try:
-        return (datetime.fromisoformat(due_iso) - datetime.now()).days
+        return (datetime.fromisoformat(due) - datetime.now()).days
     except Exception:
         return 0
 